@@ -30,8 +30,11 @@ class MainWindow(QMainWindow):
         holdings_button.clicked.connect(self.show_holdings_page)
         dashboard_button = QPushButton("Dashboard")
         dashboard_button.clicked.connect(self.show_dashboard_page)
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh)
         nav_layout.addWidget(holdings_button)
         nav_layout.addWidget(dashboard_button)
+        nav_layout.addWidget(refresh_button)
         main_layout.addLayout(nav_layout)
 
         # Stacked widget for pages
@@ -83,6 +86,12 @@ class MainWindow(QMainWindow):
     def show_dashboard_page(self):
         self.pages.setCurrentIndex(1)  # Dashboard is the second page
 
+    def refresh(self):
+        # Rebuild only what changed in the tradebooks and market data, then redraw the tables
+        self.controller.refresh()
+        self.holdings_widget.set_holdings(self.controller.current_holdings, self.controller.past_holdings)
+        self.tradebook_table.populateTable(self.controller.adjusted_tradebook)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
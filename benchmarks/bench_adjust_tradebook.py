@@ -0,0 +1,41 @@
+"""
+Benchmark of the vectorized split adjustment against the previous trade by trade walk. The cross-check
+of the two lives in tests/test_adjust_tradebook.py.
+Usage:
+    python -m benchmarks.bench_adjust_tradebook [trades]
+"""
+import sys
+import time
+
+from benchmarks import legacy
+from benchmarks.synthetic import random_tradebook, split_store_on_trade_days
+from src.lib.get_tradebook import adjust_for_splits
+from src.models.trade_frame import TradeFrame
+
+
+def main(trades: int = 200000):
+    tradebook = random_tradebook(trades, symbols=500)
+    store = split_store_on_trade_days(tradebook, seed=0)
+    trade_list = tradebook.to_trades()
+
+    start = time.perf_counter()
+    legacy.generate_adjusted_tradebook(trade_list, store)
+    legacy_seconds = time.perf_counter() - start
+
+    # The walk needs Trade objects in and produces Trade objects out, the pipeline stores TradeFrames
+    start = time.perf_counter()
+    TradeFrame.from_trades(legacy.generate_adjusted_tradebook(tradebook.to_trades(), store))
+    legacy_pipeline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    adjusted = adjust_for_splits(tradebook, store)
+    vectorized_seconds = time.perf_counter() - start
+
+    print(f"{trades} trades, {len(adjusted) - trades} bonus entries")
+    print(f"trade by trade:                    {legacy_seconds:8.3f}s")
+    print(f"trade by trade with frame convert: {legacy_pipeline_seconds:8.3f}s")
+    print(f"vectorized:                        {vectorized_seconds:8.3f}s  ({legacy_pipeline_seconds / vectorized_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,130 @@
+"""
+Cross-check and benchmark of the capital gains tax engine.
+Checks the grandfathering examples of the section 112A FAQ, a fiscal year with set-off and exemption
+and a loss carried forward worked out by hand, and the classification of random lot pieces against a
+row by row implementation on dates. The timed run covers a decade of trades over hundreds of symbols.
+Usage:
+    python -m benchmarks.bench_capital_gains [fills] [symbols]
+"""
+import datetime
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.capital_gains import (TAX_RATES, SPECULATIVE, SHORT_TERM, LONG_TERM, GRANDFATHERED_BEFORE,
+                                   realized_gains, gains_by_symbol, tax_by_fiscal_year)
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.tax_lots import match_lots
+from src.models.lot_frame import LotFrame
+
+
+def lots(rows):
+    """
+    LotFrame of realized pieces given as (symbol, quantity, cost, proceeds, opened, closed).
+    """
+    columns = list(zip(*rows))
+    cost, proceeds = np.array(columns[2], dtype=float), np.array(columns[3], dtype=float)
+    return LotFrame(columns[0], columns[1], cost, proceeds, proceeds - cost,
+                    np.array(columns[4], dtype='datetime64[s]'), np.array(columns[5], dtype='datetime64[s]'), [False] * len(rows))
+
+
+def check_grandfathering():
+    # Bought at 100, fair market value 200 on 31 January 2018, sold at 250, 150 and 50; bought at 200 with a value of 150;
+    # without a quote that day the cost is kept
+    opened, closed = "2017-01-01", "2019-04-01"
+    gains = realized_gains(lots([
+        ("A", 1, 100, 250, opened, closed), ("A", 1, 100, 150, opened, closed), ("A", 1, 100, 50, opened, closed),
+        ("B", 1, 200, 250, opened, closed), ("C", 1, 100, 250, opened, closed),
+    ]), {"A": 200.0, "B": 150.0})
+    assert gains['taxable_gain'].tolist() == [50.0, 0.0, -50.0, 50.0, 150.0], gains['taxable_gain'].tolist()
+    assert (gains['term'] == LONG_TERM).all()
+
+
+def check_fiscal_years():
+    # FY 2024-25: short term gain 50k and loss 30k, long term gain 200k, all after 23 July 2024
+    year = tax_by_fiscal_year(realized_gains(lots([
+        ("A", 1, 100000, 150000, "2024-08-01", "2024-09-01"),
+        ("B", 1, 130000, 100000, "2024-08-01", "2024-09-01"),
+        ("C", 1, 100000, 300000, "2022-08-01", "2024-09-01"),
+    ]))).loc[2024]
+    assert np.isclose(year['taxable_short_term'], 20000) and np.isclose(year['taxable_long_term'], 75000), year
+    assert np.isclose(year['tax'], (20000 * 0.20 + 75000 * 0.125) * 1.04), year
+
+    # A long term loss of 50k in FY 2019-20 set off against a long term gain of 180k two years later
+    summary = tax_by_fiscal_year(realized_gains(lots([
+        ("A", 1, 150000, 100000, "2018-01-01", "2019-06-01"),
+        ("B", 1, 100000, 280000, "2019-06-01", "2021-06-02"),
+    ]), {"A": 0.0}))
+    assert np.isclose(summary.loc[2019, 'loss_carried_forward'], 50000) and summary.loc[2020, 'tax'] == 0, summary
+    assert np.isclose(summary.loc[2021, 'loss_brought_forward'], 50000), summary
+    assert np.isclose(summary.loc[2021, 'tax'], 30000 * 0.10 * 1.04), summary
+
+    # A long term loss under section 10(38) in FY 2017-18 is exempt and not carried to a later gain
+    summary = tax_by_fiscal_year(realized_gains(lots([
+        ("A", 1, 150000, 100000, "2015-01-01", "2017-06-01"),
+        ("B", 1, 100000, 280000, "2018-03-01", "2019-06-02"),
+    ])))
+    assert summary.loc[2017, 'long_term_loss'] == 50000 and summary.loc[2017, 'loss_carried_forward'] == 0, summary
+    assert summary.loc[2019, 'loss_brought_forward'] == 0 and np.isclose(summary.loc[2019, 'tax'], 80000 * 0.10 * 1.04), summary
+
+
+def reference_classification(realized: LotFrame, fair_market_values):
+    terms, years, regimes, costs = [], [], [], []
+    for row in range(len(realized)):
+        opened = realized.opened[row].astype(datetime.datetime).date()
+        closed = realized.closed[row].astype(datetime.datetime).date()
+        try:
+            anniversary = opened.replace(year=opened.year + 1)
+        except ValueError:     # 29 February
+            anniversary = datetime.date(opened.year + 1, 2, 28)
+        if realized.short[row] or opened == closed:
+            term = SPECULATIVE
+        else:
+            term = LONG_TERM if closed > anniversary else SHORT_TERM
+        cost = realized.cost_basis[row]
+        if term == LONG_TERM and opened < GRANDFATHERED_BEFORE and closed >= TAX_RATES[1][0] and realized.symbol[row] in fair_market_values:
+            cost = max(cost, min(fair_market_values[realized.symbol[row]] * realized.quantity[row], realized.proceeds[row]))
+        terms.append(term)
+        years.append(closed.year if closed.month >= 4 else closed.year - 1)
+        regimes.append(max(index for index, rates in enumerate(TAX_RATES) if rates[0] <= closed))
+        costs.append(cost)
+    return np.array(terms), np.array(years), np.array(regimes), np.array(costs)
+
+
+def main(fills: int = 1000000, symbols: int = 500):
+    check_grandfathering()
+    check_fiscal_years()
+
+    for seed in range(5):
+        tradebook = random_tradebook(5000, symbols=20, seed=seed, years=10)
+        realized, _ = match_lots(tradebook)
+        fair_market_values = {symbol: float(value) for symbol, value in zip(list(tradebook.unique_symbols())[1:], np.random.default_rng(seed).uniform(10, 2000, 19))}
+        gains = realized_gains(realized, fair_market_values)
+        terms, years, regimes, costs = reference_classification(realized, fair_market_values)
+        assert np.array_equal(gains['term'], terms) and np.array_equal(gains['fiscal_year'], years), f"classification differs for seed {seed}"
+        assert np.array_equal(gains['regime'], regimes) and np.allclose(gains['taxable_cost'], costs), f"taxable cost differs for seed {seed}"
+
+    tradebook = random_tradebook(fills, symbols=symbols, years=10)
+    store = stock_info_store(list(tradebook.unique_symbols()))
+    realized, _ = match_lots(adjust_for_splits(tradebook, store))
+    fair_market_values = {symbol: 100.0 for symbol in store}
+
+    start = time.perf_counter()
+    gains = realized_gains(realized, fair_market_values, store)
+    classify_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    by_symbol = gains_by_symbol(gains)
+    by_year = tax_by_fiscal_year(gains)
+    summary_seconds = time.perf_counter() - start
+
+    assert np.allclose(by_symbol.groupby(level='fiscal_year').sum()['long_term'], by_year['long_term_gain'] - by_year['long_term_loss'])
+    print(f"{len(realized)} realized lot pieces of {len(store)} symbols over {len(by_year)} fiscal years")
+    print(f"classify and grandfather:   {classify_seconds:8.3f}s")
+    print(f"per symbol and year:        {summary_seconds:8.3f}s")
+    print(by_year[['short_term_gain', 'long_term_gain', 'exemption', 'tax', 'loss_carried_forward']].round(0).to_string())
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Benchmark of a warm start read of the stock info store: three queries per symbol against one
+set based query per table.
+Runs against a scratch database in a temporary directory.
+Usage:
+    python -m benchmarks.bench_database_reads [symbols]
+"""
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+from benchmarks.synthetic import random_symbols, stock_info_store
+from src.database.connection import connect, use_database
+from src.database.dividend import get_dividends_from_db
+from src.database.migrations import migrate
+from src.database.stock_info import get_stock_info_from_db
+from src.database.stock_split import get_stock_splits_from_db
+from src.lib.get_stock_info import get_stock_info_many, store_stock_infos
+from src.models.stock_info import Dividend
+
+
+def per_symbol(symbols):
+    store = {}
+    for symbol in symbols:
+        stock_info = get_stock_info_from_db(symbol)
+        stock_info.stock_splits = get_stock_splits_from_db(symbol)
+        stock_info.dividends = get_dividends_from_db(symbol)
+        store[symbol] = stock_info
+    return store
+
+
+def main(symbols: int = 2000):
+    rng = np.random.default_rng(0)
+    store = stock_info_store(random_symbols(symbols, rng), splits_per_symbol=1.0)
+    for stock_info in store.values():
+        stock_info.dividends = [Dividend(ex_date=split.split_date, amount=2.0) for split in stock_info.stock_splits]
+    symbols = list(store)
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(os.path.join(directory, "bench.db"))
+        migrate()
+        store_stock_infos(list(store.values()))
+        with connect() as (connection, cursor):
+            plan = cursor.execute("EXPLAIN QUERY PLAN SELECT symbol, split_date, ratio FROM StockSplit WHERE symbol IN (SELECT value FROM json_each(?))", ("[]",)).fetchall()
+        print("split lookup plan:", "; ".join(row[-1] for row in plan))
+
+        start = time.perf_counter()
+        expected = per_symbol(symbols)
+        per_symbol_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bulk = get_stock_info_many(symbols)
+        bulk_seconds = time.perf_counter() - start
+
+    assert all(bulk[symbol] == expected[symbol] for symbol in symbols)
+    print(f"{len(symbols)} symbols: per symbol {per_symbol_seconds:.3f}s ({3 * len(symbols)} queries)   bulk {bulk_seconds:.3f}s (3 queries)  ({per_symbol_seconds / bulk_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark of the batched database writers against the previous row by row writes, which opened
+a connection and committed once per dividend and once per trading day.
+Runs against scratch databases in a temporary directory.
+Usage:
+    python -m benchmarks.bench_database_writes [symbols] [dividends_per_symbol] [index_days]
+"""
+import os
+import sys
+import time
+import sqlite3
+import datetime
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import legacy
+from benchmarks.synthetic import random_symbols
+from src.database.connection import use_database
+from src.database.dividend import insert_dividends_into_db
+from src.database.index import insert_index_into_db
+from src.database.migrations import migrate, initial_schema
+from src.models.stock_info import Dividend
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(symbols: int = 300, dividends_per_symbol: int = 20, index_days: int = 5000):
+    rng = np.random.default_rng(0)
+    dividends = {
+        symbol: [Dividend(ex_date=datetime.date(2000 + year, 1 + month, 15), amount=float(rng.uniform(1, 20)))
+                 for year, month in zip(range(dividends_per_symbol), rng.integers(0, 12, size=dividends_per_symbol))]
+        for symbol in random_symbols(symbols, rng)
+    }
+    days = pd.bdate_range("2005-01-03", periods=index_days).date
+    index_data = pd.DataFrame({
+        'date': days, 'nifty50': rng.uniform(5000, 20000, index_days),
+        'bsesensex': rng.uniform(20000, 60000, index_days), 'niftybank': rng.uniform(10000, 40000, index_days)
+    })
+    dividend_rows = sum(map(len, dividends.values()))
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_database = os.path.join(directory, "legacy.db")
+        connection = sqlite3.connect(legacy_database, isolation_level=None)
+        initial_schema(connection.cursor())
+        connection.close()
+        use_database(os.path.join(directory, "batched.db"))
+        migrate()
+
+        legacy_dividends = timed(lambda: [legacy.insert_dividend_into_db(legacy_database, symbol, dividend.ex_date, dividend.amount)
+                                          for symbol, symbol_dividends in dividends.items() for dividend in symbol_dividends])
+        batched_dividends = timed(insert_dividends_into_db, dividends)
+        legacy_index = timed(legacy.insert_index_into_db, legacy_database, index_data)
+        batched_index = timed(insert_index_into_db, index_data)
+
+    print(f"{dividend_rows} dividends:   row by row {legacy_dividends:7.3f}s   batched {batched_dividends:7.3f}s  ({legacy_dividends / batched_dividends:.0f}x)")
+    print(f"{index_days} index days: row by row {legacy_index:7.3f}s   batched {batched_index:7.3f}s  ({legacy_index / batched_index:.0f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""
+Offline benchmark of the concurrent market data fetcher against a fake provider with injected
+latency and faults, compared with fetching the symbols one after another.
+Usage:
+    python -m benchmarks.bench_fetcher [symbols] [latency_seconds] [failure_rate]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_symbols
+from src.lib.fetcher import ConcurrentFetcher
+from src.lib.get_stock_info import fetch_stock_info
+from src.lib.market_data import FakeProvider
+
+
+def run(symbols, provider, fetcher):
+    start = time.perf_counter()
+    try:
+        results = fetcher.fetch_many(symbols, lambda symbol, call: fetch_stock_info(symbol, provider, call))
+    finally:
+        fetcher.shutdown()
+    return results, time.perf_counter() - start
+
+
+def main(count: int = 300, latency: float = 0.02, failure_rate: float = 0.1):
+    symbols = random_symbols(count, np.random.default_rng(0))
+    bse_only = symbols[::10]
+
+    serial, serial_seconds = run(symbols, FakeProvider(latency, 0.0, bse_only), ConcurrentFetcher(max_workers=1, rate=1e9, retries=0))
+    provider = FakeProvider(latency, failure_rate, bse_only)
+    concurrent, concurrent_seconds = run(symbols + symbols[:50], provider, ConcurrentFetcher(max_workers=32, rate=200, burst=32, backoff=0.05, timeout=10))
+
+    fetched = sum(1 for info in concurrent.values() if info is not None)
+    print(f"{count} symbols, {latency * 1000:.0f}ms latency, {failure_rate:.0%} injected faults, 50 duplicate requests")
+    print(f"serial, no faults: {serial_seconds:7.2f}s")
+    print(f"concurrent:        {concurrent_seconds:7.2f}s  ({serial_seconds / concurrent_seconds:.1f}x), {fetched}/{count} fetched, provider calls {provider.calls}")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if "." in arg else int(arg) for arg in sys.argv[1:]))
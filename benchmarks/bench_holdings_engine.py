@@ -0,0 +1,68 @@
+"""
+Benchmark of the vectorized holdings engine against the trade by trade loop. The cross-check of the
+two lives in tests/test_holdings_engine.py.
+Usage:
+    python -m benchmarks.bench_holdings_engine [trades]
+"""
+import sys
+import time
+from dataclasses import fields
+
+import numpy as np
+
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.generate_holdings import generate_holdings_from_tradebook, apply_trades_to_holding
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized, replay_positions
+from src.models.holding import Holding
+
+
+def assert_same_holdings(expected, actual, seed):
+    """
+    Holding objects equal field by field with exact float equality, NaN equal to NaN.
+    """
+    assert len(expected) == len(actual)
+    for left, right in zip(expected, actual):
+        for field in fields(left):
+            expected, actual = getattr(left, field.name), getattr(right, field.name)
+            assert expected == actual or (expected != expected and actual != actual), f"{left.symbol}.{field.name} differs for seed {seed}: {expected} != {actual}"
+
+
+def main(trades: int = 200000):
+    index_data = random_index_data(3000, np.random.default_rng(0))
+    tradebook = random_tradebook(trades, symbols=500)
+    symbols = list(tradebook.unique_symbols())
+    store = stock_info_store(symbols, splits_per_symbol=1.0)
+    adjusted = adjust_for_splits(tradebook, store)
+
+    start = time.perf_counter()
+    generate_holdings_from_tradebook(symbols, adjusted, index_data, store)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    generate_holdings_vectorized(symbols, adjusted, index_data, store)
+    vectorized_seconds = time.perf_counter() - start
+
+    # Both engines hand out the same Trade objects, the position arithmetic alone compares as follows
+    groups = adjusted.symbol_groups()
+    frames = [adjusted.take(rows) for rows in groups.values()]
+    holdings = [Holding(symbol=symbol, trades=frame.to_trades()) for symbol, frame in zip(groups, frames)]
+    start = time.perf_counter()
+    for holding in holdings:
+        apply_trades_to_holding(holding)
+    loop_positions_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame in frames:
+        replay_positions(frame.typ, frame.quantity, frame.price)
+    vectorized_positions_seconds = time.perf_counter() - start
+
+    print(f"{len(adjusted)} trades, {len(symbols)} symbols")
+    print(f"trade by trade loop: {loop_seconds:8.3f}s   positions only {loop_positions_seconds:8.3f}s")
+    print(f"vectorized:          {vectorized_seconds:8.3f}s   positions only {vectorized_positions_seconds:8.3f}s")
+    print(f"speedup:             {loop_seconds / vectorized_seconds:7.1f}x   positions only {loop_positions_seconds / vectorized_positions_seconds:7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""
+Cross-check and benchmark of the as-of index lookups used for benchmark returns against the previous
+per holding dict rebuild and day by day stepping back to the previous trading day. Dates before the
+index history must look up as missing.
+Trend points fall on random weekdays, so some land on market holidays where the previous code skipped
+the period: those points are left out of the comparison.
+Usage:
+    python -m benchmarks.bench_index_returns [holdings] [points_per_holding] [index_days]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import legacy
+from src.lib.generate_holdings import calculate_index_revenue_for_holding, INDEX_COLUMNS
+from src.lib.trading_calendar import AsOfLookup, TradingCalendar, from_ordinal
+from src.models.holding import Holding
+from src.models.trend_series import TrendSeries
+
+TRENDS = ("risk_free_return_trend", "nifty50_return_trend", "bsesensex_return_trend", "niftybank_return_trend")
+
+
+def random_index_data(days: int, rng: np.random.Generator) -> pd.DataFrame:
+    weekdays = pd.bdate_range("2010-01-04", periods=days)
+    sessions = weekdays[rng.random(days) > 0.05].date     # About one weekday in twenty is a holiday
+    levels = 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, size=(len(sessions), 3)), axis=0))
+    return pd.DataFrame({'date': sessions, **{column: levels[:, i] for i, column in enumerate(INDEX_COLUMNS)}})
+
+
+def random_holdings(count: int, points: int, index_data: pd.DataFrame, rng: np.random.Generator):
+    weekdays = pd.bdate_range(index_data['date'].iloc[0], index_data['date'].iloc[-1]).date
+    holdings = []
+    for i in range(count):
+        dates = np.sort(rng.choice(len(weekdays), size=points, replace=False))
+        holdings.append(Holding(symbol=f"S{i}", investment_trend=TrendSeries(zip(weekdays[dates], rng.uniform(1e3, 1e5, points)))))
+    return holdings
+
+
+def main(count: int = 300, points: int = 40, days: int = 2500):
+    rng = np.random.default_rng(0)
+    index_data = random_index_data(days, rng)
+    calendar = TradingCalendar.from_index_data(index_data)
+    holdings = random_holdings(count, points, index_data, rng)
+
+    start = time.perf_counter()
+    for holding in holdings:
+        legacy_holding = Holding(symbol=holding.symbol, investment_trend=holding.investment_trend)
+        legacy.calculate_index_revenue_for_holding(legacy_holding, index_data)
+        holding.trades = legacy_holding     # Kept only for the comparison below
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_lookup = AsOfLookup.from_frame(index_data, INDEX_COLUMNS)
+    for holding in holdings:
+        calculate_index_revenue_for_holding(holding, index_lookup)
+    asof_seconds = time.perf_counter() - start
+
+    compared = 0
+    for holding in holdings:
+        legacy_holding = holding.trades
+        ordinals = holding.investment_trend.ordinals
+        # The previous code skipped periods ending on a holiday and put nothing in the trends for them
+        valid = calendar.is_trading_day(ordinals)
+        valid[0] = True
+        for trend in TRENDS:
+            expected = dict(zip(getattr(legacy_holding, trend).ordinals[:-1], getattr(legacy_holding, trend).values[:-1]))
+            actual = getattr(holding, trend)
+            assert np.isclose(getattr(legacy_holding, trend).values[-1], actual.values[-1])
+            for ordinal, value, keep in zip(actual.ordinals[:-1], actual.values[:-1], valid):
+                if keep:
+                    assert np.isclose(expected[ordinal], value), f"{holding.symbol} {trend} differs on {ordinal}"
+                    compared += 1
+    # The previous trading day of any date, inside and around the index history, against stepping back a day at a time
+    for ordinal in rng.integers(int(calendar.sessions[0]) - 30, int(calendar.sessions[-1]) + 30, size=2000):
+        expected = int(ordinal)
+        while not calendar.is_trading_day(np.array([expected], dtype=np.int32))[0]:
+            expected -= 1
+        assert calendar.previous_trading_day(from_ordinal(ordinal)).toordinal() == expected, f"previous trading day of {from_ordinal(ordinal)}"
+
+    # A holding bought before the index history has no benchmark return for its first period
+    early = Holding(symbol="EARLY", investment_trend=TrendSeries([(index_data['date'].iloc[0] - pd.Timedelta(days=10), 1e4), (index_data['date'].iloc[5], 2e4)]))
+    assert np.isnan(index_lookup.asof(early.investment_trend.ordinals[:1])).all()
+    calculate_index_revenue_for_holding(early, index_lookup)
+    assert np.isnan(early.nifty50_return_trend.values[1]) and not np.isnan(early.nifty50_return_trend.values[2]), early.nifty50_return_trend.values
+
+    print(f"{compared} trend points match, {count} holdings x {points} points, {len(index_data)} index days")
+    print(f"dict rebuild and stepping back: {legacy_seconds:8.3f}s")
+    print(f"as-of lookups:                  {asof_seconds:8.3f}s  ({legacy_seconds / asof_seconds:.0f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""
+Benchmark of the columnar tradebook loader against the previous iterrows based loader.
+Usage:
+    python -m benchmarks.bench_load_tradebook [trades_per_file] [files]
+"""
+import sys
+import tempfile
+import time
+
+from benchmarks import legacy
+from benchmarks.synthetic import write_tradebooks
+from src.lib.get_tradebook import load_tradebook
+
+
+def main(trades_per_file: int = 50000, files: int = 5):
+    with tempfile.TemporaryDirectory() as directory:
+        tradebook_files, manual_trades_file = write_tradebooks(directory, trades_per_file, files)
+
+        start = time.perf_counter()
+        legacy_tradebook = legacy.load_tradebook(tradebook_files, manual_trades_file)
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tradebook = load_tradebook(tradebook_files, manual_trades_file)
+        columnar_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        trades = tradebook.to_trades()
+        materialize_seconds = time.perf_counter() - start
+
+    assert len(trades) == len(legacy_tradebook)
+    assert sorted((t.symbol, t.timestamp, t.typ, t.quantity, t.price) for t in trades) == \
+        sorted((t.symbol, t.timestamp, t.typ, t.quantity, t.price) for t in legacy_tradebook)
+
+    print(f"{len(trades)} trades from {files} files")
+    print(f"iterrows loader:        {legacy_seconds:8.3f}s")
+    print(f"columnar loader:        {columnar_seconds:8.3f}s  ({legacy_seconds / columnar_seconds:.1f}x)")
+    print(f"materialize all trades: {materialize_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
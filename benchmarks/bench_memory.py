@@ -0,0 +1,60 @@
+"""
+Memory used by trades and holding trends before and after the compact model representation.
+Usage:
+    python -m benchmarks.bench_memory [trades] [holdings] [points_per_trend]
+"""
+import datetime
+import sys
+import tracemalloc
+
+from benchmarks import legacy
+from benchmarks.synthetic import random_tradebook
+from src.models.holding import Holding
+
+TREND_FIELDS = ('investment_trend', 'quantity_trend', 'risk_free_return_trend', 'nifty50_return_trend', 'bsesensex_return_trend', 'niftybank_return_trend')
+
+
+def measure(build) -> float:
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / 2 ** 20
+
+
+def list_trades(tradebook):
+    return [legacy.ListTrade(trade.symbol, trade.quantity, trade.price, str(trade.typ), trade.timestamp, trade.remarks) for trade in tradebook]
+
+
+def holdings(cls, count: int, points: int, as_list: bool):
+    start = datetime.date(2015, 1, 1)
+    result = []
+    for index in range(count):
+        holding = cls(symbol=f"SYM{index}")
+        for name in TREND_FIELDS:
+            trend = getattr(holding, name)
+            for day in range(points):
+                point = [start + datetime.timedelta(days=day), float(day)]
+                trend.append(point if as_list else tuple(point))
+        result.append(holding)
+    return result
+
+
+def main(trades: int = 1000000, holding_count: int = 2000, points: int = 250):
+    tradebook = random_tradebook(trades, symbols=500)
+
+    before = measure(lambda: list_trades(tradebook))
+    after = measure(lambda: tradebook.to_trades())
+    print(f"{trades} Trade objects: {before:9.1f} MiB -> {after:9.1f} MiB")
+
+    after_frame = measure(lambda: random_tradebook(trades, symbols=500))
+    print(f"{trades} trades in a TradeFrame: {after_frame:9.1f} MiB")
+
+    before = measure(lambda: holdings(legacy.ListHolding, holding_count, points, as_list=True))
+    after = measure(lambda: holdings(Holding, holding_count, points, as_list=False))
+    print(f"{holding_count} holdings x {len(TREND_FIELDS)} trends x {points} points: {before:9.1f} MiB -> {after:9.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
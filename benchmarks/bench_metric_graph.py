@@ -0,0 +1,97 @@
+"""
+Cross-check and benchmark of the lazy portfolio metric graph.
+Every field of a lazy portfolio must equal the portfolio computed at once, cold and after every update,
+except the simulated value at risk fields, which only the lazy portfolio computes.
+A price tick of one holding must leave the fundamentals matrix memoized, new fundamentals the return
+metrics, and setting unchanged inputs must not invalidate anything. The timed runs read every field
+cold, after a price tick, after new fundamentals and with nothing changed.
+Usage:
+    python -m benchmarks.bench_metric_graph [holdings]
+"""
+import sys
+import time
+from dataclasses import fields
+
+import numpy as np
+
+from benchmarks.bench_portfolio_metrics import random_portfolio, random_valuation
+from src.lib.portfolio_metrics import (SIMULATED_FIELDS, LazyPortfolio, portfolio_graph, portfolio_input_versions, portfolio_metrics,
+                                      set_portfolio_inputs)
+from src.lib.valuation import ValuationMatrix
+from src.models.portfolio import Portfolio
+
+
+def assert_same_portfolio(expected: Portfolio, actual: Portfolio, label: str):
+    for field in fields(Portfolio):
+        if field.name in SIMULATED_FIELDS:
+            continue
+        left, right = getattr(expected, field.name), getattr(actual, field.name)
+        same = left == right if not isinstance(left, float) else np.isclose(left, right, rtol=1e-12, atol=0, equal_nan=True)
+        assert same, f"{label}: portfolio.{field.name} {right} != {left}"
+
+
+def update(graph, current, store, valuation, index_data):
+    """
+    Set the inputs and read every field, returning the invalidated nodes, the seconds spent on the input
+    versions and the seconds spent reading.
+    """
+    start = time.perf_counter()
+    versions = portfolio_input_versions(current, store, valuation, index_data, {})
+    versions_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    invalidated = set_portfolio_inputs(graph, current, store, valuation, index_data, versions)
+    graph.reset_log()
+    portfolio = LazyPortfolio(graph)
+    for field in fields(Portfolio):
+        getattr(portfolio, field.name)
+    return portfolio, invalidated, (versions_seconds, time.perf_counter() - start)
+
+
+def main(holdings: int = 1000):
+    rng = np.random.default_rng(0)
+    current, store = random_portfolio(holdings, rng)
+    valuation, index_data = random_valuation(current, 5 * 252, rng)
+    graph = portfolio_graph()
+
+    start = time.perf_counter()
+    eager = portfolio_metrics(current, store, valuation, index_data)
+    eager_seconds = time.perf_counter() - start
+    portfolio, _, cold_seconds = update(graph, current, store, valuation, index_data)
+    assert_same_portfolio(eager, portfolio, "cold")
+
+    # A price tick: a new price for one holding, which also moves the last day of its valuation
+    current[1].current_price *= 1.02
+    value = valuation.value.copy()
+    value[-1, 1] *= 1.02
+    valuation = ValuationMatrix(valuation.symbols, valuation.ordinals, valuation.quantity, valuation.price, value, valuation.flow)
+    portfolio, invalidated, tick_seconds = update(graph, current, store, valuation, index_data)
+    assert_same_portfolio(portfolio_metrics(current, store, valuation, index_data), portfolio, "price tick")
+    recomputed = {name for name, _ in graph.recomputed}
+    assert 'fundamentals_matrix' not in recomputed and 'holding_stocks' not in recomputed, recomputed
+    assert 'weights' in recomputed and 'sharpe_ratio' in recomputed, recomputed
+    tick_report = graph.report()
+
+    # New fundamentals of one stock
+    store[current[2].symbol].price_to_book += 1.0
+    portfolio, fundamentals_invalidated, fundamentals_seconds = update(graph, current, store, valuation, index_data)
+    assert_same_portfolio(portfolio_metrics(current, store, valuation, index_data), portfolio, "fundamentals")
+    recomputed = {name for name, _ in graph.recomputed}
+    assert not recomputed & {'portfolio_returns', 'beta', 'weights', 'total_investment'}, recomputed
+
+    portfolio, unchanged_invalidated, unchanged_seconds = update(graph, current, store, valuation, index_data)
+    assert not unchanged_invalidated and not graph.recomputed
+
+    print(f"{len(current)} holdings, {len(fields(Portfolio))} portfolio fields")
+    print(f"price tick recomputed:\n{tick_report}")
+    print(f"portfolio metrics:       {eager_seconds:8.3f}s")
+    print("graph                    versions     reads")
+    for label, (versions_seconds, read_seconds), count in (("cold", cold_seconds, None), ("price tick", tick_seconds, len(invalidated)),
+                                                           ("new fundamentals", fundamentals_seconds, len(fundamentals_invalidated)),
+                                                           ("nothing changed", unchanged_seconds, 0)):
+        invalidated_note = f"  ({count} nodes invalidated)" if count is not None else ""
+        print(f"{label + ':':24s} {versions_seconds:8.3f}s {read_seconds:8.3f}s{invalidated_note}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
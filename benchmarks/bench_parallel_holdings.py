@@ -0,0 +1,43 @@
+"""
+Scaling benchmark of the process pool holdings engine from one worker up to the CPU count.
+Every worker count must produce the same holdings, in the same order, as the single process engine.
+Usage:
+    python -m benchmarks.bench_parallel_holdings [trades] [symbols] [max_workers]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_holdings_engine import assert_same_holdings
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized
+from src.lib.parallel_holdings import generate_holdings_parallel
+
+
+def main(trades: int = 400000, symbols: int = 1000, max_workers: int = os.cpu_count() or 1):
+    index_data = random_index_data(3000, np.random.default_rng(0))
+    tradebook = random_tradebook(trades, symbols=symbols)
+    symbol_list = list(tradebook.unique_symbols())
+    store = stock_info_store(symbol_list, splits_per_symbol=1.0)
+    adjusted = adjust_for_splits(tradebook, store)
+
+    start = time.perf_counter()
+    expected = generate_holdings_vectorized(symbol_list, adjusted, index_data, store)
+    serial_seconds = time.perf_counter() - start
+
+    print(f"{len(adjusted)} trades, {len(symbol_list)} symbols, {os.cpu_count()} CPUs")
+    print(f"single process:  {serial_seconds:8.3f}s")
+    for workers in range(1, max(max_workers, 2) + 1):
+        start = time.perf_counter()
+        holdings = generate_holdings_parallel(symbol_list, adjusted, index_data, store, max_workers=workers)
+        seconds = time.perf_counter() - start
+        assert_same_holdings(expected, holdings, f"{workers} workers")
+        print(f"{workers:2d} workers:      {seconds:8.3f}s  ({serial_seconds / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
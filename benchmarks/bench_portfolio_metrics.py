@@ -0,0 +1,102 @@
+"""
+Cross-check and benchmark of the portfolio metrics engine.
+Every weighted field of the portfolio of random holdings with random fundamentals, some of them missing,
+is checked against a field by field loop over the holdings, and beta and alpha against a least squares
+fit of a random valuation on a random benchmark. The timed run covers 1,000 holdings over five years.
+Usage:
+    python -m benchmarks.bench_portfolio_metrics [holdings]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import random_symbols, stock_info_store
+from src.lib.generate_holdings import RISK_FREE_RATE
+from src.lib.portfolio_metrics import WEIGHTED_FIELDS, MISSING_WHEN_ZERO, portfolio_metrics
+from src.lib.trading_calendar import from_ordinal
+from src.lib.valuation import ValuationMatrix, TRADING_DAYS_PER_YEAR
+from src.models.holding import Holding
+
+RANDOM_FIELDS = ('dividend_yield', 'five_year_average_dividend_yield', 'trailing_pe', 'forward_pe', 'price_to_book',
+                 'price_to_sales_trailing_12_months', 'enterprise_to_revenue', 'enterprise_to_ebitda', 'target_mean_price', 'beta',
+                 'market_cap', 'ebitda_margins', 'operating_margins', 'gross_margins', 'revenue_growth', 'debt_to_equity')
+
+
+def random_portfolio(holdings: int, rng: np.random.Generator):
+    symbols = random_symbols(holdings, rng)
+    store = stock_info_store(symbols)
+    for stock in store.values():
+        for name in RANDOM_FIELDS:
+            setattr(stock, name, float(rng.uniform(-5, 50)) if rng.random() > 0.1 else 0.0)
+        stock.sector, stock.industry = f"S{rng.integers(10)}", f"I{rng.integers(40)}"
+    del store[symbols[0]]     # A holding without stock information
+    current = [Holding(symbol=symbol, quantity=int(rng.integers(1, 500)), current_price=float(rng.uniform(10, 3000)),
+                       investment=float(rng.uniform(1000, 100000))) for symbol in symbols]
+    return current, store
+
+
+def reference_average(holdings, store, field):
+    """
+    Value weighted average of one StockInfo field over the holdings that have it.
+    """
+    total, covered = 0.0, 0.0
+    for holding in holdings:
+        stock = store.get(holding.symbol)
+        value = getattr(stock, field) if stock else None
+        if value is None or (value == 0 and field in MISSING_WHEN_ZERO):
+            continue
+        weight = holding.quantity * holding.current_price
+        total += weight * value
+        covered += weight
+    return total / covered if covered else 0.0
+
+
+def random_valuation(holdings, days: int, rng: np.random.Generator):
+    """
+    Valuation matrix whose portfolio moves with a random benchmark at a beta of 0.8, and the benchmark history.
+    """
+    benchmark = rng.normal(0.0004, 0.01, size=days)
+    returns = 0.0002 + 0.8 * benchmark + rng.normal(0, 0.005, size=days)
+    ordinals = 737000 + np.arange(days, dtype=np.int32)
+    value = np.outer(np.cumprod(1 + returns), np.full(len(holdings), 1000.0))
+    index_data = pd.DataFrame({'date': [from_ordinal(ordinal) for ordinal in ordinals], 'nifty50': 10000 * np.cumprod(1 + benchmark)})
+    valuation = ValuationMatrix([holding.symbol for holding in holdings], ordinals, np.ones_like(value), value / 1000, value, np.zeros_like(value))
+    return valuation, index_data
+
+
+def main(holdings: int = 1000):
+    rng = np.random.default_rng(0)
+    current, store = random_portfolio(holdings, rng)
+    valuation, index_data = random_valuation(current, 5 * 252, rng)
+
+    start = time.perf_counter()
+    portfolio = portfolio_metrics(current, store, valuation, index_data)
+    seconds = time.perf_counter() - start
+
+    returns = valuation.daily_returns()[1:]
+    closes = index_data['nifty50'].to_numpy()
+    slope, intercept = np.polyfit(closes[1:] / closes[:-1] - 1, returns, 1)
+    assert np.isclose(portfolio.beta, slope, rtol=1e-9), (portfolio.beta, slope)
+    expected_alpha = (intercept - RISK_FREE_RATE / TRADING_DAYS_PER_YEAR * (1 - slope)) * TRADING_DAYS_PER_YEAR
+    assert np.isclose(portfolio.alpha, expected_alpha, rtol=1e-6), (portfolio.alpha, expected_alpha)
+
+    for name, column in WEIGHTED_FIELDS.items():
+        if column in ('eps_growth', 'earnings_growth'):
+            continue
+        expected = reference_average(current, store, column)
+        assert np.isclose(getattr(portfolio, name), expected, rtol=1e-9, atol=1e-9), f"{name}: {getattr(portfolio, name)} != {expected}"
+    yields = [1 / store[holding.symbol].trailing_pe if holding.symbol in store and store[holding.symbol].trailing_pe else None for holding in current]
+    covered = [holding.quantity * holding.current_price for holding, value in zip(current, yields) if value is not None]
+    expected_pe = sum(covered) / sum(weight * value for weight, value in zip(covered, (value for value in yields if value is not None)))
+    assert np.isclose(portfolio.trailing_pe, expected_pe, rtol=1e-9), (portfolio.trailing_pe, expected_pe)
+    assert np.isclose(sum(sector["weight"] for sector in portfolio.sector_weights.values()), 1.0)
+    assert sum(sector["count"] for sector in portfolio.sector_weights.values()) == len(current)
+
+    print(f"{len(current)} holdings, {len(WEIGHTED_FIELDS)} weighted fields")
+    print(f"portfolio metrics:       {seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,114 @@
+"""
+Benchmark and cross-check of the local daily price history store.
+Syncs five years of history for many symbols through the fake provider, checks the stored rows against
+the provider, then checks that later syncs only request the missing ranges, that a new split fetches
+the whole history of its symbol again and replaces the stored closes, and times the read path.
+Usage:
+    python -m benchmarks.bench_price_store [symbols]
+"""
+import contextlib
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_symbols, stock_info_store
+from src.lib.get_stock_info import HISTORY_BATCH_SIZE, sync_price_history
+from src.lib.market_data import FakeProvider
+from src.lib.price_store import PriceStore
+from src.models.stock_info import StockSplit
+
+START = datetime.date(2017, 1, 1)
+TODAY = datetime.date(2021, 12, 31)
+
+
+class CountingProvider(FakeProvider):
+    """
+    Fake provider that records every history request as (start, end, number of tickers). Closes before
+    a split in splits are divided by its ratio, as Yahoo Finance adjusts them.
+    """
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self.splits = {}
+
+    def get_history_many(self, tickers, start=None, end=None, period=None):
+        self.requests.append((start, end, len(tickers)))
+        return super().get_history_many(tickers, start, end, period)
+
+    def get_history(self, ticker, start=None, end=None, period=None):
+        history = super().get_history(ticker, start, end, period)
+        if ticker in self.splits:
+            split_date, ratio = self.splits[ticker]
+            before = history['date'] < split_date
+            for column in ('open', 'high', 'low', 'close'):
+                history.loc[before, column] /= ratio
+        return history
+
+
+def main(symbols: int = 500):
+    provider = CountingProvider()
+    symbol_list = random_symbols(symbols, np.random.default_rng(0))
+    store_info = stock_info_store(symbol_list)
+    batches = -(-len(symbol_list) // HISTORY_BATCH_SIZE)
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        path = os.path.join(directory, "price_history")
+
+        start = time.perf_counter()
+        sync_price_history(symbol_list, store_info, START, TODAY, provider, directory=path)
+        sync_seconds = time.perf_counter() - start
+        assert len(provider.requests) == batches, provider.requests
+
+        # The next trading day fetches the last day again, it was today when synced, and the new day
+        provider.requests.clear()
+        next_day = TODAY + datetime.timedelta(days=3)
+        start = time.perf_counter()
+        sync_price_history(symbol_list, store_info, START, next_day, provider, directory=path)
+        daily_seconds = time.perf_counter() - start
+        assert {(request[0], request[1]) for request in provider.requests} == {(TODAY, next_day)}, provider.requests
+
+        # An earlier start only backfills the days before the first synced one, besides today's close
+        provider.requests.clear()
+        earlier = START - datetime.timedelta(days=365)
+        sync_price_history(symbol_list, store_info, earlier, next_day, provider, directory=path)
+        assert {(request[0], request[1]) for request in provider.requests} == {(earlier, START - datetime.timedelta(days=1)), (next_day, next_day)}, provider.requests
+
+        # A new split of one symbol fetches its whole history again, the old closes are replaced
+        provider.requests.clear()
+        split_symbol, split_date = symbol_list[0], datetime.date(2020, 6, 15)
+        store_info[split_symbol].stock_splits.append(StockSplit(split_date=split_date, ratio=2.0))
+        provider.splits[f"{split_symbol}.NS"] = (split_date, 2.0)
+        sync_price_history(symbol_list, store_info, earlier, next_day, provider, directory=path)
+        assert (earlier, next_day, 1) in provider.requests, provider.requests
+        provider.requests.clear()
+        sync_price_history(symbol_list, store_info, earlier, next_day, provider, directory=path)
+        assert {(request[0], request[1]) for request in provider.requests} == {(next_day, next_day)}, provider.requests
+
+        start = time.perf_counter()
+        store = PriceStore.load(path)
+        histories = store.histories(symbol_list, START, TODAY)
+        read_seconds = time.perf_counter() - start
+
+        for symbol in symbol_list[::25]:     # The first symbol is the one with the new split
+            expected = provider.get_history(f"{symbol}.NS", start=earlier, end=next_day)
+            actual = store.history(symbol)
+            assert np.array_equal(actual['date'].to_numpy().astype('datetime64[D]'), np.array(expected['date'].tolist(), dtype='datetime64[D]')), symbol
+            assert np.allclose(actual['close'], expected['close'], rtol=1e-6), symbol
+            assert np.array_equal(actual['volume'], expected['volume']), symbol
+
+        disk_bytes = sum(entry.stat().st_size for entry in os.scandir(path))
+
+    rows = sum(len(history) for history in histories.values())
+    print(f"{len(symbol_list)} symbols, {len(store)} stored rows, {disk_bytes / 2 ** 20:.1f} MiB on disk")
+    print(f"initial sync:            {sync_seconds:8.3f}s  ({batches} requests)")
+    print(f"next day sync:           {daily_seconds:8.3f}s")
+    print(f"load {rows} rows of five years: {read_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,133 @@
+"""
+Benchmark of an incremental Controller.refresh() after the previous closes moved and new fills were
+appended to the latest tradebook, and of a new launch that continues from the state the last refresh
+saved, against building a new Controller from scratch. Only the symbols with new fills may be rebuilt,
+the refreshed holdings must equal the rebuilt ones and the portfolio parameters must agree up to float
+rounding. The first Controller is built as of the previous trading day, so the refresh adds a day and
+must roll the covariance of the holdings forward, and a new launch after another refresh saved the
+rolled state must reuse it.
+Usage:
+    python -m benchmarks.bench_refresh [trades_per_file] [files] [changed_symbols]
+"""
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from dataclasses import fields
+
+import pandas as pd
+
+from benchmarks.bench_holdings_engine import assert_same_holdings
+from benchmarks.synthetic import write_tradebooks
+from src.database.connection import use_database
+from src.database.migrations import migrate
+from src.database.stock_info import insert_stock_infos_into_db
+from src.lib.controller import Controller
+from src.lib.incremental import REFRESH_STATE_PATH
+from src.lib.trading_calendar import TradingCalendar
+
+
+def append_fills(tradebook_file: str, symbols: int):
+    """
+    Append one buy of each of the first symbols traded in a tradebook file, a minute after its last fill.
+    """
+    df = pd.read_csv(tradebook_file)
+    fills = df.drop_duplicates(subset=['symbol']).head(symbols).copy()
+    last = pd.to_datetime(df['order_execution_time']).max() + pd.Timedelta(minutes=1)
+    fills['trade_type'] = 'buy'
+    fills['trade_date'] = last.date().isoformat()
+    fills['order_execution_time'] = last.isoformat()
+    fills.to_csv(tradebook_file, mode='a', header=False, index=False)
+    os.utime(tradebook_file)
+
+
+def move_previous_closes(controller: Controller, factor: float):
+    """
+    Store every previous close of the controller's stock information moved by a factor, as a new day's quotes would.
+    """
+    stock_infos = list(controller.stock_info_store.values())
+    for stock_info in stock_infos:
+        stock_info.previous_close *= factor
+    insert_stock_infos_into_db(stock_infos)
+
+
+def rebuild() -> Controller:
+    """
+    A Controller built from scratch, without the state saved by earlier refreshes.
+    """
+    os.remove(REFRESH_STATE_PATH)
+    return Controller()
+
+
+def assert_same_state(expected: Controller, actual: Controller, name: str):
+    by_symbol = lambda holdings: sorted(holdings, key=lambda holding: holding.symbol)
+    assert_same_holdings(by_symbol(expected.holdings), by_symbol(actual.holdings), name)
+    for field in fields(expected.portfolio):
+        left, right = getattr(expected.portfolio, field.name), getattr(actual.portfolio, field.name)
+        if isinstance(left, float):
+            assert math.isclose(left, right, rel_tol=1e-9, abs_tol=1e-6), f"{name} portfolio.{field.name} differs"
+
+
+def main(trades_per_file: int = 20000, files: int = 5, changed_symbols: int = 3):
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            os.makedirs("user_data")
+            os.makedirs("metadata")
+            use_database(os.path.join(directory, "metadata", "trading_agent.db"))
+            migrate()
+            tradebook_files, manual_trades_file = write_tradebooks(os.path.join(directory, "tradebooks"), trades_per_file, files)
+            with open("user_data/user_data.json", "w") as file:
+                json.dump({
+                    "name": "Benchmark", "email": "benchmark@example.com",
+                    "tradebook": tradebook_files, "manual_tradebook": manual_trades_file,
+                    "market_data": {"provider": "fake"},
+                }, file)
+
+            calendar = TradingCalendar()
+            last_day = calendar.previous_trading_day(datetime.date.today())
+            controller = Controller(today=calendar.previous_trading_day(last_day - datetime.timedelta(days=1)))
+            controller.portfolio.ex_ante_volatility
+            move_previous_closes(controller, 1.01)
+            append_fills(tradebook_files[-1], changed_symbols)
+
+            start = time.perf_counter()
+            changed = controller.refresh()
+            refresh_seconds = time.perf_counter() - start
+            assert len(changed) == changed_symbols, f"{len(changed)} symbols rebuilt, {changed_symbols} have new fills"
+            controller.covariance_cache.reset_log()
+            controller.portfolio.ex_ante_volatility
+            assert controller.covariance_cache.sources == ['rolled'], f"covariance {controller.covariance_cache.sources} after a new day"
+
+            start = time.perf_counter()
+            rebuilt = rebuild()
+            full_seconds = time.perf_counter() - start
+            assert_same_state(rebuilt, controller, "refresh")
+
+            # A new launch continues from the state saved by the last refresh
+            controller.refresh()
+            move_previous_closes(rebuilt, 0.99)
+            append_fills(tradebook_files[-1], changed_symbols)
+            start = time.perf_counter()
+            relaunched = Controller()
+            relaunch_seconds = time.perf_counter() - start
+            relaunched.portfolio.ex_ante_volatility
+            assert relaunched.covariance_cache.sources == ['cached'], f"covariance {relaunched.covariance_cache.sources} after a relaunch"
+            assert_same_state(rebuild(), relaunched, "relaunch")
+        finally:
+            os.chdir(cwd)
+
+    print(f"{len(rebuilt.tradebook)} trades, {len(rebuilt.symbols)} symbols, {len(changed)} changed")
+    print(f"full rebuild: {full_seconds:8.3f}s")
+    print(f"refresh:      {refresh_seconds:8.3f}s  ({full_seconds / refresh_seconds:.1f}x)")
+    print(f"relaunch:     {relaunch_seconds:8.3f}s  ({full_seconds / relaunch_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,93 @@
+"""
+Cross-check and benchmark of the covariance and risk contribution engine.
+The Ledoit-Wolf covariance from the running statistics must equal the estimator computed from the
+centered returns by its definition, a covariance rolled forward day by day, including a live close
+replaced by the real one, must equal one summed again, and the component contributions must add up to
+the volatility with marginal contributions matching a finite difference. The timed runs sum a window
+of a year from scratch and roll it forward by one day.
+Usage:
+    python -m benchmarks.bench_risk [holdings] [days]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_market_valuation
+from src.lib.risk import RISK_WINDOW, CovarianceCache, covered_columns, risk_contributions, window_returns
+from src.lib.valuation import ValuationMatrix, PLANES
+
+ROLLED_DAYS = 20
+
+
+def reference_ledoit_wolf(returns: np.ndarray):
+    """
+    Ledoit-Wolf shrinkage towards a scaled identity, computed from the centered returns day by day.
+    """
+    days, symbols = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / days
+    target = np.trace(sample) / symbols
+    dispersion = np.sum((sample - target * np.eye(symbols)) ** 2) / symbols
+    noise = sum(np.sum((np.outer(row, row) - sample) ** 2) for row in centered) / days ** 2 / symbols
+    shrinkage = min(noise, dispersion) / dispersion
+    return shrinkage * target * np.eye(symbols) + (1 - shrinkage) * sample, shrinkage
+
+
+def first_days(valuation: ValuationMatrix, days: int) -> ValuationMatrix:
+    return ValuationMatrix(valuation.symbols, valuation.ordinals[:days], *(getattr(valuation, plane)[:days].copy() for plane in PLANES))
+
+
+def main(holdings: int = 500, days: int = 4 * 252):
+    valuation, _ = random_market_valuation(holdings, days)
+    universe = covered_columns(valuation, valuation.symbols)
+    columns = np.array([valuation.symbols.index(symbol) for symbol in universe])
+
+    start = time.perf_counter()
+    covariance, shrinkage = CovarianceCache().covariance(valuation, universe)
+    scratch_seconds = time.perf_counter() - start
+    expected, expected_shrinkage = reference_ledoit_wolf(window_returns(valuation, columns, days - RISK_WINDOW, days - 1))
+    assert np.isclose(shrinkage, expected_shrinkage, rtol=1e-8), (shrinkage, expected_shrinkage)
+    assert np.allclose(covariance, expected, rtol=1e-8, atol=1e-14)
+    assert 0 < shrinkage < 1 and np.linalg.eigvalsh(covariance).min() > 0
+
+    # Day by day from ROLLED_DAYS before the end, the newest close of each day first a live price
+    cache = CovarianceCache()
+    roll_seconds = []
+    for end in range(days - ROLLED_DAYS, days + 1):
+        current = first_days(valuation, end)
+        if end < days:
+            current.price[-1] *= 1.01
+        start = time.perf_counter()
+        rolled, _ = cache.covariance(current, universe)
+        roll_seconds.append(time.perf_counter() - start)
+    assert len(cache.states) == 1
+    assert np.allclose(rolled, covariance, rtol=1e-9, atol=1e-15), np.abs(rolled - covariance).max()
+
+    cache.invalidate([universe[0]])
+    assert not cache.states
+
+    rng = np.random.default_rng(1)
+    weights = rng.uniform(0, 1, size=len(universe))
+    weights /= weights.sum()
+    annual = covariance * 252
+    start = time.perf_counter()
+    risk = risk_contributions(annual, weights)
+    risk_seconds = time.perf_counter() - start
+    assert np.isclose(risk['component'].sum(), risk['volatility'], rtol=1e-12)
+    step = 1e-7
+    bumped = risk_contributions(annual, weights + step * np.eye(len(weights))[0])
+    assert np.isclose((bumped['volatility'] - risk['volatility']) / step, risk['marginal'][0], rtol=1e-4)
+    assert risk['diversification_ratio'] > 1
+    single = risk_contributions(annual, np.eye(len(weights))[0])
+    assert np.isclose(single['diversification_ratio'], 1.0) and np.isclose(single['volatility'], np.sqrt(annual[0, 0]))
+
+    print(f"{len(universe)} of {holdings} holdings with a full window of {RISK_WINDOW} days, shrinkage {shrinkage:.3f}")
+    print(f"portfolio volatility {risk['volatility']:.2%}, diversification ratio {risk['diversification_ratio']:.2f}")
+    print(f"covariance from scratch: {scratch_seconds:8.3f}s")
+    print(f"roll forward one day:    {np.median(roll_seconds[1:]):8.3f}s  (median of {ROLLED_DAYS})")
+    print(f"risk contributions:      {risk_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,117 @@
+"""
+Cross-check and benchmark of the rolling risk analytics.
+Every rolling metric of a sample of holdings and of the portfolio is checked on every day against a
+window by window recomputation from the raw returns, analytics extended by a few days must equal
+analytics built from scratch, and the sliding maximum is checked against a plain loop. The timed runs
+cover every metric over the 21, 63 and 252 day windows for 1,000 holdings over five years.
+Usage:
+    python -m benchmarks.bench_rolling [holdings] [days]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_market_valuation
+from src.lib.generate_holdings import RISK_FREE_RATE
+from src.lib.rolling import ROLLING_WINDOWS, RollingAnalytics, sliding_max
+from src.lib.trading_calendar import AsOfLookup
+from src.lib.valuation import ValuationMatrix, PLANES, TRADING_DAYS_PER_YEAR
+
+SAMPLE_COLUMNS = 4
+
+
+def reference_metrics(returns: np.ndarray, benchmark: np.ndarray, window: int) -> dict:
+    """
+    Every rolling metric of one column, recomputed window by window from the returns.
+    """
+    daily_risk_free = RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
+    annualizer = np.sqrt(TRADING_DAYS_PER_YEAR)
+    names = ('volatility', 'sharpe_ratio', 'sortino_ratio', 'drawdown', 'beta', 'tracking_error')
+    metrics = {name: np.full(len(returns), np.nan) for name in names}
+    for day in range(window, len(returns)):
+        sample, market = returns[day - window + 1:day + 1], benchmark[day - window + 1:day + 1]
+        if np.isnan(sample).any():
+            continue
+        deviation = sample.std(ddof=1)
+        excess = sample - daily_risk_free
+        downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2))
+        growth = np.cumprod(np.append(1.0, 1 + sample))
+        metrics['volatility'][day] = deviation * annualizer
+        metrics['sharpe_ratio'][day] = excess.mean() / deviation * annualizer if deviation > 0 else 0
+        metrics['sortino_ratio'][day] = excess.mean() / downside * annualizer if downside > 0 else 0
+        metrics['drawdown'][day] = growth[-1] / growth.max() - 1
+        metrics['beta'][day] = np.cov(sample, market)[0, 1] / market.var(ddof=1)
+        metrics['tracking_error'][day] = (sample - market).std(ddof=1) * annualizer
+    return metrics
+
+
+def slice_days(valuation: ValuationMatrix, days: int) -> ValuationMatrix:
+    return ValuationMatrix(valuation.symbols, valuation.ordinals[:days], *(getattr(valuation, plane)[:days].copy() for plane in PLANES))
+
+
+def main(holdings: int = 1000, days: int = 5 * 252):
+    valuation, index_data = random_market_valuation(holdings, days)
+
+    start = time.perf_counter()
+    analytics = RollingAnalytics.from_valuation(valuation, index_data)
+    sums_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    metrics = analytics.all_metrics()
+    metrics_seconds = time.perf_counter() - start
+
+    # Reference over a sample of holdings, with one listed late, and the portfolio
+    closes = AsOfLookup.from_frame(index_data, ['nifty50']).asof(valuation.ordinals, 'nifty50')
+    benchmark = np.append(np.nan, closes[1:] / closes[:-1] - 1)
+    symbol_returns = np.concatenate([np.full((1, holdings), np.nan), valuation.symbol_returns()])
+    portfolio_returns = np.append(np.nan, valuation.daily_returns()[1:])
+    late = int(np.flatnonzero(np.isnan(valuation.price[0]))[0])
+    columns = list(range(SAMPLE_COLUMNS)) + [late, holdings]
+    start = time.perf_counter()
+    for column in columns:
+        returns = portfolio_returns if column == holdings else symbol_returns[:, column]
+        for window in ROLLING_WINDOWS:
+            for name, expected in reference_metrics(returns, benchmark, window).items():
+                key = f"{name}_nifty50_{window}" if name in ('beta', 'tracking_error') else f"{name}_{window}"
+                actual = metrics[key][:, column]
+                assert np.array_equal(np.isnan(actual), np.isnan(expected)), f"{key} of column {column} differs in coverage"
+                assert np.allclose(actual, expected, rtol=1e-6, atol=1e-9, equal_nan=True), f"{key} of column {column} differs"
+    reference_seconds = (time.perf_counter() - start) / len(columns) * (holdings + 1)
+
+    start = time.perf_counter()
+    latest = {(name, window): analytics.latest(name, window, index) for window in ROLLING_WINDOWS
+              for name, index in [(name, None) for name in ('volatility', 'sharpe_ratio', 'sortino_ratio', 'drawdown')] + [('beta', 'nifty50')]}
+    latest_seconds = time.perf_counter() - start
+    for (name, window), series in latest.items():
+        key = f"{name}_nifty50_{window}" if name == 'beta' else f"{name}_{window}"
+        assert np.allclose(series.to_numpy(), metrics[key][-1], rtol=1e-12, equal_nan=True), f"latest {key} differs"
+
+    values = np.random.default_rng(1).normal(size=(500, 3))
+    for window in (1, 2, 7, 64, 500, 600):
+        expected = np.array([values[max(row - window + 1, 0):row + 1].max(axis=0) for row in range(len(values))])
+        assert np.array_equal(sliding_max(values, window), expected), f"sliding maximum over {window} rows differs"
+
+    # Five days later, with a live close on the last known day replaced by the real one
+    known = slice_days(valuation, days - 5)
+    known.price[-1] *= 1.01
+    known.value[-1] *= 1.01
+    previous = RollingAnalytics.from_valuation(known, index_data)
+    start = time.perf_counter()
+    extended = previous.extend(valuation, index_data)
+    extend_seconds = time.perf_counter() - start
+    assert extended.columns == analytics.columns and np.array_equal(extended.ordinals, analytics.ordinals)
+    for name, sums in analytics.sums.items():
+        assert np.allclose(extended.sums[name], sums, rtol=1e-12, atol=1e-12), f"extended {name} sums differ"
+    assert np.allclose(extended.metric('sharpe_ratio', 63), analytics.metric('sharpe_ratio', 63), rtol=1e-9, equal_nan=True)
+    assert previous.extend(valuation, index_data, changed={valuation.symbols[0]}).sums['count'].shape == analytics.sums['count'].shape
+
+    print(f"{holdings} holdings, {days} days, windows {ROLLING_WINDOWS}, {len(metrics)} metrics")
+    print(f"running sums:            {sums_seconds:8.3f}s")
+    print(f"every metric and window: {metrics_seconds:8.3f}s")
+    print(f"latest day, 15 metrics:  {latest_seconds:8.3f}s")
+    print(f"window by window (est.): {reference_seconds:8.3f}s")
+    print(f"extend by five days:     {extend_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
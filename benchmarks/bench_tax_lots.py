@@ -0,0 +1,114 @@
+"""
+Cross-check and benchmark of the tax lot engine.
+Every seed matches a random split adjusted tradebook with long and short positions against a plain list
+implementation that scales every open lot at a split, in both cost modes, and the open lots must add up
+to the position of the holdings engine. The timed run matches a million fills.
+Usage:
+    python -m benchmarks.bench_tax_lots [fills] [seeds]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized
+from src.lib.tax_lots import FIFO, AVERAGE_COST, COST_METHODS, BONUS, SELL, QUANTITY_TOLERANCE, match_lots
+from src.models.lot_frame import LotFrame
+
+
+def reference_lots(tradebook, method):
+    """
+    The same matching with a list of lots in shares, every open lot rescaled at a split.
+    """
+    realized, open_rows = [], []
+    for symbol, rows in tradebook.symbol_groups().items():
+        lots, short, pool = [], False, 0.0     # pool is the total amount of the position, for average cost
+        for row in rows:
+            typ, quantity, price, opened = int(tradebook.typ[row]), float(tradebook.quantity[row]), float(tradebook.price[row]), tradebook.timestamp[row]
+            held = sum(lot[1] for lot in lots)
+            if typ == BONUS:
+                if lots and not short and held > 0:
+                    for lot in lots:
+                        lot[1] *= (held + quantity) / held
+                continue
+            if not lots or short == (typ == SELL):
+                short = typ == SELL if not lots else short
+                lots.append([opened, quantity, quantity * price])
+                pool += quantity * price
+                continue
+            remaining = quantity
+            while lots and remaining > QUANTITY_TOLERANCE * quantity:
+                lot, held = lots[0], sum(lot[1] for lot in lots)
+                closed = min(remaining, lot[1])
+                whole = closed >= lot[1] * (1 - QUANTITY_TOLERANCE)
+                amount = pool * closed / held if method == AVERAGE_COST else (lot[2] if whole else lot[2] * closed / lot[1])
+                if whole:
+                    lots.pop(0)
+                else:
+                    lot[1] -= closed
+                    lot[2] -= amount
+                pool -= amount
+                remaining -= closed
+                cost, proceeds = (closed * price, amount) if short else (amount, closed * price)
+                realized.append((symbol, closed, cost, proceeds, proceeds - cost, lot[0], opened, short))
+            if not lots:
+                pool = 0.0
+                if remaining > QUANTITY_TOLERANCE * quantity:
+                    short = typ == SELL
+                    lots.append([opened, remaining, remaining * price])
+                    pool = remaining * price
+        held = sum(lot[1] for lot in lots)
+        for lot in lots:
+            amount = pool * lot[1] / held if method == AVERAGE_COST else lot[2]
+            cost, proceeds = (0.0, amount) if short else (amount, 0.0)
+            open_rows.append((symbol, lot[1], cost, proceeds, 0.0, lot[0], np.datetime64('NaT', 's'), short))
+    return tuple(LotFrame(*(np.array([row[column] for row in rows_]) if rows_ else [] for column in range(len(LotFrame.COLUMNS))))
+                 for rows_ in (realized, open_rows))
+
+
+def assert_same_lots(expected: LotFrame, actual: LotFrame, label: str):
+    assert len(expected) == len(actual), f"{len(expected)} != {len(actual)} lots: {label}"
+    for column in LotFrame.COLUMNS:
+        left, right = getattr(expected, column), getattr(actual, column)
+        if left.dtype == np.float64:
+            assert np.allclose(left, right, rtol=1e-9, atol=1e-6), f"{column} differs: {label}"
+        else:
+            assert np.array_equal(left, right, equal_nan=left.dtype.kind == 'M'), f"{column} differs: {label}"
+
+
+def main(fills: int = 1000000, seeds: int = 10):
+    index_data = random_index_data(3000, np.random.default_rng(0))
+    for seed in range(seeds):
+        tradebook = random_tradebook(3000, symbols=25, seed=seed)
+        symbols = list(tradebook.unique_symbols())
+        store = stock_info_store(symbols, splits_per_symbol=1.0, seed=seed)
+        adjusted = adjust_for_splits(tradebook, store)
+        for method in COST_METHODS:
+            realized, open_lots = match_lots(adjusted, method)
+            expected_realized, expected_open = reference_lots(adjusted, method)
+            assert_same_lots(expected_realized, realized, f"realized {method} seed {seed}")
+            assert_same_lots(expected_open, open_lots, f"open {method} seed {seed}")
+
+        # The open lots add up to the position of the holdings engine
+        positions = {holding.symbol: holding.quantity for holding in generate_holdings_vectorized(symbols, adjusted, index_data, store)}
+        for symbol in symbols:
+            lots = open_lots.take(open_lots.symbol == symbol)
+            signed = np.where(lots.short, -lots.quantity, lots.quantity).sum()
+            assert np.isclose(signed, positions[symbol], atol=1e-6), f"open lots of {symbol} differ from the position, seed {seed}"
+
+    tradebook = random_tradebook(fills, symbols=500)
+    store = stock_info_store(list(tradebook.unique_symbols()))
+    adjusted = adjust_for_splits(tradebook, store)
+    print(f"{len(adjusted)} fills, {len(store)} symbols, cross-checked {seeds} seeds")
+    for method in (FIFO, AVERAGE_COST):
+        start = time.perf_counter()
+        realized, open_lots = match_lots(adjusted, method)
+        seconds = time.perf_counter() - start
+        print(f"{method:8s} {seconds:8.3f}s  ({len(adjusted) / seconds / 1e6:.2f}M fills/s, {len(realized)} realized pieces, {len(open_lots)} open lots)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,110 @@
+"""
+Benchmark and cross-check of the daily valuation matrix.
+A matrix extended day by day, and one whose columns were rewritten after trades changed, must equal a
+matrix built from scratch, and sampled cells must match a trade by trade replay, put in shares of today,
+and the raw closes.
+Usage:
+    python -m benchmarks.bench_valuation [trades] [symbols]
+"""
+import contextlib
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized
+from src.lib.market_data import FakeProvider
+from src.lib.price_store import splits_after
+from src.lib.trading_calendar import from_ordinal
+from src.lib.valuation import ValuationMatrix, PLANES, sync_valuation_matrix
+from src.models.trade import TradeType
+
+TODAY = datetime.date(2021, 12, 31)
+
+
+def assert_same_matrix(expected: ValuationMatrix, actual: ValuationMatrix, label: str):
+    assert expected.symbols == actual.symbols, f"symbols differ: {label}"
+    assert np.array_equal(expected.ordinals, actual.ordinals), f"days differ: {label}"
+    for plane in PLANES:
+        assert np.array_equal(getattr(expected, plane), getattr(actual, plane), equal_nan=True), f"{plane} differs: {label}"
+
+
+def check_cells(matrix: ValuationMatrix, adjusted, store, provider, samples: int = 200):
+    rng = np.random.default_rng(1)
+    trades = adjusted.to_trades()
+    for _ in range(samples):
+        row, column = int(rng.integers(len(matrix.ordinals))), int(rng.integers(len(matrix.symbols)))
+        day, symbol = from_ordinal(matrix.ordinals[row]), matrix.symbols[column]
+        quantity = sum(-trade.quantity if trade.typ == TradeType.SELL else trade.quantity
+                       for trade in trades if trade.symbol == symbol and trade.timestamp.date() <= day)
+        quantity *= splits_after(store.get(symbol), np.array([day], dtype='datetime64[D]'))[0]
+        history = provider.get_history(f"{symbol}.NS", end=day)
+        assert np.isclose(matrix.quantity[row, column], quantity), f"quantity of {symbol} on {day}"
+        assert np.isclose(matrix.price[row, column], history['close'].iloc[-1], rtol=1e-6), f"price of {symbol} on {day}"
+
+
+def main(trades: int = 200000, symbols: int = 500):
+    provider = FakeProvider()
+    index_data = random_index_data(3000, np.random.default_rng(0))
+    tradebook = random_tradebook(trades, symbols=symbols)
+    symbol_list = list(tradebook.unique_symbols())
+    store = stock_info_store(symbol_list)
+    adjusted = adjust_for_splits(tradebook, store)
+    holdings = generate_holdings_vectorized(symbol_list, adjusted, index_data, store)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        os.chdir(directory)     # The local price history is kept under metadata/ of the working directory
+        full, daily, edited = (os.path.join(directory, name) for name in ("full", "daily", "edited"))
+
+        start = time.perf_counter()
+        expected = sync_valuation_matrix(holdings, adjusted, index_data, store, provider, today=TODAY, directory=full)
+        build_seconds = time.perf_counter() - start
+
+        # Extend a matrix built a month earlier one day at a time
+        day = TODAY - datetime.timedelta(days=30)
+        sync_valuation_matrix(holdings, adjusted, index_data, store, provider, today=day, directory=daily)
+        extend_seconds = []
+        while day < TODAY:
+            day += datetime.timedelta(days=1)
+            start = time.perf_counter()
+            extended = sync_valuation_matrix(holdings, adjusted, index_data, store, provider, today=day, directory=daily)
+            extend_seconds.append(time.perf_counter() - start)
+        assert_same_matrix(expected, extended, "extended day by day")
+
+        # Drop the last trade of a few symbols and rewrite only their columns
+        sync_valuation_matrix(holdings, adjusted, index_data, store, provider, today=TODAY, directory=edited)
+        changed = set(symbol_list[:5])
+        last_trades = [rows[-1] for symbol, rows in adjusted.symbol_groups().items() if symbol in changed]
+        edited_tradebook = adjusted.take(np.setdiff1d(np.arange(len(adjusted)), last_trades))
+        edited_holdings = generate_holdings_vectorized(symbol_list, edited_tradebook, index_data, store)
+        start = time.perf_counter()
+        rewritten = sync_valuation_matrix(edited_holdings, edited_tradebook, index_data, store, provider, changed, today=TODAY, directory=edited)
+        rewrite_seconds = time.perf_counter() - start
+        rebuilt = sync_valuation_matrix(edited_holdings, edited_tradebook, index_data, store, provider, today=TODAY, directory=os.path.join(directory, "rebuilt"))
+        assert_same_matrix(rebuilt, rewritten, "columns rewritten")
+
+        start = time.perf_counter()
+        loaded = ValuationMatrix.load(full)
+        returns = loaded.daily_returns()
+        load_seconds = time.perf_counter() - start
+        os.chdir(cwd)
+
+    check_cells(expected, adjusted, store, provider)
+    assert np.isfinite(returns).all()
+    print(f"{len(adjusted)} trades, {len(expected.symbols)} symbols, {len(expected.ordinals)} trading days")
+    print(f"full build:              {build_seconds:8.3f}s")
+    print(f"extend by one day:       {np.median(extend_seconds):8.3f}s  (median of {len(extend_seconds)})")
+    print(f"rewrite {len(changed)} columns:       {rewrite_seconds:8.3f}s")
+    print(f"load and daily returns:  {load_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
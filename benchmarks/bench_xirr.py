@@ -0,0 +1,106 @@
+"""
+Cross-check and benchmark of the batched XIRR solver.
+Random cash flows of many holdings, including total losses, huge gains and flows without a sign change,
+are solved at once. Every rate must be a root of the net present value, and every holding a scalar
+bisection on one holding at a time finds a rate for must have one, which may be another root when
+sales before buys give the flows several sign changes. The timed runs solve 1,000 holdings cold, from
+the cache, and with one holding changed.
+Usage:
+    python -m benchmarks.bench_xirr [holdings] [flows]
+"""
+import datetime
+import sys
+import time
+
+import numpy as np
+
+from src.lib.returns import CashFlows, DAYS_PER_YEAR, solve_xirr, xirr_many
+
+
+def random_cash_flows(holdings: int, flows: int, rng: np.random.Generator) -> CashFlows:
+    """
+    Buys and sells on random days of a decade with a final value, the final value of some holdings
+    close to nothing, some multiplied a hundredfold, and a few without any inflow.
+    """
+    sizes = rng.integers(2, 2 * flows, size=holdings)
+    codes = np.repeat(np.arange(holdings), sizes)
+    start = datetime.date(2015, 1, 1).toordinal()
+    ordinals = start + rng.integers(0, 3650, size=len(codes))
+    amounts = -rng.uniform(1000, 100000, size=len(codes)) * np.where(rng.random(len(codes)) < 0.7, 1, -0.8)
+    last = np.cumsum(sizes) - 1
+    ordinals[last] = start + 3650
+    invested = -np.bincount(codes, weights=amounts, minlength=holdings)
+    multiple = rng.choice([1e-4, 0.5, 1.0, 1.5, 100.0], size=holdings, p=[0.05, 0.2, 0.3, 0.4, 0.05])
+    amounts[last] = np.abs(invested) * multiple
+    amounts[last[:holdings // 50]] = 0.0     # Nothing paid out
+    amounts[codes < holdings // 50] = -np.abs(amounts[codes < holdings // 50])
+    return CashFlows.from_rows([f"H{key}" for key in range(holdings)], codes, ordinals, amounts)
+
+
+def relative_npv(ordinals: np.ndarray, amounts: np.ndarray, rate: float) -> float:
+    exponent = -(ordinals - ordinals[0]) / DAYS_PER_YEAR * np.log1p(rate)
+    discount = np.exp(exponent - exponent.max())
+    return abs(np.sum(amounts * discount)) / np.sum(np.abs(amounts) * discount)
+
+
+def scalar_xirr(ordinals: np.ndarray, amounts: np.ndarray) -> float:
+    years = (ordinals - ordinals[0]) / DAYS_PER_YEAR
+    if not ((amounts > 0).any() and (amounts < 0).any()):
+        return np.nan
+
+    def sign(rate):
+        exponent = -years * np.log1p(rate)
+        return np.sign(np.sum(amounts * np.exp(exponent - exponent.max())))
+
+    low, high = -0.999999, 1e6
+    if sign(low) == sign(high):
+        return np.nan
+    low_sign = sign(low)
+    for _ in range(200):
+        middle = np.sqrt((1 + low) * (1 + high)) - 1
+        low, high = (middle, high) if sign(middle) == low_sign else (low, middle)
+    return (low + high) / 2
+
+
+def main(holdings: int = 1000, flows: int = 50):
+    flows_ = random_cash_flows(holdings, flows, np.random.default_rng(0))
+
+    start = time.perf_counter()
+    rates = solve_xirr(flows_)
+    batched_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = np.array([scalar_xirr(flows_.ordinals[first:last], flows_.amounts[first:last])
+                         for first, last in zip(flows_.offsets[:-1], flows_.offsets[1:])])
+    scalar_seconds = time.perf_counter() - start
+    assert not (np.isnan(rates) & ~np.isnan(expected)).any(), "a bracketed rate was missed"
+    for key, (first, last) in enumerate(zip(flows_.offsets[:-1], flows_.offsets[1:])):
+        if not np.isnan(rates[key]):
+            assert relative_npv(flows_.ordinals[first:last], flows_.amounts[first:last], rates[key]) < 1e-8, f"rate of {flows_.keys[key]} is no root"
+    same_root = np.isclose(rates, expected, rtol=1e-6, atol=1e-9)
+
+    cache = {}
+    xirr_many(flows_, cache)
+    start = time.perf_counter()
+    cached = xirr_many(flows_, cache)
+    cached_seconds = time.perf_counter() - start
+    assert np.array_equal(cached, rates, equal_nan=True)
+
+    key = int(np.flatnonzero(~np.isnan(rates))[0])
+    flows_.amounts[flows_.offsets[key + 1] - 1] *= 1.01     # A new price for one holding
+    start = time.perf_counter()
+    changed = xirr_many(flows_, cache)
+    changed_seconds = time.perf_counter() - start
+    others = np.arange(holdings) != key
+    assert np.array_equal(changed[others], rates[others], equal_nan=True) and changed[key] > rates[key]
+
+    print(f"{holdings} holdings, {len(flows_.amounts)} cash flows, {int(np.isnan(rates).sum())} without a rate, "
+          f"{int(same_root.sum())} on the bisection root")
+    print(f"batched solve:           {batched_seconds:8.3f}s")
+    print(f"scalar bisection:        {scalar_seconds:8.3f}s")
+    print(f"all cached:              {cached_seconds:8.3f}s")
+    print(f"one holding changed:     {changed_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,174 @@
+"""
+Reference copies of the row-by-row implementations that were replaced by the vectorized code paths.
+They are kept only so the benchmarks can time and cross-check the new paths against them.
+"""
+import datetime
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import pandas as pd
+
+from src.models.stock_info import StockInfo
+from src.models.trade import Trade
+
+
+@dataclass
+class ListTrade:
+    """Trade as it was stored before: a plain dataclass with a per-instance __dict__ and a str typ."""
+    symbol: str
+    quantity: int
+    price: float
+    typ: str
+    timestamp: datetime.datetime
+    remarks: str = ""
+
+
+@dataclass
+class ListHolding:
+    """The trend fields of Holding as they were stored before: lists of [date, value] lists."""
+    symbol: str = ""
+    investment_trend: list = field(default_factory=list)
+    quantity_trend: list = field(default_factory=list)
+    risk_free_return_trend: list = field(default_factory=list)
+    nifty50_return_trend: list = field(default_factory=list)
+    bsesensex_return_trend: list = field(default_factory=list)
+    niftybank_return_trend: list = field(default_factory=list)
+
+
+def load_manual_trades(file_path: str) -> List[Trade]:
+    manual_trades_df = pd.read_csv(file_path)
+    manual_trades_df['symbol'] = manual_trades_df['symbol'].str.split('-').str[0]
+
+    manual_trades = []
+    for trade in manual_trades_df.iterrows():
+        manual_trades.append(Trade(
+            symbol = trade[1]['symbol'],
+            quantity = abs(trade[1]['quantity']),
+            price = trade[1]['price'],
+            typ = 'buy' if trade[1]['quantity'] > 0 else 'sell',
+            timestamp = datetime.datetime.strptime(trade[1]['trade_date'], "%Y-%m-%d").replace(hour=0, minute=0, second=0),
+            remarks = trade[1]['remarks']
+        ))
+    return manual_trades
+
+
+def load_tradebook(tradebook_files: List[str], manual_trades_file: str) -> List[Trade]:
+    fiscal_year_trades = [pd.read_csv(file) for file in tradebook_files]
+    tradebook_df = pd.concat(fiscal_year_trades, ignore_index=True)
+    tradebook_df = tradebook_df.sort_values(by="order_execution_time")
+    tradebook_df['symbol'] = tradebook_df['symbol'].str.split('-').str[0]
+
+    tradebook = []
+    for trade in tradebook_df.iterrows():
+        tradebook.append(Trade(
+            symbol = trade[1]['symbol'],
+            quantity = trade[1]['quantity'],
+            price = trade[1]['price'],
+            typ = trade[1]['trade_type'],
+            timestamp = datetime.datetime.strptime(trade[1]['order_execution_time'], "%Y-%m-%dT%H:%M:%S")
+        ))
+
+    if manual_trades_file != "":
+        other_trades = load_manual_trades(manual_trades_file)
+        tradebook.extend(other_trades)
+        tradebook.sort(key=lambda t: t.timestamp)
+    return tradebook
+
+
+def generate_adjusted_tradebook(tradebook: List[Trade], stock_info_store: Dict[str, StockInfo]) -> List[Trade]:
+    tradebook_copy = list(tradebook)
+    for stock in stock_info_store.values():
+        for split in stock.stock_splits:
+            tradebook_copy.append(Trade(symbol = stock.symbol, quantity = 0, price = split.ratio, typ = 'bonus', timestamp = datetime.datetime.combine(split.split_date, datetime.time(0, 0, 0))))
+
+    tradebook_copy.sort(key=lambda t: t.timestamp)
+
+    adjusted_tradebook = []
+    holdings = defaultdict(int)
+
+    for trade in tradebook_copy:
+        if trade.typ == 'buy':
+            holdings[trade.symbol] += trade.quantity
+            adjusted_tradebook.append(trade)
+
+        elif trade.typ == 'sell':
+            holdings[trade.symbol] -= trade.quantity
+            adjusted_tradebook.append(trade)
+
+        elif trade.typ == 'bonus':
+            if holdings[trade.symbol] > 0:
+                bonus_quantity = holdings[trade.symbol] * (trade.price - 1)
+                holdings[trade.symbol] += bonus_quantity
+                adjusted_tradebook.append(Trade(symbol = trade.symbol, quantity = bonus_quantity, price = 0, typ = 'bonus', timestamp = trade.timestamp, remarks="bonus shares"))
+    return adjusted_tradebook
+
+
+def insert_dividend_into_db(database: str, symbol: str, ex_date: datetime.date, amount: float):
+    """A connection per row, as every database write opened its own connection before."""
+    connection = sqlite3.connect(database, isolation_level=None)
+    try:
+        connection.execute("INSERT OR REPLACE INTO Dividend (symbol, ex_date, amount) VALUES (?, ?, ?)", (symbol, ex_date.strftime("%Y-%m-%d"), amount))
+    finally:
+        connection.close()
+
+
+def insert_index_into_db(database: str, index_data: pd.DataFrame):
+    connection = sqlite3.connect(database, isolation_level=None)
+    try:
+        for _, row in index_data.iterrows():
+            connection.execute("""
+                INSERT OR REPLACE INTO IndexData (
+                    date, nifty50, bsesensex, niftybank
+                ) VALUES (?, ?, ?, ?)
+            """, (row['date'].isoformat(), row['nifty50'], row['bsesensex'], row['niftybank']))
+    finally:
+        connection.close()
+
+
+def calculate_index_revenue_for_holding(holding, index_data: pd.DataFrame):
+    index_dict = {}
+    for _, row in index_data.iterrows():
+        index_dict[row["date"]] = [row["nifty50"], row["bsesensex"], row["niftybank"]]
+
+    holding.risk_free_return_trend.append([holding.investment_trend[0][0], 0])
+    holding.nifty50_return_trend.append([holding.investment_trend[0][0], 0])
+    holding.bsesensex_return_trend.append([holding.investment_trend[0][0], 0])
+    holding.niftybank_return_trend.append([holding.investment_trend[0][0], 0])
+
+    for ind in range(1, len(holding.investment_trend)):
+        last_date = holding.investment_trend[ind - 1][0]
+        current_date = holding.investment_trend[ind][0]
+        number_of_days = (holding.investment_trend[ind][0] - holding.investment_trend[ind - 1][0]).days
+
+        while last_date not in index_dict:
+            last_date -= datetime.timedelta(days=1)
+            while last_date.weekday() in (5, 6):
+                last_date -= datetime.timedelta(days=1)
+
+        if current_date in index_dict:
+            holding.risk_free_return_trend.append([current_date, holding.investment_trend[ind - 1][1] * number_of_days * 0.075 / 365])
+            holding.nifty50_return_trend.append([current_date, (index_dict[current_date][0] - index_dict[last_date][0]) * holding.investment_trend[ind - 1][1]])
+            holding.bsesensex_return_trend.append([current_date, (index_dict[current_date][1] - index_dict[last_date][1]) * holding.investment_trend[ind - 1][1]])
+            holding.niftybank_return_trend.append([current_date, (index_dict[current_date][2] - index_dict[last_date][2]) * holding.investment_trend[ind - 1][1]])
+        else:
+            print(f"Warning: Missing index data for current_date {current_date}. Skipping calculation for this period.")
+
+    last_available_date = index_data["date"].max()
+    number_of_days = (last_available_date - holding.investment_trend[-1][0]).days
+
+    last_date = holding.investment_trend[-1][0]
+    while last_date not in index_dict:
+        last_date -= datetime.timedelta(days=1)
+        while last_date.weekday() in (5, 6):
+            last_date -= datetime.timedelta(days=1)
+
+    # Ensure last_available_date exists in index_dict
+    if last_available_date in index_dict:
+        holding.risk_free_return_trend.append([last_available_date, holding.investment_trend[-1][1] * number_of_days * 0.075 / 365])
+        holding.nifty50_return_trend.append([last_available_date, (index_dict[last_available_date][0] - index_dict[last_date][0]) * holding.investment_trend[-1][1]])
+        holding.bsesensex_return_trend.append([last_available_date, (index_dict[last_available_date][1] - index_dict[last_date][1]) * holding.investment_trend[-1][1]])
+        holding.niftybank_return_trend.append([last_available_date, (index_dict[last_available_date][2] - index_dict[last_date][2]) * holding.investment_trend[-1][1]])
+    else:
+        print(f"Warning: Missing index data for last_available_date {last_available_date}. Skipping final calculation.")
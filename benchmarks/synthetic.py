@@ -0,0 +1,147 @@
+"""
+Synthetic broker exports used by the benchmarks and tests. The generated files follow the column layout
+of the tradebook and manual trades CSVs read by src/lib/get_tradebook.py.
+"""
+import datetime
+import os
+from dataclasses import fields
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.lib.valuation import ValuationMatrix
+from src.models.stock_info import StockInfo, StockSplit
+from src.models.trade_frame import TradeFrame, TRADE_TYPES
+
+
+def random_symbols(count: int, rng: np.random.Generator) -> List[str]:
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    return sorted({"".join(rng.choice(letters, size=6)) for _ in range(count)})
+
+
+def write_tradebooks(directory: str, trades_per_file: int, files: int = 5, symbols: int = 200, seed: int = 0) -> Tuple[List[str], str]:
+    """
+    Write one tradebook CSV per fiscal year and a small manual trades CSV.
+    Args:
+        directory (str): Directory to write the files to
+        trades_per_file (int): Number of fills in each yearly tradebook
+        files (int): Number of yearly tradebooks
+        symbols (int): Number of distinct symbols
+        seed (int): Seed for the random generator
+    Returns:
+        Tuple[List[str], str]: Paths of the tradebook files and of the manual trades file
+    """
+    rng = np.random.default_rng(seed)
+    universe = np.array(random_symbols(symbols, rng))
+    os.makedirs(directory, exist_ok=True)
+
+    tradebook_files = []
+    for year in range(files):
+        start = np.datetime64(f"{2015 + year}-04-01T09:15:00")
+        offsets = np.sort(rng.integers(0, 365 * 24 * 3600, size=trades_per_file)).astype('timedelta64[s]')
+        df = pd.DataFrame({
+            'symbol': rng.choice(universe, size=trades_per_file) + np.where(rng.random(trades_per_file) < 0.1, "-BE", ""),
+            'trade_date': (start + offsets).astype('datetime64[D]').astype(str),
+            'exchange': 'NSE',
+            'segment': 'EQ',
+            'series': 'EQ',
+            'trade_type': np.where(rng.random(trades_per_file) < 0.6, 'buy', 'sell'),
+            'auction': False,
+            'quantity': rng.integers(1, 200, size=trades_per_file).astype(float),
+            'price': np.round(rng.uniform(10, 5000, size=trades_per_file), 2),
+            'trade_id': np.arange(trades_per_file),
+            'order_id': np.arange(trades_per_file),
+            'order_execution_time': (start + offsets).astype(str),
+        })
+        path = os.path.join(directory, f"tradebook_FY{2015 + year}.csv")
+        df.to_csv(path, index=False)
+        tradebook_files.append(path)
+
+    manual = pd.DataFrame({
+        'symbol': rng.choice(universe, size=50),
+        'trade_date': (np.datetime64("2016-01-01") + rng.integers(0, 365 * files, size=50).astype('timedelta64[D]')).astype(str),
+        'quantity': rng.integers(-20, 100, size=50),
+        'price': np.round(rng.uniform(10, 1000, size=50), 2),
+        'remarks': 'IPO',
+    })
+    manual_trades_file = os.path.join(directory, "manual_trades.csv")
+    manual.to_csv(manual_trades_file, index=False)
+    return tradebook_files, manual_trades_file
+
+
+def stock_info_store(symbols: List[str], splits_per_symbol: float = 0.3, seed: int = 0) -> Dict[str, StockInfo]:
+    """
+    StockInfo objects with random splits between 2015 and 2021 and otherwise neutral fundamentals.
+    """
+    rng = np.random.default_rng(seed)
+    required = [field.name for field in fields(StockInfo) if field.name not in ('stock_splits', 'dividends')]
+    store = {}
+    for symbol in symbols:
+        info = StockInfo(**{name: 0 for name in required})
+        info.symbol, info.symbol_yf, info.name = symbol, f"{symbol}.NS", symbol
+        info.previous_close = float(rng.uniform(10, 5000))
+        for _ in range(rng.poisson(splits_per_symbol)):
+            split_date = datetime.date(2015, 1, 1) + datetime.timedelta(days=int(rng.integers(0, 6 * 365)))
+            info.stock_splits.append(StockSplit(split_date=split_date, ratio=float(rng.choice([2, 5, 10, 1.5]))))
+        store[symbol] = info
+    return store
+
+
+def split_store_on_trade_days(tradebook: TradeFrame, seed: int = 0) -> Dict[str, StockInfo]:
+    """
+    StockInfo objects with random splits, plus about one split per symbol on the date of one of its trades.
+    """
+    rng = np.random.default_rng(seed)
+    store = stock_info_store(tradebook.unique_symbols(), splits_per_symbol=1.5, seed=seed)
+    dates = tradebook.dates
+    for symbol, rows in tradebook.symbol_groups().items():
+        for _ in range(rng.poisson(1.0)):
+            split_date = dates[rows[rng.integers(len(rows))]].astype(object)
+            store[symbol].stock_splits.append(StockSplit(split_date=split_date, ratio=float(rng.choice([2, 3, 5, 1.25]))))
+    return store
+
+
+def random_tradebook(trades: int, symbols: int = 50, seed: int = 0, years: int = 6) -> TradeFrame:
+    """
+    Random tradebook over some years from 2015 with a mix of long and short positions. Every eighth
+    trade is stamped at midnight, the time split entries use, so ties with splits are exercised.
+    """
+    rng = np.random.default_rng(seed)
+    universe = np.array(random_symbols(symbols, rng), dtype=object)
+    seconds = rng.integers(0, years * 365 * 24 * 3600, size=trades)
+    seconds[::8] -= seconds[::8] % (24 * 3600)
+    return TradeFrame(
+        symbol = rng.choice(universe, size=trades),
+        quantity = rng.integers(1, 100, size=trades),
+        price = np.round(rng.uniform(10, 2000, size=trades), 2),
+        typ = np.where(rng.random(trades) < 0.6, TRADE_TYPES.index('buy'), TRADE_TYPES.index('sell')),
+        timestamp = np.datetime64("2015-01-01T00:00:00") + np.sort(seconds).astype('timedelta64[s]')
+    )
+
+
+def random_market_valuation(symbols: int, days: int, seed: int = 0) -> Tuple[ValuationMatrix, pd.DataFrame]:
+    """
+    Valuation of random holdings over consecutive days, and the index history of those days. Closes
+    follow one market factor, the nifty50, at a random beta plus their own noise. A quarter of the
+    symbols list during the first half of the days, with NaN closes before, and every holding is
+    bought on its first close and held.
+    """
+    rng = np.random.default_rng(seed)
+    ordinals = (datetime.date(2015, 1, 1).toordinal() + np.arange(days)).astype(np.int32)
+    market = rng.normal(0.0004, 0.01, size=days)
+    returns = rng.uniform(0.5, 1.5, size=symbols) * market[:, None] + rng.normal(0, 0.015, size=(days, symbols))
+    price = rng.uniform(10, 5000, size=symbols) * np.exp(np.cumsum(np.log1p(returns), axis=0))
+    listed = np.where(rng.random(symbols) < 0.25, rng.integers(1, max(days // 2, 2), size=symbols), 0)
+    price[np.arange(days)[:, None] < listed] = np.nan
+    quantity = np.where(np.isnan(price), 0.0, rng.integers(1, 500, size=symbols).astype(np.float64))
+    value = np.nan_to_num(quantity * price)
+    flow = np.zeros_like(value)
+    flow[listed, np.arange(symbols)] = value[listed, np.arange(symbols)]
+    index_data = pd.DataFrame({
+        'date': [datetime.date.fromordinal(int(ordinal)) for ordinal in ordinals],
+        'nifty50': 10000 * np.cumprod(1 + market),
+        'bsesensex': 30000 * np.cumprod(1 + market + rng.normal(0, 0.002, size=days)),
+        'niftybank': 20000 * np.cumprod(1 + rng.normal(0.0003, 0.012, size=days)),
+    })
+    return ValuationMatrix([f"S{i:04d}" for i in range(symbols)], ordinals, quantity, price, value, flow), index_data
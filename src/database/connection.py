@@ -1,19 +1,138 @@
-import datetime
+import queue
+import atexit
 import sqlite3
-from typing import List
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
 
-DATE_TODAY = datetime.datetime.now().date().strftime("%Y-%m-%d")
+DATABASE_PATH = "metadata/trading_agent.db"
+POOL_SIZE = 4
 
-def connect() -> List:
+PRAGMAS = {
+    "journal_mode": "WAL",      # Readers do not block the writer and the other way around
+    "synchronous": "NORMAL",    # Safe with WAL, only the last transactions can be lost on power failure
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -16384,       # 16 MiB page cache per connection
+    "mmap_size": 268435456,     # Read through up to 256 MiB of memory mapped pages
+    "busy_timeout": 5000,       # Wait up to 5 seconds for another writer
+}
+
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of long-lived connections to one SQLite database.
+    Connections are opened lazily up to `size`, configured once with PRAGMAS and handed out again
+    after release, so a process opens at most `size` connections however many queries it runs.
+    """
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.opened = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """
+        Take an idle connection, open a new one while below the pool size, or wait for a release.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self.opened < self.size
+            if can_open:
+                self.opened += 1
+        if can_open:
+            return self._open()
+        return self._idle.get(timeout=timeout)
+
+    def release(self, connection: sqlite3.Connection):
+        if connection.in_transaction:      # Never hand out a connection with a half finished transaction
+            connection.rollback()
+        self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=PRAGMAS["busy_timeout"] / 1000, check_same_thread=False, isolation_level=None)
+        for pragma, value in PRAGMAS.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    The process wide connection pool, created on first use.
     """
-    Connect to the SQLite database.
-    Returns:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DATABASE_PATH)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def use_database(path: str) -> ConnectionPool:
+    """
+    Point the process wide pool at another database file, e.g. a scratch database for benchmarks.
+    Run migrations.migrate() afterwards to create the schema in a new file.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(path)
+        atexit.register(_pool.close)
+        return _pool
+
+
+@contextmanager
+def connect() -> Iterator[Tuple[sqlite3.Connection, sqlite3.Cursor]]:
+    """
+    Borrow a connection to the SQLite database from the pool. Statements autocommit unless
+    wrapped in a transaction.
+    Yields:
         connection: sqlite3.Connection
         cursor: sqlite3.Cursor
     """
+    pool = get_pool()
     try:
-        connection = sqlite3.connect(f"metadata/trading_agent_{DATE_TODAY}.db", autocommit=True)
-        cursor = connection.cursor()
-        return connection, cursor
+        connection = pool.acquire()
     except sqlite3.Error as e:
-        exit(f"Error connecting to the database: {e}")
\ No newline at end of file
+        exit(f"Error connecting to the database: {e}")
+    cursor = connection.cursor()
+    try:
+        yield connection, cursor
+    finally:
+        cursor.close()
+        pool.release(connection)
+
+
+@contextmanager
+def transaction() -> Iterator[Tuple[sqlite3.Connection, sqlite3.Cursor]]:
+    """
+    Borrow a connection and run everything inside the block as one write transaction,
+    committed on success and rolled back on any exception.
+    Yields:
+        connection: sqlite3.Connection
+        cursor: sqlite3.Cursor
+    """
+    with connect() as (connection, cursor):
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection, cursor
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
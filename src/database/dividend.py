@@ -1,18 +1,20 @@
+import json
 import sqlite3
 import datetime
-from typing import List
-from .connection import connect
+from typing import Dict, List
+from .connection import connect, transaction
 from src.models.stock_info import Dividend
 
-def create_dividend_table() -> bool:
+def create_dividend_table(cursor: sqlite3.Cursor) -> bool:
     """
     Create the Dividend table in the database.
     The Dividend table stores dividend data for stocks.
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the migration transaction.
     Returns:
         bool: True if the table was created successfully, False otherwise.
     """
     try:
-        connection, cursor = connect()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS Dividend (
                 symbol TEXT,
@@ -24,8 +26,6 @@ def create_dividend_table() -> bool:
         return True
     except sqlite3.Error as e:
         exit(f"Error creating Dividend table: {e}")
-    finally:
-        connection.close()
 
 def insert_dividend_into_db(symbol: str, ex_date: datetime.date, amount: float) -> bool:
     """
@@ -37,15 +37,29 @@ def insert_dividend_into_db(symbol: str, ex_date: datetime.date, amount: float)
     Returns:
         bool: True if the dividend was inserted successfully, False otherwise.
     """
+    return insert_dividends_into_db({symbol: [Dividend(ex_date, amount)]})
+
+def insert_dividends_into_db(dividends: Dict[str, List[Dividend]]) -> bool:
+    """
+    Insert or update the dividends of many symbols with a single executemany in one transaction.
+    Args:
+        dividends (Dict[str, List[Dividend]]): Dividend objects per stock symbol.
+    Returns:
+        bool: True if the dividends were inserted successfully, False otherwise.
+    """
+    rows = [
+        (symbol, dividend.ex_date.strftime("%Y-%m-%d"), dividend.amount)
+        for symbol, symbol_dividends in dividends.items() for dividend in symbol_dividends
+    ]
     try:
-        connection, cursor = connect()
-        ex_date_str = datetime.datetime.strftime(ex_date, "%Y-%m-%d")
-        cursor.execute("INSERT INTO Dividend (symbol, ex_date, amount) VALUES (?, ?, ?)", (symbol, ex_date_str, amount))
-        return True
+        with transaction() as (connection, cursor):
+            cursor.executemany("""
+                INSERT INTO Dividend (symbol, ex_date, amount, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(symbol, ex_date) DO UPDATE SET amount = excluded.amount, updated_at = excluded.updated_at
+            """, rows)
+            return True
     except sqlite3.Error as e:
-        exit(f"Error inserting dividend into database: {e}")
-    finally:
-        connection.close()
+        exit(f"Error inserting dividends into database: {e}")
 
 def get_dividends_from_db(symbol: str) -> List[Dividend]:
     """
@@ -56,12 +70,33 @@ def get_dividends_from_db(symbol: str) -> List[Dividend]:
         List[Dividend]: List of Dividend objects for the given stock symbol.
     """
     try:
-        connection, cursor = connect()
-        cursor.execute("SELECT ex_date, amount FROM Dividend WHERE symbol = ?", (symbol,))
-        rows = cursor.fetchall()
-        dividends = [Dividend(ex_date=datetime.datetime.strptime(row[0], "%Y-%m-%d").date(), amount=row[1]) for row in rows]
-        return dividends
+        with connect() as (connection, cursor):
+            cursor.execute("SELECT ex_date, amount FROM Dividend WHERE symbol = ?", (symbol,))
+            rows = cursor.fetchall()
+            dividends = [Dividend(ex_date=datetime.datetime.strptime(row[0], "%Y-%m-%d").date(), amount=row[1]) for row in rows]
+            return dividends
+    except sqlite3.Error as e:
+        exit(f"Error fetching dividends from database: {e}")
+
+def get_dividends_many_from_db(symbols: List[str]) -> Dict[str, List[Dividend]]:
+    """
+    Get the dividends of many symbols with one query, the symbols are passed as a single JSON array.
+    The lookup uses the (symbol, ex_date) primary key index, so rows come back grouped by symbol and in date order.
+    Args:
+        symbols (List[str]): Stock symbols.
+    Returns:
+        Dict[str, List[Dividend]]: List of Dividend objects for every given symbol, empty for symbols without dividends.
+    """
+    try:
+        with connect() as (connection, cursor):
+            cursor.execute("""
+                SELECT symbol, ex_date, amount FROM Dividend
+                WHERE symbol IN (SELECT value FROM json_each(?))
+                ORDER BY symbol, ex_date
+            """, (json.dumps(list(symbols)),))
+            dividends = {symbol: [] for symbol in symbols}
+            for symbol, ex_date, amount in cursor.fetchall():
+                dividends[symbol].append(Dividend(ex_date=datetime.datetime.strptime(ex_date, "%Y-%m-%d").date(), amount=amount))
+            return dividends
     except sqlite3.Error as e:
         exit(f"Error fetching dividends from database: {e}")
-    finally:
-        connection.close()
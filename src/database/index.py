@@ -1,16 +1,21 @@
 import sqlite3
+import datetime
+from typing import Dict, Optional, Tuple
 import pandas as pd
-from .connection import connect
+from .connection import connect, transaction
 
-def create_index_table():
+INDEX_COLUMNS = ('nifty50', 'bsesensex', 'niftybank')
+
+def create_index_table(cursor: sqlite3.Cursor) -> bool:
     """
     Create the IndexData table in the database.
     IndexData table stores the data for market indices like Nifty50, BSE Sensex, and Nifty Bank.
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the migration transaction.
     Returns:
         bool: True if the table was created successfully, False otherwise.
     """
     try:
-        connection, cursor = connect()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS IndexData (
                 date DATE PRIMARY KEY,
@@ -22,30 +27,72 @@ def create_index_table():
         return True
     except sqlite3.Error as e:
         exit(f"Error creating IndexData table: {e}")
-    finally:
-        connection.close()
 
 def insert_index_into_db(index_data: pd.DataFrame) -> bool:
     """
-    Insert index data into the IndexData table in the database.
+    Insert or update index data in the IndexData table with a single executemany in one transaction.
     Args:
         index_data (pd.DataFrame): DataFrame containing index data with columns - date, nifty50, bsesensex, niftybank.
     Returns:
         bool: True if the data was inserted successfully, False otherwise.
     """
+    dates = [date.isoformat() for date in index_data['date']]
+    values = index_data[list(INDEX_COLUMNS)].astype(object).where(index_data[list(INDEX_COLUMNS)].notna(), None)
+    rows = [(date, *row) for date, row in zip(dates, values.itertuples(index=False, name=None))]
     try:
-        connection, cursor = connect()
-        for _, row in index_data.iterrows():
-            cursor.execute("""
-                INSERT OR REPLACE INTO IndexData (
-                    date, nifty50, bsesensex, niftybank
-                ) VALUES (?, ?, ?, ?)
-            """, (row['date'], row['nifty50'], row['bsesensex'], row['niftybank']))
-        return True
+        with transaction() as (connection, cursor):
+            cursor.executemany(f"""
+                INSERT INTO IndexData (date, {", ".join(INDEX_COLUMNS)}, updated_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(date) DO UPDATE SET {", ".join(f"{column} = excluded.{column}" for column in INDEX_COLUMNS)}, updated_at = excluded.updated_at
+            """, rows)
+            return True
     except sqlite3.Error as e:
         exit(f"Error inserting index data into database: {e}")
-    finally:
-        connection.close()
+
+def upsert_index_column_into_db(column: str, index_data: pd.DataFrame) -> bool:
+    """
+    Insert or update the values of one index in the IndexData table, leaving the other indices untouched.
+    All rows are written in a single transaction.
+    Args:
+        column (str): Index column, one of nifty50, bsesensex, niftybank.
+        index_data (pd.DataFrame): DataFrame with columns - date, close.
+    Returns:
+        bool: True if the data was upserted successfully, False otherwise.
+    """
+    if column not in INDEX_COLUMNS:
+        raise ValueError(f"Unknown index column: {column}")
+    rows = [
+        (date.isoformat(), float(close))
+        for date, close in zip(index_data['date'], index_data['close']) if not pd.isna(close)
+    ]
+    try:
+        with transaction() as (connection, cursor):
+            cursor.executemany(f"""
+                INSERT INTO IndexData (date, {column}, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(date) DO UPDATE SET {column} = excluded.{column}, updated_at = excluded.updated_at
+            """, rows)
+            return True
+    except sqlite3.Error as e:
+        exit(f"Error upserting {column} index data into database: {e}")
+
+def get_index_date_ranges_from_db() -> Dict[str, Tuple[Optional[datetime.date], Optional[datetime.date]]]:
+    """
+    Fetch the first and last date stored for every index in the IndexData table.
+    Returns:
+        Dict[str, Tuple[Optional[datetime.date], Optional[datetime.date]]]: (first date, last date) per index column,
+            (None, None) for indices without any stored values.
+    """
+    try:
+        with connect() as (connection, cursor):
+            cursor.execute(f"""
+                SELECT {", ".join(f"MIN(CASE WHEN {column} IS NOT NULL THEN date END), MAX(CASE WHEN {column} IS NOT NULL THEN date END)" for column in INDEX_COLUMNS)}
+                FROM IndexData
+            """)
+            row = cursor.fetchone()
+            parse = lambda value: datetime.date.fromisoformat(value[:10]) if value else None
+            return {column: (parse(row[2 * i]), parse(row[2 * i + 1])) for i, column in enumerate(INDEX_COLUMNS)}
+    except sqlite3.Error as e:
+        exit(f"Error fetching index date ranges from database: {e}")
 
 def get_index_from_db() -> pd.DataFrame:
     """
@@ -54,15 +101,13 @@ def get_index_from_db() -> pd.DataFrame:
         pd.DataFrame: DataFrame containing all index data with columns - date, nifty50, bsesensex, niftybank.
     """
     try:
-        connection, cursor = connect()
-        cursor.execute("SELECT * FROM IndexData")
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        index_data = pd.DataFrame(rows, columns=columns)
-        index_data['date'] = pd.to_datetime(index_data['date'])
-        index_data['date'] = index_data['date'].dt.date
-        return index_data
+        with connect() as (connection, cursor):
+            cursor.execute("SELECT date, nifty50, bsesensex, niftybank FROM IndexData ORDER BY date")
+            rows = cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
+            index_data = pd.DataFrame(rows, columns=columns)
+            index_data['date'] = pd.to_datetime(index_data['date'])
+            index_data['date'] = index_data['date'].dt.date
+            return index_data
     except sqlite3.Error as e:
         exit(f"Error fetching index data from database: {e}")
-    finally:
-        connection.close()
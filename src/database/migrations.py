@@ -0,0 +1,55 @@
+import sqlite3
+from typing import Callable, List
+
+from .connection import transaction
+from .dividend import create_dividend_table
+from .index import create_index_table
+from .stock_info import create_stock_info_table
+from .stock_split import create_stock_split_table
+
+
+def initial_schema(cursor: sqlite3.Cursor):
+    """
+    The tables as they were created before the schema was versioned.
+    """
+    create_stock_info_table(cursor)
+    create_stock_split_table(cursor)
+    create_dividend_table(cursor)
+    create_index_table(cursor)
+
+
+def add_updated_at(cursor: sqlite3.Cursor):
+    """
+    Per-row fetch timestamps, used to decide when stored data is stale.
+    Rows written before this migration have no timestamp and are treated as stale.
+    """
+    for table in ("StockInfo", "StockSplit", "Dividend", "IndexData"):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP")
+
+
+# Append only: the position of a migration in this list is the schema version it upgrades to
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    initial_schema,
+    add_updated_at,
+]
+
+
+def migrate() -> int:
+    """
+    Bring the database schema up to date. The schema version is kept in PRAGMA user_version and every
+    pending migration runs in its own transaction, so a failed migration leaves the previous version intact.
+    Returns:
+        int: The schema version after migrating
+    """
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        try:
+            with transaction() as (connection, cursor):
+                current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                if current_version >= version:     # Already applied, possibly by another process
+                    continue
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                print(f"Migrated database to schema version {version}")
+        except sqlite3.Error as e:
+            exit(f"Error migrating database to schema version {version}: {e}")
+    return len(MIGRATIONS)
@@ -1,16 +1,20 @@
+import json
 import sqlite3
-from .connection import connect
+import datetime
+from typing import Dict, List
+from .connection import connect, transaction
 from src.models.stock_info import StockInfo
 
-def create_stock_info_table() -> bool:
+def create_stock_info_table(cursor: sqlite3.Cursor) -> bool:
     """
     Create the StockInfo table in the database.
     StockInfo table stores the data for individual stocks.
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the migration transaction.
     Returns:
         bool: True if the table was created successfully, False otherwise.
     """
     try:
-        connection, cursor = connect()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS StockInfo (
                 symbol TEXT PRIMARY KEY,
@@ -63,8 +67,6 @@ def create_stock_info_table() -> bool:
         return True
     except sqlite3.Error as e:
         exit(f"Error creating StockInfo table: {e}")
-    finally:
-        connection.close()
 
 def insert_stock_info_into_db(stock_info: StockInfo) -> bool:
     """
@@ -74,40 +76,48 @@ def insert_stock_info_into_db(stock_info: StockInfo) -> bool:
     Returns:
         bool: True if the StockInfo object was inserted successfully, False otherwise.
     """
+    return insert_stock_infos_into_db([stock_info])
+
+def insert_stock_infos_into_db(stock_infos: List[StockInfo]) -> bool:
+    """
+    Insert or replace many StockInfo objects with a single executemany in one transaction.
+    Args:
+        stock_infos (List[StockInfo]): StockInfo objects to insert into the database
+    Returns:
+        bool: True if the StockInfo objects were inserted successfully, False otherwise.
+    """
     try:
-        connection, cursor = connect()
-        cursor.execute("""
-            INSERT INTO StockInfo (
-                symbol, symbol_yf, name, city, industry, sector, previous_close, volume, 
-                average_volume_10days, average_volume_3months, fifty_two_week_low, 
-                fifty_two_week_high, fifty_two_week_change, market_cap, book_value, 
-                price_to_sales_trailing_12_months, price_to_book, trailing_pe, 
-                forward_pe, trailing_eps, forward_eps, price_eps_current_year, 
-                fifty_day_average, two_hundred_day_average, beta, debt_to_equity, 
-                enterprise_to_revenue, enterprise_to_ebitda, ebitda, total_debt, 
-                total_revenue, revenue_per_share, gross_profit, revenue_growth, 
-                gross_margins, ebitda_margins, operating_margins, eps_trailing_12months, 
-                eps_forward, eps_current_year, target_high_price, target_low_price, 
-                target_mean_price, dividend_yield, five_year_average_dividend_yield
-            ) VALUES (
-                :symbol, :symbol_yf, :name, :city, :industry, :sector, :previous_close, :volume, 
-                :average_volume_10days, :average_volume_3months, :fifty_two_week_low, 
-                :fifty_two_week_high, :fifty_two_week_change, :market_cap, :book_value, 
-                :price_to_sales_trailing_12_months, :price_to_book, :trailing_pe, 
-                :forward_pe, :trailing_eps, :forward_eps, :price_eps_current_year, 
-                :fifty_day_average, :two_hundred_day_average, :beta, :debt_to_equity, 
-                :enterprise_to_revenue, :enterprise_to_ebitda, :ebitda, :total_debt, 
-                :total_revenue, :revenue_per_share, :gross_profit, :revenue_growth, 
-                :gross_margins, :ebitda_margins, :operating_margins, :eps_trailing_12months, 
-                :eps_forward, :eps_current_year, :target_high_price, :target_low_price, 
-                :target_mean_price, :dividend_yield, :five_year_average_dividend_yield
-            )
-        """, stock_info.__dict__)
-        return True
+        with transaction() as (connection, cursor):
+            cursor.executemany("""
+                INSERT OR REPLACE INTO StockInfo (
+                    symbol, symbol_yf, name, city, industry, sector, previous_close, volume, 
+                    average_volume_10days, average_volume_3months, fifty_two_week_low, 
+                    fifty_two_week_high, fifty_two_week_change, market_cap, book_value, 
+                    price_to_sales_trailing_12_months, price_to_book, trailing_pe, 
+                    forward_pe, trailing_eps, forward_eps, price_eps_current_year, 
+                    fifty_day_average, two_hundred_day_average, beta, debt_to_equity, 
+                    enterprise_to_revenue, enterprise_to_ebitda, ebitda, total_debt, 
+                    total_revenue, revenue_per_share, gross_profit, revenue_growth, 
+                    gross_margins, ebitda_margins, operating_margins, eps_trailing_12months, 
+                    eps_forward, eps_current_year, target_high_price, target_low_price, 
+                    target_mean_price, dividend_yield, five_year_average_dividend_yield, updated_at
+                ) VALUES (
+                    :symbol, :symbol_yf, :name, :city, :industry, :sector, :previous_close, :volume, 
+                    :average_volume_10days, :average_volume_3months, :fifty_two_week_low, 
+                    :fifty_two_week_high, :fifty_two_week_change, :market_cap, :book_value, 
+                    :price_to_sales_trailing_12_months, :price_to_book, :trailing_pe, 
+                    :forward_pe, :trailing_eps, :forward_eps, :price_eps_current_year, 
+                    :fifty_day_average, :two_hundred_day_average, :beta, :debt_to_equity, 
+                    :enterprise_to_revenue, :enterprise_to_ebitda, :ebitda, :total_debt, 
+                    :total_revenue, :revenue_per_share, :gross_profit, :revenue_growth, 
+                    :gross_margins, :ebitda_margins, :operating_margins, :eps_trailing_12months, 
+                    :eps_forward, :eps_current_year, :target_high_price, :target_low_price, 
+                    :target_mean_price, :dividend_yield, :five_year_average_dividend_yield, CURRENT_TIMESTAMP
+                )
+            """, [stock_info.__dict__ for stock_info in stock_infos])
+            return True
     except sqlite3.Error as e:
         exit(f"Error inserting stock info into database: {e}")
-    finally:
-        connection.close()
 
 def get_stock_info_from_db(symbol: str) -> StockInfo:
     """
@@ -118,15 +128,37 @@ def get_stock_info_from_db(symbol: str) -> StockInfo:
         StockInfo: StockInfo object from the database
     """
     try:
-        connection, cursor = connect()
-        cursor.execute("SELECT * FROM StockInfo WHERE symbol = ?", (symbol,))
-        row = cursor.fetchone()
-        if row:
-            columns = [column[0] for column in cursor.description]
-            stock_info = StockInfo(**dict(zip(columns, row)))
-            return stock_info
-        return None
+        with connect() as (connection, cursor):
+            cursor.execute("SELECT * FROM StockInfo WHERE symbol = ?", (symbol,))
+            row = cursor.fetchone()
+            if row:
+                columns = [column[0] for column in cursor.description]
+                stock_info = StockInfo(**dict(zip(columns, row)))
+                if stock_info.updated_at:
+                    stock_info.updated_at = datetime.datetime.fromisoformat(stock_info.updated_at)
+                return stock_info
+            return None
     except Exception as e:
         exit(f"Error getting stock info from database: {e}")
-    finally:
-        connection.close()
+
+def get_stock_info_many_from_db(symbols: List[str]) -> Dict[str, StockInfo]:
+    """
+    Get the StockInfo objects of many symbols with one query, the symbols are passed as a single JSON array.
+    Args:
+        symbols (List[str]): Stock symbols to get from the database
+    Returns:
+        Dict[str, StockInfo]: StockInfo object per stored symbol, symbols that are not stored are left out
+    """
+    try:
+        with connect() as (connection, cursor):
+            cursor.execute("SELECT * FROM StockInfo WHERE symbol IN (SELECT value FROM json_each(?))", (json.dumps(list(symbols)),))
+            columns = [column[0] for column in cursor.description]
+            stock_infos = {}
+            for row in cursor.fetchall():
+                stock_info = StockInfo(**dict(zip(columns, row)))
+                if stock_info.updated_at:
+                    stock_info.updated_at = datetime.datetime.fromisoformat(stock_info.updated_at)
+                stock_infos[stock_info.symbol] = stock_info
+            return stock_infos
+    except sqlite3.Error as e:
+        exit(f"Error getting stock info from database: {e}")
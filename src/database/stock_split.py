@@ -1,19 +1,21 @@
+import json
 import sqlite3
 import datetime
-from typing import List
+from typing import Dict, List
 
-from .connection import connect
+from .connection import connect, transaction
 from src.models.stock_info import StockSplit
 
-def create_stock_split_table():
+def create_stock_split_table(cursor: sqlite3.Cursor) -> bool:
     """
     Create the StockSplit table in the database.
     StockSplit table stores the data for stock splits.
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the migration transaction.
     Returns:
         bool: True if the table was created successfully, False otherwise.
     """
     try:
-        connection, cursor = connect()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS StockSplit (
                 symbol TEXT,
@@ -25,8 +27,6 @@ def create_stock_split_table():
         return True
     except sqlite3.Error as e:
         exit(f"Error creating StockSplit table: {e}")
-    finally:
-        connection.close()
 
 def insert_stock_split_into_db(symbol: str, split_date: datetime.date, ratio: float) -> bool:
     """
@@ -38,15 +38,29 @@ def insert_stock_split_into_db(symbol: str, split_date: datetime.date, ratio: fl
     Returns:
         bool: True if the stock split was inserted successfully, False otherwise.
     """
+    return insert_stock_splits_into_db({symbol: [StockSplit(split_date, ratio)]})
+
+def insert_stock_splits_into_db(stock_splits: Dict[str, List[StockSplit]]) -> bool:
+    """
+    Insert or update the stock splits of many symbols with a single executemany in one transaction.
+    Args:
+        stock_splits (Dict[str, List[StockSplit]]): StockSplit objects per stock symbol.
+    Returns:
+        bool: True if the stock splits were inserted successfully, False otherwise.
+    """
+    rows = [
+        (symbol, split.split_date.strftime("%Y-%m-%d"), split.ratio)
+        for symbol, symbol_splits in stock_splits.items() for split in symbol_splits
+    ]
     try:
-        connection, cursor = connect()
-        split_date_str = datetime.datetime.strftime(split_date, "%Y-%m-%d")
-        cursor.execute("INSERT INTO StockSplit (symbol, split_date, ratio) VALUES (?, ?, ?)", (symbol, split_date_str, ratio))
-        return True
+        with transaction() as (connection, cursor):
+            cursor.executemany("""
+                INSERT INTO StockSplit (symbol, split_date, ratio, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(symbol, split_date) DO UPDATE SET ratio = excluded.ratio, updated_at = excluded.updated_at
+            """, rows)
+            return True
     except sqlite3.Error as e:
-        exit(f"Error inserting stock split into database: {e}")
-    finally:
-        connection.close()
+        exit(f"Error inserting stock splits into database: {e}")
 
 def get_stock_splits_from_db(symbol: str) -> List[StockSplit]:
     """
@@ -57,12 +71,33 @@ def get_stock_splits_from_db(symbol: str) -> List[StockSplit]:
         List[StockSplit]: List of StockSplit objects for the given stock symbol.
     """
     try:
-        connection, cursor = connect()
-        cursor.execute("SELECT split_date, ratio FROM StockSplit WHERE symbol = ?", (symbol,))
-        rows = cursor.fetchall()
-        stock_splits = [StockSplit(split_date=datetime.datetime.strptime(row[0], "%Y-%m-%d").date(), ratio=row[1]) for row in rows]
-        return stock_splits
+        with connect() as (connection, cursor):
+            cursor.execute("SELECT split_date, ratio FROM StockSplit WHERE symbol = ?", (symbol,))
+            rows = cursor.fetchall()
+            stock_splits = [StockSplit(split_date=datetime.datetime.strptime(row[0], "%Y-%m-%d").date(), ratio=row[1]) for row in rows]
+            return stock_splits
+    except sqlite3.Error as e:
+        exit(f"Error fetching stock splits from database: {e}")
+
+def get_stock_splits_many_from_db(symbols: List[str]) -> Dict[str, List[StockSplit]]:
+    """
+    Get the stock splits of many symbols with one query, the symbols are passed as a single JSON array.
+    The lookup uses the (symbol, split_date) primary key index, so rows come back grouped by symbol and in date order.
+    Args:
+        symbols (List[str]): Stock symbols.
+    Returns:
+        Dict[str, List[StockSplit]]: List of StockSplit objects for every given symbol, empty for symbols without stock splits.
+    """
+    try:
+        with connect() as (connection, cursor):
+            cursor.execute("""
+                SELECT symbol, split_date, ratio FROM StockSplit
+                WHERE symbol IN (SELECT value FROM json_each(?))
+                ORDER BY symbol, split_date
+            """, (json.dumps(list(symbols)),))
+            stock_splits = {symbol: [] for symbol in symbols}
+            for symbol, split_date, ratio in cursor.fetchall():
+                stock_splits[symbol].append(StockSplit(split_date=datetime.datetime.strptime(split_date, "%Y-%m-%d").date(), ratio=ratio))
+            return stock_splits
     except sqlite3.Error as e:
         exit(f"Error fetching stock splits from database: {e}")
-    finally:
-        connection.close()
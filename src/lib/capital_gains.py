@@ -0,0 +1,233 @@
+import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.lib.price_store import PriceStore, splits_after
+from src.models.lot_frame import LotFrame
+from src.models.stock_info import StockInfo
+
+# Capital gains on listed equity shares with securities transaction tax paid, sections 111A and 112A
+FISCAL_YEAR_START_MONTH = 4
+TERMS = ('speculative', 'short_term', 'long_term')
+SPECULATIVE, SHORT_TERM, LONG_TERM = range(len(TERMS))
+# Held for more than twelve months before the transfer
+LONG_TERM_YEARS = 1
+
+# Shares acquired before this day are grandfathered: their cost is at least the fair market value on
+# 31 January 2018, the highest price quoted that day, capped at the sale value
+GRANDFATHERED_BEFORE = datetime.date(2018, 2, 1)
+GRANDFATHERING_FMV_DATE = datetime.date(2018, 1, 31)
+
+# Rates by the date of transfer: (effective from, short term rate, long term rate). Long term gains
+# were exempt under section 10(38) until 31 March 2018.
+TAX_RATES = (
+    (datetime.date(2004, 10, 1), 0.15, 0.0),
+    (datetime.date(2018, 4, 1), 0.15, 0.10),
+    (datetime.date(2024, 7, 23), 0.20, 0.125),
+)
+# Long term gains exempt every fiscal year: (first fiscal year, amount)
+LONG_TERM_EXEMPTIONS = ((2018, 100000.0), (2024, 125000.0))
+HEALTH_AND_EDUCATION_CESS = 0.04
+LOSS_CARRY_FORWARD_YEARS = 8
+TAX_SUMMARY_COLUMNS = (
+    'fiscal_year', 'speculative', 'short_term_gain', 'short_term_loss', 'long_term_gain', 'long_term_loss', 'loss_set_off',
+    'loss_brought_forward', 'exemption', 'taxable_short_term', 'taxable_long_term', 'tax', 'loss_carried_forward'
+)
+
+
+def fiscal_year_boundaries(first_year: int, last_year: int) -> np.ndarray:
+    """
+    First day of every fiscal year from first_year to last_year + 1 as datetime64[D], so fiscal year
+    first_year + i covers boundaries[i] up to boundaries[i + 1].
+    """
+    return np.array([datetime.date(year, FISCAL_YEAR_START_MONTH, 1) for year in range(first_year, last_year + 2)], dtype='datetime64[D]')
+
+
+def fiscal_years(days: np.ndarray) -> np.ndarray:
+    """
+    Starting year of the fiscal year of every datetime64[D] day, 2024 for FY 2024-25.
+    """
+    if not len(days):
+        return np.empty(0, dtype=np.int64)
+    first_year = int(days.min().astype('datetime64[Y]').astype(np.int64)) + 1969
+    last_year = int(days.max().astype('datetime64[Y]').astype(np.int64)) + 1970
+    boundaries = fiscal_year_boundaries(first_year, last_year)
+    return first_year + np.searchsorted(boundaries, days, side='right') - 1
+
+
+def _date_codes(days: np.ndarray) -> np.ndarray:
+    """
+    Days as yyyymmdd integers, which compare like the dates and move a year by adding 10000.
+    """
+    years = days.astype('datetime64[Y]')
+    months = days.astype('datetime64[M]')
+    month_of_year = (months - years.astype('datetime64[M]')).astype(np.int64) + 1
+    day_of_month = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    return (years.astype(np.int64) + 1970) * 10000 + month_of_year * 100 + day_of_month
+
+
+def grandfathered_prices(store: PriceStore, symbols: Iterable[str]) -> Dict[str, float]:
+    """
+    Fair market value of a share on 31 January 2018, the highest price quoted that day, from the local
+    price history. Its prices are split adjusted like Yahoo Finance reports them, so the values are per
+    share of today, but not dividend adjusted, which would lower the fair market value by every later
+    dividend. Symbols without a quote that day are left out.
+    """
+    prices = {}
+    for symbol in symbols:
+        rows = store.rows(symbol, GRANDFATHERING_FMV_DATE, GRANDFATHERING_FMV_DATE)
+        if rows.stop > rows.start:
+            prices[symbol] = float(store.columns['high'][rows.start])
+    return prices
+
+
+def realized_gains(realized: LotFrame, fair_market_values: Optional[Dict[str, float]] = None,
+                   stock_info_store: Optional[Dict[str, StockInfo]] = None) -> pd.DataFrame:
+    """
+    Classify realized lot pieces for capital gains.
+    Round trips opened and closed on the same day, and short lots, are intraday trades and speculative
+    business income. Delivery trades held for more than twelve months are long term, the rest short term.
+    The cost of long term lots acquired before 1 February 2018 is grandfathered with the fair market value
+    on 31 January 2018.
+    Args:
+        realized (LotFrame): Realized lot pieces from match_lots
+        fair_market_values (Optional[Dict[str, float]]): Fair market value per share of today on 31 January 2018
+        stock_info_store (Optional[Dict[str, StockInfo]]): Stock information per symbol, for the splits
+            between a sale and today
+    Returns:
+        pd.DataFrame: One row per lot piece with symbol, fiscal_year, term, regime (index into TAX_RATES),
+            quantity, cost_basis, taxable_cost, proceeds, gain and taxable_gain
+    """
+    fair_market_values = fair_market_values or {}
+    stock_info_store = stock_info_store or {}
+    opened = realized.opened.astype('datetime64[D]')
+    closed = realized.closed.astype('datetime64[D]')
+
+    term = np.where(_date_codes(closed) > _date_codes(opened) + LONG_TERM_YEARS * 10000, LONG_TERM, SHORT_TERM)
+    term[realized.short | (opened == closed)] = SPECULATIVE
+    regime = np.searchsorted(np.array([rates[0] for rates in TAX_RATES], dtype='datetime64[D]'), closed, side='right') - 1
+
+    taxable_cost = realized.cost_basis.copy()
+    grandfathered = np.flatnonzero((term == LONG_TERM) & (opened < np.datetime64(GRANDFATHERED_BEFORE))
+                                   & (closed >= np.datetime64(TAX_RATES[1][0])))
+    if len(grandfathered):
+        codes, symbols = pd.factorize(realized.symbol[grandfathered])
+        fair_market_value = np.array([fair_market_values.get(symbol, np.nan) for symbol in symbols], dtype=np.float64)[codes] * realized.quantity[grandfathered]
+        order = np.argsort(codes, kind='stable')
+        for symbol, rows in zip(symbols, np.split(order, np.cumsum(np.bincount(codes, minlength=len(symbols)))[:-1])):
+            fair_market_value[rows] *= splits_after(stock_info_store.get(symbol), closed[grandfathered[rows]])
+        fair_market_value = np.minimum(fair_market_value, realized.proceeds[grandfathered])     # NaN without a quote keeps the cost
+        taxable_cost[grandfathered] = np.fmax(realized.cost_basis[grandfathered], fair_market_value)
+
+    return pd.DataFrame({
+        'symbol': realized.symbol,
+        'fiscal_year': fiscal_years(closed),
+        'term': term,
+        'regime': regime,
+        'quantity': realized.quantity,
+        'cost_basis': realized.cost_basis,
+        'taxable_cost': taxable_cost,
+        'proceeds': realized.proceeds,
+        'gain': realized.gain,
+        'taxable_gain': realized.proceeds - taxable_cost,
+    })
+
+
+def gains_by_symbol(gains: pd.DataFrame) -> pd.DataFrame:
+    """
+    Taxable gains of every symbol and fiscal year, one column per term.
+    """
+    totals = gains.groupby(['fiscal_year', 'symbol', 'term'], sort=True)['taxable_gain'].sum().unstack('term', fill_value=0.0)
+    return totals.reindex(columns=range(len(TERMS)), fill_value=0.0).set_axis(list(TERMS), axis=1)
+
+
+def _long_term_exemption(fiscal_year: int) -> float:
+    exemption = 0.0
+    for first_year, amount in LONG_TERM_EXEMPTIONS:
+        if fiscal_year >= first_year:
+            exemption = amount
+    return exemption
+
+
+def _rate(term: int, regime: int) -> float:
+    return TAX_RATES[regime][1 if term == SHORT_TERM else 2]
+
+
+def _absorb(buckets: List[list], loss: float, terms: tuple) -> float:
+    """
+    Set a loss off against the buckets of the given terms, highest rate first, and return what is left.
+    """
+    for bucket in sorted((bucket for bucket in buckets if bucket[0] in terms), key=lambda bucket: -bucket[1]):
+        used = min(loss, bucket[2])
+        bucket[2] -= used
+        loss -= used
+    return loss
+
+
+def tax_by_fiscal_year(gains: pd.DataFrame) -> pd.DataFrame:
+    """
+    Capital gains tax of every fiscal year.
+    Losses are set off within the year first, short term losses against any capital gain and long term
+    losses against long term gains, at the highest rates first. Losses left are carried forward for eight
+    years and set off oldest first in the same way. Gains and losses of an exempt source, long term
+    transfers before 1 April 2018 under section 10(38), are reported but neither set off nor carried forward. The long term exemption is applied to what is left of
+    the long term gains, and the tax includes the health and education cess but no surcharge, which
+    depends on the total income. Speculative gains are taxed at the slab rates and only reported.
+    Args:
+        gains (pd.DataFrame): Lot pieces from realized_gains
+    Returns:
+        pd.DataFrame: Indexed by fiscal year, with the gains and losses per term, the losses set off and
+            carried forward, the exemption used, the taxable gains and the tax
+    """
+    capital = gains[gains['term'] != SPECULATIVE]
+    sign = np.where(capital['taxable_gain'].to_numpy() > 0, 'gain', 'loss')
+    totals = capital.groupby([capital['fiscal_year'], capital['term'], capital['regime'], sign])['taxable_gain'].sum()
+    speculative = gains[gains['term'] == SPECULATIVE].groupby('fiscal_year')['taxable_gain'].sum()
+
+    years = sorted(set(gains['fiscal_year'].tolist()))
+    carried = []     # [fiscal year, term, loss] of the unabsorbed losses, oldest first
+    rows = []
+    for year in range(years[0], years[-1] + 1) if years else ():
+        year_totals = [(term, _rate(term, regime), kind, amount)
+                       for (fiscal_year, term, regime, kind), amount in totals.items() if fiscal_year == year]
+        buckets = [[term, rate, amount] for term, rate, kind, amount in year_totals if kind == 'gain' and rate > 0]
+        losses = {term: -sum(amount for loss_term, _, kind, amount in year_totals if loss_term == term and kind == 'loss')
+                  for term in (SHORT_TERM, LONG_TERM)}
+        allowed = {term: -sum(amount for loss_term, rate, kind, amount in year_totals if loss_term == term and kind == 'loss' and rate > 0)
+                   for term in (SHORT_TERM, LONG_TERM)}
+        row = {
+            'fiscal_year': year,
+            'speculative': float(speculative.get(year, 0.0)),
+            'short_term_gain': sum(amount for term, _, kind, amount in year_totals if term == SHORT_TERM and kind == 'gain'),
+            'short_term_loss': losses[SHORT_TERM],
+            'long_term_gain': sum(amount for term, _, kind, amount in year_totals if term == LONG_TERM and kind == 'gain'),
+            'long_term_loss': losses[LONG_TERM],
+        }
+
+        left_long = _absorb(buckets, allowed[LONG_TERM], (LONG_TERM,))
+        left_short = _absorb(buckets, allowed[SHORT_TERM], (SHORT_TERM, LONG_TERM))
+        brought_forward = 0.0
+        carried = [entry for entry in carried if year - entry[0] <= LOSS_CARRY_FORWARD_YEARS]
+        for entry in carried:
+            left = _absorb(buckets, entry[2], (SHORT_TERM, LONG_TERM) if entry[1] == SHORT_TERM else (LONG_TERM,))
+            brought_forward += entry[2] - left
+            entry[2] = left
+        carried = [entry for entry in carried if entry[2] > 0]
+        carried += [[year, term, loss] for term, loss in ((SHORT_TERM, left_short), (LONG_TERM, left_long)) if loss > 0]
+
+        exemption = _long_term_exemption(year)
+        exemption_used = exemption - _absorb(buckets, exemption, (LONG_TERM,))
+        tax = sum(bucket[1] * bucket[2] for bucket in buckets) * (1 + HEALTH_AND_EDUCATION_CESS)
+        row.update({
+            'loss_set_off': allowed[SHORT_TERM] - left_short + allowed[LONG_TERM] - left_long,
+            'loss_brought_forward': brought_forward,
+            'exemption': exemption_used,
+            'taxable_short_term': sum(bucket[2] for bucket in buckets if bucket[0] == SHORT_TERM),
+            'taxable_long_term': sum(bucket[2] for bucket in buckets if bucket[0] == LONG_TERM),
+            'tax': tax,
+            'loss_carried_forward': sum(entry[2] for entry in carried),
+        })
+        rows.append(row)
+    return pd.DataFrame(rows, columns=list(TAX_SUMMARY_COLUMNS)).set_index('fiscal_year')
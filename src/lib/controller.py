@@ -1,28 +1,205 @@
+import copy
 import json
+import datetime
+from typing import Dict, Optional, Set
 
-from src.lib.get_tradebook import generate_adjusted_tradebook, load_tradebook
+import numpy as np
+
+from src.lib.get_tradebook import (generate_adjusted_tradebook, load_tradebook, adjust_for_splits, adjusted_tradebook_cache_key,
+                                   cache_adjusted_tradebook, load_cached_adjusted_tradebook)
 from src.lib.get_stock_info import get_stock_info_store, get_index_data
-from src.lib.generate_holdings import generate_holdings_from_tradebook
-from src.lib.portfolio_parameters import portfolio_parameters
+from src.lib.market_data import create_provider
+from src.lib.parallel_holdings import generate_holdings_parallel
+from src.lib.generate_holdings import INDEX_COLUMNS, calculate_index_revenue_for_holding, value_holding
+from src.lib.incremental import symbol_fingerprints, split_fingerprints, changed_symbols, index_fingerprint, load_refresh_state, save_refresh_state
+from src.lib.capital_gains import GRANDFATHERED_BEFORE, grandfathered_prices, realized_gains, gains_by_symbol, tax_by_fiscal_year
+from src.lib.tax_lots import FIFO, match_lots, replace_symbol_lots
+from src.lib.portfolio_metrics import LazyPortfolio, portfolio_graph, portfolio_input_versions, set_portfolio_inputs
+from src.lib.price_store import PriceStore
+from src.lib.returns import update_returns
+from src.lib.risk import CovarianceCache
+from src.lib.rolling import RollingAnalytics
+from src.lib.trading_calendar import AsOfLookup
+from src.lib.valuation import sync_valuation_matrix
+from src.models.holding import Holding
 from src.models.portfolio import Portfolio
+from src.models.trade_frame import TradeFrame
 
 class Controller:
-    def __init__(self):
+    def __init__(self, today: Optional[datetime.date] = None):
         user_data = json.loads(open("user_data/user_data.json").read())
         self.name = user_data["name"]
         self.email = user_data["email"]
         self.tradebook_files = user_data["tradebook"]
         self.manual_trades_file = user_data["manual_tradebook"]
-        
-        self.tradebook = load_tradebook(self.tradebook_files, self.manual_trades_file)
-        self.symbols = set(entry.symbol for entry in self.tradebook)
-        self.stock_info_store = get_stock_info_store(self.symbols)
-        self.adjusted_tradebook = generate_adjusted_tradebook(self.tradebook, self.stock_info_store)
-        self.index_returns = get_index_data()
-        self.holdings = generate_holdings_from_tradebook(self.symbols, self.adjusted_tradebook, self.index_returns, self.stock_info_store)
-        
+        self.market_data = create_provider(user_data.get("market_data"))
+        self.workers = user_data.get("workers")     # Processes to build holdings with, the CPU count by default
+        self.cost_method = user_data.get("cost_method", FIFO)     # Cost basis of the tax lots, fifo or average
+
+        # State kept between refreshes, and saved for the next launch, to rebuild only what changed
+        self.tradebook_file_cache = {}
+        self.fingerprints: Dict[str, str] = {}
+        self.split_fingerprints: Dict[str, str] = {}
+        self.index_fingerprint = None
+        self.adjusted_tradebook: TradeFrame = None
+        self.holdings_by_symbol: Dict[str, Holding] = {}
+        self.portfolio: Portfolio = None
+        self.covariance_cache = CovarianceCache()
+        self.metric_graph = portfolio_graph(self.covariance_cache, self.workers)
+        self.xirr_cache: Dict[bytes, float] = {}
+        self.rolling_analytics: RollingAnalytics = None
+
+        self._restore(load_refresh_state())
+        self.refresh(today)
+
+    def _restore(self, state: Optional[dict]):
+        """
+        Continue from the state the last refresh of an earlier launch saved, if it was built with the same
+        cost method and its adjusted tradebook is still cached.
+        """
+        if state is None or state['cost_method'] != self.cost_method:
+            return
+        adjusted_tradebook = load_cached_adjusted_tradebook(state['adjusted_tradebook_key'])
+        if adjusted_tradebook is None:
+            return
+        self.adjusted_tradebook = adjusted_tradebook
+        self.tradebook_file_cache = state['tradebook_files']
+        self.fingerprints = state['fingerprints']
+        self.split_fingerprints = state['split_fingerprints']
+        self.index_fingerprint = state['index_fingerprint']
+        self.holdings_by_symbol = state['holdings']
+        groups = adjusted_tradebook.symbol_groups()
+        for symbol, holding in self.holdings_by_symbol.items():
+            holding.trades = adjusted_tradebook.take(groups[symbol]).to_trades() if symbol in groups else []
+        self.realized_lots, self.open_lots = state['realized_lots'], state['open_lots']
+        self.xirr_cache = state['xirr']
+        self.covariance_cache.states = state['covariance']
+
+    def refresh(self, today: Optional[datetime.date] = None) -> Set[str]:
+        """
+        Bring the holdings and the portfolio up to date with the tradebook files and the stored market data.
+        Only tradebook files that changed on disk are parsed again, and only the holdings of symbols whose
+        trades, splits or dividends changed since the last run are rebuilt, the others are valued at the
+        new previous close. The last run may be one of an earlier launch, whose state is saved at the end
+        of every refresh. The portfolio parameters are nodes of a metric graph, only those downstream of
+        inputs that changed are dropped and they are computed again when next read.
+        Args:
+            today (Optional[datetime.date]): Last day to value the holdings on, today by default
+        Returns:
+            Set[str]: Symbols whose holdings were rebuilt or removed
+        """
+        self.tradebook = load_tradebook(self.tradebook_files, self.manual_trades_file, file_cache=self.tradebook_file_cache)
+        self.symbols = set(self.tradebook.unique_symbols())
+        self.stock_info_store = get_stock_info_store(self.symbols, self.market_data)
+        self.index_returns = get_index_data(self.market_data, start_date=self.tradebook.dates.min().astype(object) if len(self.tradebook) else None, today=today)
+
+        fingerprints = symbol_fingerprints(self.tradebook, self.stock_info_store)
+        changed = changed_symbols(self.fingerprints, fingerprints)
+        full_build = self.adjusted_tradebook is None
+        if full_build:
+            self.adjusted_tradebook = generate_adjusted_tradebook(self.tradebook, self.stock_info_store)
+            rebuilt = generate_holdings_parallel(sorted(self.symbols), self.adjusted_tradebook, self.index_returns, self.stock_info_store, self.workers)
+        else:
+            rebuilt = self._rebuild(changed)
+        self.fingerprints = fingerprints
+
+        # Tax lots, matched again only for the changed symbols
+        if full_build:
+            self.realized_lots, self.open_lots = match_lots(self.adjusted_tradebook, self.cost_method)
+        else:
+            realized, open_lots = match_lots(self.adjusted_tradebook.take(np.isin(self.adjusted_tradebook.symbol, list(changed))), self.cost_method)
+            self.realized_lots = replace_symbol_lots(self.realized_lots, changed, realized)
+            self.open_lots = replace_symbol_lots(self.open_lots, changed, open_lots)
+
+        for symbol in changed - self.symbols:
+            self.holdings_by_symbol.pop(symbol, None)
+        self.holdings_by_symbol.update((holding.symbol, holding) for holding in rebuilt)
+        for symbol, holding in self.holdings_by_symbol.items():
+            holding.stock_info = self.stock_info_store.get(symbol)
+            if symbol not in changed:
+                value_holding(holding, self.stock_info_store, 'buy' if holding.quantity >= 0 else 'sell')
+
+        # A new index day moves the benchmark returns of every holding, not just the rebuilt ones
+        index_changed = index_fingerprint(self.index_returns) != self.index_fingerprint
+        if index_changed and self.index_fingerprint is not None:
+            index_lookup = AsOfLookup.from_frame(self.index_returns, INDEX_COLUMNS)
+            for symbol, holding in self.holdings_by_symbol.items():
+                if symbol not in changed:
+                    calculate_index_revenue_for_holding(holding, index_lookup)
+        self.index_fingerprint = index_fingerprint(self.index_returns)
+
+        self.holdings = list(self.holdings_by_symbol.values())
         # Separate holdings into current and past holdings
         self.current_holdings = [holding for holding in self.holdings if holding.quantity != 0]
         self.past_holdings = [holding for holding in self.holdings if len(holding.realized_profit_history) != 0]
 
-        self.portfolio = portfolio_parameters(self.current_holdings, self.stock_info_store)
\ No newline at end of file
+        # Daily market value of every holding, the source of the portfolio value curve, returns and risk
+        self.valuation = sync_valuation_matrix(self.holdings, self.adjusted_tradebook, self.index_returns, self.stock_info_store, self.market_data, changed, today)
+        # Covariances roll forward to the new day unless a split changed the earlier closes of a symbol
+        splits = split_fingerprints(self.stock_info_store)
+        self.covariance_cache.invalidate(changed_symbols(self.split_fingerprints, splits))
+        self.split_fingerprints = splits
+        # Only the metrics downstream of a changed input are recomputed. The fields are not sums over the
+        # holdings, the weights depend on the total value and the risk on the returns of the whole portfolio
+        versions =portfolio_input_versions(self.current_holdings, self.stock_info_store, self.valuation, self.index_returns, self.fingerprints)
+        invalidated = set_portfolio_inputs(self.metric_graph, self.current_holdings, self.stock_info_store, self.valuation, self.index_returns, versions)
+        self.metric_graph.reset_log()
+        if self.portfolio is None:
+            self.portfolio = LazyPortfolio(self.metric_graph)
+        else:
+            print(f"Invalidated {len(invalidated)} portfolio metrics")
+        update_returns(self.holdings, self.portfolio, self.adjusted_tradebook, self.valuation, self.xirr_cache, today)
+        # Rolling risk of every holding and the portfolio, extended by the new days when no earlier row changed
+        if self.rolling_analytics is None:
+            self.rolling_analytics = RollingAnalytics.from_valuation(self.valuation, self.index_returns)
+        else:
+            self.rolling_analytics = self.rolling_analytics.extend(self.valuation, self.index_returns, changed)
+
+        # Capital gains of the realized lots, the price history synced above has the grandfathering prices
+        grandfathered = self.realized_lots.symbol[self.realized_lots.opened < np.datetime64(GRANDFATHERED_BEFORE)]
+        fair_market_values = grandfathered_prices(PriceStore.load(), set(grandfathered.tolist()))
+        self.realized_gains = realized_gains(self.realized_lots, fair_market_values, self.stock_info_store)
+        self.gains_by_symbol = gains_by_symbol(self.realized_gains)
+        self.tax_by_fiscal_year = tax_by_fiscal_year(self.realized_gains)
+        self._save()
+        return changed
+
+    def _save(self):
+        """
+        Save the state the next launch continues from, with the adjusted tradebook in its cache. The trades
+        and stock information of the holdings are left out, they are restored from the adjusted tradebook
+        and the stock information of the next refresh.
+        """
+        holdings = {}
+        for symbol, holding in self.holdings_by_symbol.items():
+            holdings[symbol] = copy.copy(holding)
+            holdings[symbol].trades, holdings[symbol].stock_info = [], None
+        adjusted_tradebook_key = adjusted_tradebook_cache_key(self.tradebook, self.stock_info_store)
+        cache_adjusted_tradebook(self.adjusted_tradebook, adjusted_tradebook_key)
+        save_refresh_state({
+            'cost_method': self.cost_method,
+            'adjusted_tradebook_key': adjusted_tradebook_key,
+            'tradebook_files': self.tradebook_file_cache,
+            'fingerprints': self.fingerprints,
+            'split_fingerprints': self.split_fingerprints,
+            'index_fingerprint': self.index_fingerprint,
+            'holdings': holdings,
+            'realized_lots': self.realized_lots,
+            'open_lots': self.open_lots,
+            'xirr': self.xirr_cache,
+            'covariance': self.covariance_cache.states,
+        })
+
+    def _rebuild(self, changed: Set[str]):
+        """
+        Adjust the trades of the changed symbols for splits, splice them into the adjusted tradebook
+        in place of their previous rows, and build their holdings again.
+        """
+        symbols = changed & self.symbols
+        changed_rows = np.isin(self.tradebook.symbol, list(symbols))
+        adjusted = adjust_for_splits(self.tradebook.take(changed_rows), self.stock_info_store)
+        unchanged_rows = ~np.isin(self.adjusted_tradebook.symbol, list(changed))
+        self.adjusted_tradebook = TradeFrame.merge([self.adjusted_tradebook.take(unchanged_rows), adjusted])
+        if symbols:
+            print(f"Rebuilding holdings of {len(symbols)} changed symbols")
+        return generate_holdings_parallel(sorted(symbols), adjusted, self.index_returns, self.stock_info_store, self.workers)
@@ -0,0 +1,137 @@
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up to `capacity`,
+    and every request takes one token, blocking until one is available.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None):
+        """
+        Take one token.
+        Args:
+            deadline (Optional[float]): time.monotonic() value after which waiting is abandoned
+        Raises:
+            TimeoutError: If no token becomes available before the deadline
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait_seconds > deadline:
+                raise TimeoutError("Rate limit wait exceeds the deadline")
+            time.sleep(wait_seconds)
+
+
+class ConcurrentFetcher:
+    """
+    Runs network bound jobs on a bounded thread pool.
+    Every provider call made through the `call` function handed to a job is rate limited by a shared
+    token bucket and retried with exponential backoff and jitter. A job that has not finished within
+    `timeout` seconds of starting is abandoned, and jobs for a key that is already being fetched are
+    coalesced onto the in-flight request instead of hitting the network again.
+    """
+    def __init__(self, max_workers: int = 8, rate: float = 5.0, burst: Optional[float] = None, retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0, timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate, burst)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetcher")
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._started: Dict[Future, float] = {}
+        self._lock = threading.Lock()
+
+    def call(self, function: Callable, *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Call `function` once a rate limit token is available, retrying failures with exponential
+        backoff until `retries` retries are used up or the deadline passes.
+        """
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire(deadline)
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise TimeoutError(f"Retrying after '{e}' would exceed the deadline") from e
+                time.sleep(delay)
+
+    def submit(self, key: Hashable, job: Callable[[Hashable, Callable], Any]) -> Future:
+        """
+        Schedule job(key, call) unless a job for the same key is already in flight, in which case the
+        in-flight future is returned.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._run, key, job)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def fetch_many(self, keys: Iterable[Hashable], job: Callable[[Hashable, Callable], Any]) -> Dict[Hashable, Any]:
+        """
+        Run job(key, call) for every distinct key, with at most `max_workers` jobs at a time.
+        Args:
+            keys (Iterable[Hashable]): Keys to fetch, e.g. stock symbols
+            job (Callable): Function taking the key and a `call` function that must wrap every provider request
+        Returns:
+            Dict[Hashable, Any]: Result for every key, None for keys that failed or timed out
+        """
+        futures = {key: self.submit(key, job) for key in dict.fromkeys(keys)}
+        results = {}
+        pending = set(futures.values())
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            with self._lock:
+                expired = {future for future in pending if now - self._started.get(future, now) > self.timeout + self.backoff}
+            pending -= expired
+
+        for key, future in futures.items():
+            if not future.done():
+                print(f"Timed out fetching {key} after {self.timeout}s")
+                results[key] = None
+            elif future.exception() is not None:
+                print(f"Error fetching {key}: {future.exception()}")
+                results[key] = None
+            else:
+                results[key] = future.result()
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, key: Hashable, job: Callable[[Hashable, Callable], Any]) -> Any:
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._started[future] = time.monotonic()
+        deadline = time.monotonic() + self.timeout
+        return job(key, lambda function, *args, **kwargs: self.call(function, *args, deadline=deadline, **kwargs))
+
+    def _forget(self, key: Hashable):
+        with self._lock:
+            future = self._in_flight.pop(key, None)
+            self._started.pop(future, None)
@@ -1,58 +1,45 @@
 import datetime
-from datetime import timedelta
+import numpy as np
 import pandas as pd
 from typing import List, Dict
 
+from src.lib.trading_calendar import AsOfLookup
 from src.models.trade import Trade
 from src.models.holding import Holding
 from src.models.stock_info import StockInfo
-
-def calculate_index_revenue_for_holding(holding: Holding, index_data: pd.DataFrame):
-    index_dict = {}
-    for _, row in index_data.iterrows():
-        index_dict[row["date"]] = [row["nifty50"], row["bsesensex"], row["niftybank"]]
-
-    holding.risk_free_return_trend.append([holding.investment_trend[0][0], 0])
-    holding.nifty50_return_trend.append([holding.investment_trend[0][0], 0])
-    holding.bsesensex_return_trend.append([holding.investment_trend[0][0], 0])
-    holding.niftybank_return_trend.append([holding.investment_trend[0][0], 0])
-
-    for ind in range(1, len(holding.investment_trend)):
-        last_date = holding.investment_trend[ind - 1][0]
-        current_date = holding.investment_trend[ind][0]
-        number_of_days = (holding.investment_trend[ind][0] - holding.investment_trend[ind - 1][0]).days
-
-        while last_date not in index_dict:
-            last_date -= timedelta(days=1)
-            while last_date.weekday() in (5, 6):
-                last_date -= timedelta(days=1)
-
-        if current_date in index_dict:
-            holding.risk_free_return_trend.append([current_date, holding.investment_trend[ind - 1][1] * number_of_days * 0.075 / 365])
-            holding.nifty50_return_trend.append([current_date, (index_dict[current_date][0] - index_dict[last_date][0]) * holding.investment_trend[ind - 1][1]])
-            holding.bsesensex_return_trend.append([current_date, (index_dict[current_date][1] - index_dict[last_date][1]) * holding.investment_trend[ind - 1][1]])
-            holding.niftybank_return_trend.append([current_date, (index_dict[current_date][2] - index_dict[last_date][2]) * holding.investment_trend[ind - 1][1]])
-        else:
-            print(f"Warning: Missing index data for current_date {current_date}. Skipping calculation for this period.")
-
-    last_available_date = index_data["date"].max()
-    number_of_days = (last_available_date - holding.investment_trend[-1][0]).days
-
-    last_date = holding.investment_trend[-1][0]
-    while last_date not in index_dict:
-        last_date -= timedelta(days=1)
-        while last_date.weekday() in (5, 6):
-            last_date -= timedelta(days=1)
-
-    # Ensure last_available_date exists in index_dict
-    if last_available_date in index_dict:
-        holding.risk_free_return_trend.append([last_available_date, holding.investment_trend[-1][1] * number_of_days * 0.075 / 365])
-        holding.nifty50_return_trend.append([last_available_date, (index_dict[last_available_date][0] - index_dict[last_date][0]) * holding.investment_trend[-1][1]])
-        holding.bsesensex_return_trend.append([last_available_date, (index_dict[last_available_date][1] - index_dict[last_date][1]) * holding.investment_trend[-1][1]])
-        holding.niftybank_return_trend.append([last_available_date, (index_dict[last_available_date][2] - index_dict[last_date][2]) * holding.investment_trend[-1][1]])
-    else:
-        print(f"Warning: Missing index data for last_available_date {last_available_date}. Skipping final calculation.")
-
+from src.models.trend_series import TrendSeries
+
+RISK_FREE_RATE = 0.075
+INDEX_COLUMNS = ("nifty50", "bsesensex", "niftybank")
+
+def calculate_index_revenue_for_holding(holding: Holding, index_lookup: AsOfLookup):
+    """
+    Returns the holding's investment would have earned at the risk free rate and in every index, per
+    period between consecutive investment trend points and up to the last index date.
+    Index levels are looked up as of every trend date, so trades on holidays and weekends use the
+    previous session's close. Periods that start before the index history have no benchmark return
+    and are NaN.
+    Args:
+        holding (Holding): Holding with its investment trend
+        index_lookup (AsOfLookup): Index closes with the columns nifty50, bsesensex and niftybank
+    """
+    if len(index_lookup) == 0:
+        print(f"Warning: No index data available. Skipping benchmark returns for {holding.symbol}.")
+        return
+
+    ordinals = holding.investment_trend.ordinals
+    investment = holding.investment_trend.values
+    if len(ordinals) and ordinals[0] < index_lookup.ordinals[0]:
+        print(f"Warning: Index data starts after the first trade of {holding.symbol}. Its earlier benchmark returns are missing.")
+    period_ends = np.append(ordinals[1:], index_lookup.last_ordinal)
+    levels = index_lookup.asof(np.append(ordinals, index_lookup.last_ordinal))
+    index_returns = (levels[1:] - levels[:-1]) * investment[:, None]
+    days = np.maximum(period_ends - ordinals, 0)     # Trades after the last index date earn nothing yet
+
+    trend_ordinals = np.append(ordinals[0], period_ends)
+    holding.risk_free_return_trend = TrendSeries.from_arrays(trend_ordinals, np.append(0.0, investment * days * RISK_FREE_RATE / 365))
+    for position, column in enumerate(index_lookup.columns):
+        setattr(holding, f"{column}_return_trend", TrendSeries.from_arrays(trend_ordinals, np.append(0.0, index_returns[:, position])))
 
 
 def calculate_dividend_revenue_for_holding(holding: Holding):
@@ -73,8 +60,67 @@ def calculate_dividend_revenue_for_holding(holding: Holding):
         else:
             dividend_ptr += 1
 
+def apply_trades_to_holding(holding: Holding) -> str:
+    """
+    Replay the holding's trades in order, updating its quantity, investment, buy average,
+    realized profit and the quantity and investment trends.
+    Returns:
+        str: The position after the last trade, 'buy' for long and 'sell' for short
+    """
+    current_position = None
+    for trade in holding.trades:
+        if current_position is None:
+            current_position = trade.typ
+
+        if trade.typ == current_position:
+            if trade.typ == 'buy' or trade.typ == 'bonus':
+                holding.quantity += trade.quantity
+            else:
+                holding.quantity -= trade.quantity
+
+            holding.investment += trade.quantity * trade.price
+
+        else:
+            if trade.typ == 'buy' or trade.typ == 'bonus':
+                holding.realized_profit_history.append([trade.timestamp, min(trade.quantity, -holding.quantity) * (holding.buy_average - trade.price)])
+                holding.quantity += trade.quantity
+            else:
+                holding.realized_profit_history.append([trade.timestamp, min(trade.quantity, holding.quantity) * (trade.price - holding.buy_average)])
+                holding.quantity -= trade.quantity
+
+            current_position = 'buy' if holding.quantity >= 0 else 'sell'
+            holding.realized_profit += holding.realized_profit_history[-1][1]
+            holding.investment = abs(holding.investment - trade.quantity * trade.price)
+
+        if len(holding.quantity_trend) > 0 and holding.quantity_trend[-1][0] == trade.timestamp.date():
+            holding.quantity_trend[-1] = (trade.timestamp.date(), holding.quantity)
+            holding.investment_trend[-1] = (trade.timestamp.date(), holding.investment)
+        else:
+            holding.quantity_trend.append((trade.timestamp.date(), holding.quantity))
+            holding.investment_trend.append((trade.timestamp.date(), holding.investment))
+        holding.buy_average = abs(holding.investment / holding.quantity) if holding.quantity != 0 else 0
+    return current_position
+
+
+def value_holding(holding: Holding, stock_info: Dict[str, StockInfo], current_position: str):
+    """
+    Set the current price and the unrealized profit of the open position.
+    """
+    if holding.symbol in stock_info.keys():
+        holding.current_price = stock_info[holding.symbol].previous_close
+        if current_position == 'buy' and holding.quantity != 0:
+            holding.unrealized_profit = (holding.current_price - holding.buy_average) * holding.quantity
+        elif current_position == 'sell' and holding.quantity != 0:
+            holding.unrealized_profit = (holding.buy_average - holding.current_price) * holding.quantity
+
+    else:
+        holding.current_price = "N/A"
+        holding.unrealized_profit = "N/A"
+
+
 def generate_holdings_from_tradebook(symbols: List[str], tradebook: List[Trade], index_historical_data: pd.DataFrame, stock_info: Dict[str, StockInfo]) -> List[Holding]:
     holdings = {symbol: Holding(symbol=symbol) for symbol in symbols}
+    index_lookup = AsOfLookup.from_frame(index_historical_data, INDEX_COLUMNS)     # Built once, shared by every holding
     for symbol in symbols:
         if symbol in stock_info.keys():
             holdings[symbol].stock_info = stock_info[symbol]
@@ -83,51 +129,9 @@ def generate_holdings_from_tradebook(symbols: List[str], tradebook: List[Trade],
         holdings[trade.symbol].trades.append(trade)
 
     for symbol in symbols:
-        current_position = None
-        for trade in holdings[symbol].trades:
-            if current_position is None:
-                current_position = trade.typ
-
-            if trade.typ == current_position:
-                if trade.typ == 'buy' or trade.typ == 'bonus':
-                    holdings[symbol].quantity += trade.quantity
-                else:
-                    holdings[symbol].quantity -= trade.quantity
-
-                holdings[symbol].investment += trade.quantity * trade.price
-            
-            else:
-                if trade.typ == 'buy' or trade.typ == 'bonus':
-                    holdings[symbol].realized_profit_history.append([trade.timestamp, min(trade.quantity, -holdings[symbol].quantity) * (holdings[symbol].buy_average - trade.price)])
-                    holdings[symbol].quantity += trade.quantity
-                else:
-                    holdings[symbol].realized_profit_history.append([trade.timestamp, min(trade.quantity, holdings[symbol].quantity) * (trade.price - holdings[symbol].buy_average)])
-                    holdings[symbol].quantity -= trade.quantity
-
-                current_position = 'buy' if holdings[symbol].quantity >= 0 else 'sell'
-                holdings[symbol].realized_profit += holdings[symbol].realized_profit_history[-1][1]
-                holdings[symbol].investment = abs(holdings[symbol].investment - trade.quantity * trade.price)
-
-            if len(holdings[symbol].quantity_trend) > 0 and holdings[symbol].quantity_trend[-1][0] == trade.timestamp.date():
-                holdings[symbol].quantity_trend[-1][1] = holdings[symbol].quantity
-                holdings[symbol].investment_trend[-1][1] = holdings[symbol].investment
-            else:
-                holdings[symbol].quantity_trend.append([trade.timestamp.date(), holdings[symbol].quantity])
-                holdings[symbol].investment_trend.append([trade.timestamp.date(), holdings[symbol].investment])
-            holdings[symbol].buy_average = abs(holdings[symbol].investment / holdings[symbol].quantity) if holdings[symbol].quantity != 0 else 0
-
-        if symbol in stock_info.keys():
-            holdings[symbol].current_price = stock_info[symbol].previous_close
-            if current_position == 'buy' and holdings[symbol].quantity != 0:
-                holdings[symbol].unrealized_profit = (holdings[symbol].current_price - holdings[symbol].buy_average) * holdings[symbol].quantity
-            elif current_position == 'sell' and holdings[symbol].quantity != 0:
-                holdings[symbol].unrealized_profit = (holdings[symbol].buy_average - holdings[symbol].current_price) * holdings[symbol].quantity
-        
-        else:
-            holdings[symbol].current_price = "N/A"
-            holdings[symbol].unrealized_profit = "N/A"
-
-        calculate_index_revenue_for_holding(holdings[symbol], index_historical_data)
+        current_position = apply_trades_to_holding(holdings[symbol])
+        value_holding(holdings[symbol], stock_info, current_position)
+        calculate_index_revenue_for_holding(holdings[symbol], index_lookup)
         calculate_dividend_revenue_for_holding(holdings[symbol])
-        
-    return list(holdings.values())
\ No newline at end of file
+
+    return list(holdings.values())
@@ -1,69 +1,71 @@
-import yfinance as yf
-from typing import Dict
+from typing import Callable, Dict, Iterable, List, Optional
+from collections import defaultdict
 import datetime
 import pandas as pd
 
+from src.lib.fetcher import ConcurrentFetcher
+from src.lib.market_data import MarketDataProvider, YFinanceProvider
+from src.lib.price_store import PriceStore, PRICE_HISTORY_DIRECTORY, split_fingerprint
+from src.lib.trading_calendar import TradingCalendar
 from src.models.stock_info import StockInfo, StockSplit, Dividend
-from src.database.stock_info import insert_stock_info_into_db, get_stock_info_from_db
-from src.database.stock_split import insert_stock_split_into_db, get_stock_splits_from_db
-from src.database.dividend import insert_dividend_into_db, get_dividends_from_db
-from src.database.index import insert_index_into_db, get_index_from_db
+from src.database.stock_info import insert_stock_infos_into_db, get_stock_info_many_from_db
+from src.database.stock_split import insert_stock_splits_into_db, get_stock_splits_many_from_db
+from src.database.dividend import insert_dividends_into_db, get_dividends_many_from_db
+from src.database.index import upsert_index_column_into_db, get_index_date_ranges_from_db, get_index_from_db
 
 DATE_TODAY = datetime.datetime.now().date().strftime("%Y-%m-%d")
+STOCK_INFO_MAX_AGE = datetime.timedelta(days=1)
 
 
-def get_stock_splits(symbol: str, stock: yf.Ticker) -> list[StockSplit]:
+def get_stock_splits(symbol: str, ticker: str, provider: MarketDataProvider, call: Callable) -> list[StockSplit]:
     """
-    Fetch stock split data for a given stock symbol and store it in the database.
+    Fetch stock split data for a given stock symbol.
 
     Args:
         symbol (str): Stock symbol.
-        stock (yf.Ticker): yfinance Ticker object.
+        ticker (str): Yahoo Finance ticker, e.g. RELIANCE.NS.
+        provider (MarketDataProvider): Source of the split data.
+        call (Callable): Rate limited, retrying wrapper for provider requests.
 
     Returns:
         list[StockSplit]: List of StockSplit objects.
     """
     try:
-        stock_splits_df = stock.get_splits().to_frame()
-        stock_splits = []
-        for row in stock_splits_df.iterrows():
-            stock_splits.append(StockSplit(split_date=row[0].date(), ratio=row[1]['Stock Splits']))
-            insert_stock_split_into_db(symbol=symbol, split_date=row[0].date(), ratio=row[1]['Stock Splits'])
-        return stock_splits
+        return call(provider.get_splits, ticker)
     except Exception as e:
         print(f"Error fetching stock splits for {symbol}: {e}")
         return []
 
 
-def get_dividends(symbol: str, stock: yf.Ticker) -> list[Dividend]:
+def get_dividends(symbol: str, ticker: str, provider: MarketDataProvider, call: Callable) -> list[Dividend]:
     """
-    Fetch dividend data for a given stock symbol and store it in the database.
+    Fetch dividend data for a given stock symbol.
 
     Args:
         symbol (str): Stock symbol.
-        stock (yf.Ticker): yfinance Ticker object.
+        ticker (str): Yahoo Finance ticker, e.g. RELIANCE.NS.
+        provider (MarketDataProvider): Source of the dividend data.
+        call (Callable): Rate limited, retrying wrapper for provider requests.
 
     Returns:
         list[Dividend]: List of Dividend objects.
     """
     try:
-        dividends_df = stock.get_dividends().to_frame()
-        dividends = []
-        for row in dividends_df.iterrows():
-            insert_dividend_into_db(symbol=symbol, ex_date=row[0].date(), amount=row[1]['Dividends'])
-            dividends.append(Dividend(ex_date=row[0].date(), amount=row[1]['Dividends']))
-        return dividends
+        return call(provider.get_dividends, ticker)
     except Exception as e:
         print(f"Error fetching dividends for {symbol}: {e}")
         return []
 
 
-def get_stock_info(symbol: str) -> StockInfo:
+def fetch_stock_info(symbol: str, provider: MarketDataProvider, call: Callable) -> Optional[StockInfo]:
     """
-    Fetch stock information for a given symbol. First, check the database; if not found, fetch from yfinance.
+    Fetch stock information for a given symbol from the provider, trying NSE first and BSE second.
+    Only does network requests, the result is not stored.
 
     Args:
         symbol (str): Stock symbol.
+        provider (MarketDataProvider): Source of the market data.
+        call (Callable): Rate limited, retrying wrapper for provider requests.
 
     Returns:
         StockInfo: StockInfo object containing stock details, or None if data could not be fetched.
@@ -71,46 +73,33 @@ def get_stock_info(symbol: str) -> StockInfo:
     def get_value(key, default=None):
         return stock_info.get(key, default)
 
-    # Check if data exists in the database
-    try:
-        stock_info = get_stock_info_from_db(symbol)
-        if stock_info:
-            stock_info.stock_splits = get_stock_splits_from_db(symbol)
-            stock_info.dividends = get_dividends_from_db(symbol)
-            print(f"Fetching {symbol} from database")
-            return stock_info
-    except Exception as e:
-        print(f"Error fetching {symbol} from database: {e}")
-
-    # If data does not exist, fetch from yfinance
     stock_info = None
-    stock = None
+    ticker = f"{symbol}.NS"     # NSE
     try:
-        stock = yf.Ticker(f"{symbol}.NS")  # NSE
-        stock_info = stock.info
+        stock_info = call(provider.get_info, ticker)
     except Exception as e:
         print(f"Error fetching {symbol} from NSE: {e}")
 
     if not stock_info:
+        ticker = f"{symbol}.BO"     # BSE
         try:
-            stock = yf.Ticker(f"{symbol}.BO")  # BSE
-            stock_info = stock.info
+            stock_info = call(provider.get_info, ticker)
         except Exception as e:
             print(f"Error fetching {symbol} from BSE: {e}")
             return None
 
-    print(f"Fetched {symbol} from yfinance")
+    print(f"Fetched {symbol} from {type(provider).__name__}")
     # Create StockInfo object with all required fields
     try:
-        info = StockInfo(
+        return StockInfo(
             symbol=symbol,
             symbol_yf=get_value('symbol', symbol),
             name=get_value('longName', 'Unknown'),
             city=get_value('city', 'Unknown'),
             industry=get_value('industry', 'Unknown'),
             sector=get_value('sector', 'Unknown'),
-            stock_splits=get_stock_splits(symbol, stock),
-            dividends=get_dividends(symbol, stock),
+            stock_splits=get_stock_splits(symbol, ticker, provider, call),
+            dividends=get_dividends(symbol, ticker, provider, call),
             previous_close=get_value('previousClose', 0.0),
             volume=get_value('volume', 0),
             average_volume_10days=get_value('averageVolume10days', 0),
@@ -151,57 +140,319 @@ def get_stock_info(symbol: str) -> StockInfo:
             dividend_yield=get_value('dividendYield', 0.0),
             five_year_average_dividend_yield=get_value('fiveYearAvgDividendYield', 0.0)
         )
-        insert_stock_info_into_db(info)
-        return info
     except Exception as e:
         print(f"Error creating StockInfo object for {symbol}: {e}")
         return None
 
 
-def get_stock_info_store(symbols: list[str]) -> Dict[str, StockInfo]:
+def store_stock_infos(stock_infos: List[StockInfo]):
+    """
+    Store fetched StockInfo objects and their corporate actions in the database,
+    one batched write per table.
+
+    Args:
+        stock_infos (List[StockInfo]): StockInfo objects to store.
+    """
+    if not stock_infos:
+        return
+    insert_stock_infos_into_db(stock_infos)
+    insert_stock_splits_into_db({stock_info.symbol: stock_info.stock_splits for stock_info in stock_infos})
+    insert_dividends_into_db({stock_info.symbol: stock_info.dividends for stock_info in stock_infos})
+
+
+def get_stock_info_many(symbols: List[str]) -> Dict[str, StockInfo]:
+    """
+    Fetch stock information for many symbols from the database with their corporate actions attached.
+    Runs three set based queries however many symbols are asked for.
+
+    Args:
+        symbols (List[str]): Stock symbols.
+
+    Returns:
+        Dict[str, StockInfo]: StockInfo object per stored symbol, symbols that are not stored are left out.
+    """
+    symbols = list(symbols)
+    stock_infos = get_stock_info_many_from_db(symbols)
+    stored_symbols = list(stock_infos)
+    stock_splits = get_stock_splits_many_from_db(stored_symbols)
+    dividends = get_dividends_many_from_db(stored_symbols)
+    for symbol, stock_info in stock_infos.items():
+        stock_info.stock_splits = stock_splits[symbol]
+        stock_info.dividends = dividends[symbol]
+    if stock_infos:
+        print(f"Fetched {len(stock_infos)} of {len(symbols)} symbols from database")
+    return stock_infos
+
+
+def is_stale(stock_info: StockInfo, max_age: datetime.timedelta) -> bool:
+    """
+    Whether stored stock information was fetched longer than max_age ago. Rows without a timestamp are stale.
+    """
+    if stock_info.updated_at is None:
+        return True
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)     # updated_at is stored in UTC
+    return now - stock_info.updated_at > max_age
+
+
+def get_stock_info(symbol: str, provider: Optional[MarketDataProvider] = None) -> StockInfo:
+    """
+    Fetch stock information for a given symbol. First, check the database; if not found, fetch from the provider.
+
+    Args:
+        symbol (str): Stock symbol.
+        provider (Optional[MarketDataProvider]): Source of the market data, Yahoo Finance by default.
+
+    Returns:
+        StockInfo: StockInfo object containing stock details, or None if data could not be fetched.
+    """
+    return get_stock_info_store([symbol], provider).get(symbol)
+
+
+def get_stock_info_store(symbols: list[str], provider: Optional[MarketDataProvider] = None, fetcher: Optional[ConcurrentFetcher] = None,
+                         max_age: datetime.timedelta = STOCK_INFO_MAX_AGE) -> Dict[str, StockInfo]:
     """
     Fetch stock information for multiple symbols and store them in a dictionary.
+    Symbols missing from the database or stored longer than max_age ago are fetched concurrently, with
+    rate limiting, retries and per-symbol timeouts handled by the fetcher. Stale data is still used for
+    symbols that cannot be refreshed.
 
     Args:
         symbols (list[str]): List of stock symbols.
+        provider (Optional[MarketDataProvider]): Source of the market data, Yahoo Finance by default.
+        fetcher (Optional[ConcurrentFetcher]): Fetcher to run the requests on, a default one is created if not given.
+        max_age (datetime.timedelta): How long stored fundamentals, splits and dividends are reused.
 
     Returns:
         Dict[str, StockInfo]: Dictionary mapping symbols to StockInfo objects.
     """
-    stock_info_store = {}
-    for symbol in symbols:
-        stock_info = get_stock_info(symbol)
-        if stock_info:
-            stock_info_store[symbol] = stock_info
+    stock_info_store = get_stock_info_many(symbols)     # Stale entries are kept as a fallback when refreshing fails
+    missing_symbols = [
+        symbol for symbol in symbols
+        if symbol not in stock_info_store or is_stale(stock_info_store[symbol], max_age)
+    ]
+
+    if not missing_symbols:
+        return stock_info_store
+
+    provider = provider or YFinanceProvider()
+    owns_fetcher = fetcher is None
+    fetcher = fetcher or ConcurrentFetcher()
+    try:
+        fetched = fetcher.fetch_many(missing_symbols, lambda symbol, call: fetch_stock_info(symbol, provider, call))
+    finally:
+        if owns_fetcher:
+            fetcher.shutdown()
+
+    # Database writes stay on this thread, the workers only do network requests
+    fetched_infos = [fetched[symbol] for symbol in missing_symbols if fetched.get(symbol)]
+    store_stock_infos(fetched_infos)
+    for stock_info in fetched_infos:
+        stock_info_store[stock_info.symbol] = stock_info
     return stock_info_store
 
 
-def get_index_data() -> pd.DataFrame:
+INDEX_TICKERS = {'^NSEI': 'nifty50', '^BSESN': 'bsesensex', '^NSEBANK': 'niftybank'}
+INDEX_HISTORY_PERIOD = "5y"
+
+
+def get_index_sync_ranges(start_date: Optional[datetime.date] = None, today: Optional[datetime.date] = None) -> Dict[str, List[tuple]]:
     """
-    Fetch index data from the database. If not available, fetch from yfinance and store in the database.
+    Work out which date ranges of every index are missing from the database.
+    An index without stored history is fetched from start_date, or over the default period. Otherwise only
+    the days from the last stored date on are fetched, together with the days before the first stored
+    date when start_date is older than the stored history. The last stored date is always fetched again,
+    its close may be an intraday value stored before the market closed.
+
+    Args:
+        start_date (Optional[datetime.date]): Earliest date the index history must cover.
+        today (Optional[datetime.date]): Last date to sync, today by default.
+
+    Returns:
+        Dict[str, List[tuple]]: (start, end) ranges to fetch per ticker, a start of None means the default period.
+    """
+    today = today or datetime.date.today()
+    date_ranges = get_index_date_ranges_from_db()
+    sync_ranges = {}
+    for ticker, column in INDEX_TICKERS.items():
+        first_date, last_date = date_ranges[column]
+        if last_date is None:
+            sync_ranges[ticker] = [(start_date, today)]
+            continue
+        ranges = []
+        if start_date is not None and start_date < first_date:
+            ranges.append((start_date, first_date - datetime.timedelta(days=1)))
+        if last_date <= today:
+            ranges.append((last_date, today))
+        sync_ranges[ticker] = ranges
+    return sync_ranges
+
+
+def get_index_data(provider: Optional[MarketDataProvider] = None, start_date: Optional[datetime.date] = None,
+                   today: Optional[datetime.date] = None) -> pd.DataFrame:
+    """
+    Fetch index data from the database after syncing the missing history from the provider.
+    Only the days from the last stored date on are downloaded, replacing its close, and older history is
+    backfilled when start_date is before the first stored date. Indices needing the same range share one request.
+
+    Args:
+        provider (Optional[MarketDataProvider]): Source of the market data, Yahoo Finance by default.
+        start_date (Optional[datetime.date]): Earliest date the index history must cover, e.g. the first trade date.
+        today (Optional[datetime.date]): Last date to sync, today by default.
 
     Returns:
         pd.DataFrame: DataFrame containing index data.
     """
     try:
-        index_data = get_index_from_db()
-        if index_data.empty:
-            nifty50 = yf.Ticker("^NSEI").history(period="5y").reset_index()[["Date", "Close"]]
-            bsesensex = yf.Ticker("^BSESN").history(period="5y").reset_index()[["Date", "Close"]]
-            niftybank = yf.Ticker("^NSEBANK").history(period="5y").reset_index()[["Date", "Close"]]
-
-            index_data = pd.concat([
-                nifty50.set_index('Date').rename(columns={'Close': 'nifty50'}),
-                bsesensex.set_index('Date').rename(columns={'Close': 'bsesensex'}),
-                niftybank.set_index('Date').rename(columns={'Close': 'niftybank'})
-            ], axis=1).reset_index().drop_duplicates(subset=['Date']).set_index('Date').reset_index()
-
-            # Convert Date column to date type
-            index_data['Date'] = index_data['Date'].dt.date
-            index_data.rename(columns={'Date': 'date'}, inplace=True)
-
-            insert_index_into_db(index_data)
-        return index_data
+        requests = defaultdict(list)
+        for ticker, ranges in get_index_sync_ranges(start_date, today).items():
+            for date_range in ranges:
+                requests[date_range].append(ticker)
+
+        if requests:
+            provider = provider or YFinanceProvider()
+        for (start, end), tickers in requests.items():
+            histories = provider.get_history_many(tickers, start=start, end=end, period=None if start else INDEX_HISTORY_PERIOD)
+            for ticker, history in histories.items():
+                history = history.dropna(subset=['close']).drop_duplicates(subset=['date'], keep='last')
+                if start is not None:
+                    history = history[(history['date'] >= start) & (history['date'] <= end)]
+                upsert_index_column_into_db(INDEX_TICKERS[ticker], history)
+                print(f"Synced {len(history)} days of {ticker}")
+
+        return get_index_from_db()
     except Exception as e:
         print(f"Error fetching index data: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+
+HISTORY_BATCH_SIZE = 50
+
+
+def yahoo_ticker(symbol: str, stock_info_store: Dict[str, StockInfo]) -> str:
+    """
+    Yahoo Finance ticker of a symbol as stored with its stock information, or the NSE ticker.
+    """
+    stock_info = stock_info_store.get(symbol)
+    return stock_info.symbol_yf if stock_info and stock_info.symbol_yf else f"{symbol}.NS"
+
+
+def get_price_sync_ranges(store: PriceStore, symbols: List[str], start_date: datetime.date, today: datetime.date,
+                          refetch: Iterable[str] = ()) -> Dict[str, List[tuple]]:
+    """
+    Work out which date ranges of every symbol's price history are missing from the store.
+    A symbol that was never synced is fetched from start_date. Otherwise only the trading days after the
+    last synced day are fetched, together with the days before the first synced day when start_date is older.
+    A symbol in refetch is fetched again over its whole synced range and start_date.
+
+    Args:
+        store (PriceStore): The local price history.
+        symbols (List[str]): Stock symbols.
+        start_date (datetime.date): Earliest date the history must cover.
+        today (datetime.date): Last date to sync.
+        refetch (Iterable[str]): Symbols whose stored history is fetched again in full.
+
+    Returns:
+        Dict[str, List[tuple]]: (start, end) ranges to fetch per symbol.
+    """
+    calendar = TradingCalendar()
+    refetch = set(refetch)
+    sync_ranges = {}
+    for symbol in symbols:
+        synced = store.synced_range(symbol)
+        if synced is None:
+            sync_ranges[symbol] = [(start_date, today)]
+            continue
+        first_date, last_date = synced
+        if symbol in refetch:
+            sync_ranges[symbol] = [(min(start_date, first_date), max(last_date, today))]
+            continue
+        ranges = []
+        if start_date < first_date:
+            ranges.append((start_date, first_date - datetime.timedelta(days=1)))
+        next_date = last_date + datetime.timedelta(days=1)
+        if calendar.trading_days_between(next_date, today) > 0:
+            ranges.append((next_date, today))
+        sync_ranges[symbol] = ranges
+    return sync_ranges
+
+
+def sync_price_history(symbols: List[str], stock_info_store: Dict[str, StockInfo], start_date: datetime.date, today: Optional[datetime.date] = None,
+                       provider: Optional[MarketDataProvider] = None, directory: str = PRICE_HISTORY_DIRECTORY) -> PriceStore:
+    """
+    Bring the local daily OHLCV history of symbols up to date and return the store memory-mapped.
+    Only the missing date ranges are downloaded, symbols needing the same range share requests of
+    HISTORY_BATCH_SIZE tickers, and the store is rewritten once with everything fetched. Today is never
+    recorded as synced, its close is fetched again until the day is over. The closes are split adjusted,
+    so the whole history of a symbol whose splits changed since it was synced is fetched again and
+    replaces the stored rows.
+
+    Args:
+        symbols (List[str]): Stock symbols.
+        stock_info_store (Dict[str, StockInfo]): Stock information per symbol, for the Yahoo Finance tickers.
+        start_date (datetime.date): Earliest date the history must cover.
+        today (Optional[datetime.date]): Last date to sync, today by default.
+        provider (Optional[MarketDataProvider]): Source of the market data, Yahoo Finance by default.
+        directory (str): Directory of the store.
+
+    Returns:
+        PriceStore: The synced store.
+    """
+    today = today or datetime.date.today()
+    store = PriceStore.load(directory)
+    splits = {symbol: split_fingerprint(stock_info_store.get(symbol)) for symbol in symbols}
+    refetch = {symbol for symbol in symbols if store.synced_range(symbol) is not None and store.split_fingerprint(symbol) != splits[symbol]}
+    requests = defaultdict(list)
+    for symbol, ranges in get_price_sync_ranges(store, symbols, start_date, today, refetch).items():
+        for date_range in ranges:
+            requests[date_range].append(symbol)
+    if not requests:
+        return store
+
+    provider = provider or YFinanceProvider()
+    histories, synced = defaultdict(list), {}
+    for (start, end), range_symbols in requests.items():
+        tickers = {yahoo_ticker(symbol, stock_info_store): symbol for symbol in range_symbols}
+        ticker_list = list(tickers)
+        for batch_start in range(0, len(ticker_list), HISTORY_BATCH_SIZE):
+            batch = ticker_list[batch_start:batch_start + HISTORY_BATCH_SIZE]
+            try:
+                fetched = provider.get_history_many(batch, start=start, end=end)
+            except Exception as e:
+                print(f"Error fetching price history for {len(batch)} symbols: {e}")
+                continue
+            synced_end = min(end, today - datetime.timedelta(days=1))
+            for ticker, history in fetched.items():
+                symbol = tickers[ticker]
+                histories[symbol].append(history[(history['date'] >= start) & (history['date'] <= end)])
+                if start <= synced_end:
+                    first, last = synced.get(symbol, (start, synced_end))
+                    synced[symbol] = (min(first, start), max(last, synced_end))
+
+    # Only a symbol fetched again in full replaces its stored rows and records its new splits
+    fetched = {symbol for symbol in histories if symbol not in refetch or symbol in synced}
+    store = store.merge({symbol: pd.concat(histories[symbol], ignore_index=True) for symbol in fetched}, synced,
+                        {symbol: splits[symbol] for symbol in fetched}, refetch & fetched)
+    store.save(directory)
+    if refetch:
+        print(f"Fetched the whole price history of {len(refetch & fetched)} symbols with new splits again")
+    print(f"Synced price history of {len(histories)} symbols in {len(requests)} date ranges")
+    return PriceStore.load(directory)
+
+
+def get_price_histories(symbols: List[str], stock_info_store: Dict[str, StockInfo], start_date: datetime.date, end_date: datetime.date,
+                        provider: Optional[MarketDataProvider] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Daily closes of many symbols between two dates from the local price history, synced first.
+
+    Args:
+        symbols (List[str]): Stock symbols.
+        stock_info_store (Dict[str, StockInfo]): Stock information per symbol.
+        start_date (datetime.date): First date.
+        end_date (datetime.date): Last date.
+        provider (Optional[MarketDataProvider]): Source of the market data, Yahoo Finance by default.
+
+    Returns:
+        Dict[str, pd.DataFrame]: Columns date (datetime64) and close per symbol, sorted by date. Symbols without history are left out.
+    """
+    store = sync_price_history(symbols, stock_info_store, start_date, end_date, provider)
+    return {symbol: history[['date', 'close']] for symbol, history in store.histories(symbols, start_date, end_date).items()}
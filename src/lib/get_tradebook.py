@@ -1,16 +1,18 @@
 import os
-import csv
+import shutil
+import hashlib
+import time
+import numpy as np
 import pandas as pd
-import datetime
-from typing import List, Dict
-from collections import defaultdict as defaultDict
+from typing import Callable, List, Dict, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 
-from src.models.trade import Trade
+from src.models.trade_frame import TradeFrame, TRADE_TYPES, encode_trade_types, intern_symbols
 from src.models.stock_info import StockInfo
 
-DATE_TODAY = datetime.datetime.now().date().strftime("%Y-%m-%d")
+ADJUSTED_TRADEBOOK_CACHE = "metadata/adjusted_tradebook"
 
-def load_manual_trades(file_path: str) -> List[Trade]:
+def load_manual_trades(file_path: str) -> TradeFrame:
     """
     Function to read the manual trades of the user. Manual trades consists of all the other ways
     in which user obtains or sells stocks, other than the trades recorded in the tradebook.
@@ -18,106 +20,192 @@ def load_manual_trades(file_path: str) -> List[Trade]:
     Args:
         file_path (str): Path to the CSV file containing manual trades
     Returns:
-        List[Trade]: List of Trade objects representing manual trades
+        TradeFrame: Manual trades sorted by trade date, parsed column-wise in a single pass
     """
     manual_trades_df = pd.read_csv(file_path)
-    manual_trades_df['symbol'] = manual_trades_df['symbol'].str.split('-').str[0]     # Normalize symbols
-
-    manual_trades = []
-    for trade in manual_trades_df.iterrows():
-        manual_trades.append(Trade(
-            symbol = trade[1]['symbol'],
-            quantity = abs(trade[1]['quantity']),
-            price = trade[1]['price'],
-            typ = 'buy' if trade[1]['quantity'] > 0 else 'sell',
-            timestamp = datetime.datetime.strptime(trade[1]['trade_date'], "%Y-%m-%d").replace(hour=0, minute=0, second=0),
-            remarks = trade[1]['remarks']
-        ))
-    return manual_trades
-
-def load_tradebook(tradebook_files: List[str], manual_trades_file: str) -> List[Trade]:
+    quantity = manual_trades_df['quantity'].to_numpy()
+
+    return TradeFrame(
+        symbol = intern_symbols(manual_trades_df['symbol'].str.split('-').str[0]),     # Normalize symbols
+        quantity = np.abs(quantity),
+        price = manual_trades_df['price'].to_numpy(dtype=np.float64),
+        typ = np.where(quantity > 0, TRADE_TYPES.index('buy'), TRADE_TYPES.index('sell')),
+        timestamp = pd.to_datetime(manual_trades_df['trade_date'], format="%Y-%m-%d").to_numpy(dtype='datetime64[s]'),
+        remarks = manual_trades_df['remarks'].fillna("").to_numpy(dtype=object)
+    ).sort_by_timestamp()
+
+def load_tradebook_file(file_path: str) -> TradeFrame:
+    """
+    Read the tradebook of a single fiscal year.
+    Args:
+        file_path (str): Path to the tradebook file
+    Returns:
+        TradeFrame: Trades of the file sorted by execution time
+    """
+    tradebook_df = pd.read_csv(file_path)
+    return TradeFrame(
+        symbol = intern_symbols(tradebook_df['symbol'].str.split('-').str[0]),     # Normalize symbols
+        quantity = tradebook_df['quantity'].to_numpy(),
+        price = tradebook_df['price'].to_numpy(dtype=np.float64),
+        typ = encode_trade_types(tradebook_df['trade_type'].to_numpy(dtype=object)),
+        timestamp = pd.to_datetime(tradebook_df['order_execution_time'], format="%Y-%m-%dT%H:%M:%S").to_numpy(dtype='datetime64[s]')
+    ).sort_by_timestamp()
+
+def _timed_load(loader: Callable[[str], TradeFrame], file_path: str) -> Tuple[TradeFrame, float]:
+    start = time.perf_counter()
+    frame = loader(file_path)
+    return frame, time.perf_counter() - start
+
+def file_signature(file_path: str) -> Tuple[int, int]:
+    """
+    Modification time and size of a file, which change whenever the file is rewritten or appended to.
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+def load_tradebook(tradebook_files: List[str], manual_trades_file: str, max_workers: Optional[int] = None,
+                   file_cache: Optional[Dict[str, Tuple[Tuple[int, int], TradeFrame]]] = None) -> TradeFrame:
     """
     Load the tradebook from the tradebook files and manual trades file.
+    Every file is parsed and sorted in its own worker process, the sorted files are then combined
+    with a k-way merge instead of a global sort. Trade objects are only built when the returned
+    frame is indexed or iterated.
     Args:
         tradebook_files (List[str]): List of paths to the tradebook files
         manual_trades_file (str): Path to the manual trades file
+        max_workers (Optional[int]): Number of worker processes, defaults to one per file up to the CPU count
+        file_cache (Optional[Dict]): Parsed frame and signature per file from an earlier call. Files with an
+            unchanged modification time and size are taken from it instead of being parsed again, and it
+            is updated in place with the files parsed by this call.
     Returns:
-        List[Trade]: List of Trade objects representing the tradebook
-    """
-    fiscal_year_trades = [pd.read_csv(file) for file in tradebook_files]    # Read all tradebook files for individual fiscal year
-    tradebook_df = pd.concat(fiscal_year_trades, ignore_index=True)    # Combine all tradebook files
-    tradebook_df = tradebook_df.sort_values(by="order_execution_time")    # Sort by order execution time
-    tradebook_df['symbol'] = tradebook_df['symbol'].str.split('-').str[0]     # Normalize symbols
-
-    tradebook = []
-    for trade in tradebook_df.iterrows():
-        tradebook.append(Trade(
-            symbol = trade[1]['symbol'],
-            quantity = trade[1]['quantity'],
-            price = trade[1]['price'],
-            typ = trade[1]['trade_type'],
-            timestamp = datetime.datetime.strptime(trade[1]['order_execution_time'], "%Y-%m-%dT%H:%M:%S")
-        ))
-
+        TradeFrame: Trades sorted by execution time
+    """
+    jobs = [(load_tradebook_file, file) for file in tradebook_files]    # Individual fiscal year tradebooks
     if manual_trades_file != "":
-        other_trades = load_manual_trades(manual_trades_file)
-        tradebook.extend(other_trades)
-        tradebook.sort(key=lambda t: t.timestamp)
-    return tradebook
+        jobs.append((load_manual_trades, manual_trades_file))
+
+    file_cache = file_cache if file_cache is not None else {}
+    signatures = {file: file_signature(file) for _, file in jobs}
+    pending = [(loader, file) for loader, file in jobs if file not in file_cache or file_cache[file][0] != signatures[file]]
+
+    workers = max_workers or min(len(pending), os.cpu_count() or 1)
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_timed_load, *zip(*pending)))
+    else:
+        results = [_timed_load(loader, file) for loader, file in pending]
+
+    for (_, file), (frame, seconds) in zip(pending, results):
+        print(f"Loaded {len(frame)} trades from {file} in {seconds:.3f}s")
+        file_cache[file] = (signatures[file], frame)
+    for file in set(file_cache) - set(signatures):     # Files no longer configured
+        del file_cache[file]
+    return TradeFrame.merge([file_cache[file][1] for _, file in jobs])
 
-def generate_adjusted_tradebook(tradebook: List[Trade], stock_info_store: Dict[str, StockInfo]) -> List[Trade]:
+def adjusted_tradebook_cache_key(tradebook: TradeFrame, stock_info_store: Dict[str, StockInfo]) -> str:
     """
-    Generate an adjusted tradebook by accounting for stock splits and bonus shares.
+    Content hash of everything the adjusted tradebook depends on: the loaded tradebook and manual
+    trades, and the split table of every symbol. Editing any tradebook file or receiving a new split
+    changes the key, while an unchanged input keeps hitting the same cache entry across days.
+    Args:
+        tradebook (TradeFrame): Trades sorted by execution time
+        stock_info_store (Dict[str, StockInfo]): Dictionary containing stock info for each symbol
+    Returns:
+        str: Hex digest identifying the adjusted tradebook
+    """
+    digest = hashlib.sha256(tradebook.content_hash().encode())
+    splits = sorted((stock.symbol, split.split_date.isoformat(), float(split.ratio)) for stock in stock_info_store.values() for split in stock.stock_splits)
+    digest.update(repr(splits).encode())
+    return digest.hexdigest()
+
+def adjust_for_splits(tradebook: TradeFrame, stock_info_store: Dict[str, StockInfo]) -> TradeFrame:
+    """
+    Add a bonus entry for every split that happens while a long position is held.
+    Only symbols with splits are visited. For each of them the position before every split is a
+    cumulative sum over the trade segment since the previous split, located with searchsorted on the
+    split dates, so the cost is one pass over the symbol's trades instead of a walk over the whole
+    tradebook. The bonus entries are then merged into the tradebook in bulk.
+    A split takes effect at midnight of its date, so only trades stamped at midnight that day, such as
+    manual trades without a time, count towards the position before it. Fills later that day are at the
+    split adjusted price and count after it.
     Args:
-        tradebook (List[Trade]): List of Trade objects representing the tradebook
+        tradebook (TradeFrame): Trades sorted by execution time
         stock_info_store (Dict[str, StockInfo]): Dictionary containing stock info for each symbol
     Returns:
-        List[Trade]: List of Trade objects representing the adjusted tradebook
-    """
-    if os.path.exists(f'metadata/adjusted_tradebook_{DATE_TODAY}.csv'):
-        tradebook = pd.read_csv(f'metadata/adjusted_tradebook_{DATE_TODAY}.csv')
-        adjusted_tradebook = []
-        for entry in tradebook.iterrows():
-            adjusted_tradebook.append(Trade(
-                symbol = entry[1]['symbol'],
-                quantity = entry[1]['quantity'],
-                price = entry[1]['price'],
-                typ = entry[1]['type'],
-                timestamp = datetime.datetime.strptime(entry[1]['date'], "%Y-%m-%d %H:%M:%S"),
-                remarks = entry[1]['remarks'] if not pd.isna(entry[1]['remarks']) else ""
-            ))
-        return adjusted_tradebook
-
-    tradebook_copy = tradebook.copy()
+        TradeFrame: Tradebook with the bonus entries, sorted by execution time
+    """
+    signed_quantity = np.where(tradebook.typ == TRADE_TYPES.index('sell'), -tradebook.quantity, tradebook.quantity)
+    symbol_groups = tradebook.symbol_groups()
+
+    bonus_symbols, bonus_quantities, bonus_timestamps = [], [], []
     for stock in stock_info_store.values():
-        for split in stock.stock_splits:
-            tradebook_copy.append(Trade(symbol = stock.symbol, quantity = 0, price = split.ratio, typ = 'bonus', timestamp = datetime.datetime.combine(split.split_date, datetime.time(0, 0, 0))))
-    
-    tradebook_copy.sort(key=lambda t: t.timestamp)
-
-    adjusted_tradebook = []
-    holdings = defaultDict(int)  # Track current holdings for each symbol
-
-    for trade in tradebook_copy:
-        if trade.typ == 'buy':
-            holdings[trade.symbol] += trade.quantity
-            adjusted_tradebook.append(trade)
-        
-        elif trade.typ == 'sell':
-            holdings[trade.symbol] -= trade.quantity
-            adjusted_tradebook.append(trade)
-        
-        elif trade.typ == 'bonus':
-            if holdings[trade.symbol] > 0:
-                bonus_quantity = holdings[trade.symbol] * (trade.price - 1)     # Split ratio - 1
-                holdings[trade.symbol] += bonus_quantity
-                adjusted_tradebook.append(Trade(symbol = trade.symbol, quantity = bonus_quantity, price = 0, typ = 'bonus', timestamp = trade.timestamp, remarks="bonus shares"))
-
-    # Save adjusted_tradebook to a CSV file
-    with open(f'metadata/adjusted_tradebook_{DATE_TODAY}.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['symbol', 'quantity', 'price', 'type', 'date', 'remarks'])
-        for entry in adjusted_tradebook:
-            writer.writerow([entry.symbol, entry.quantity, entry.price, entry.typ, entry.timestamp.strftime("%Y-%m-%d %H:%M:%S"), entry.remarks])
-
-    return adjusted_tradebook
\ No newline at end of file
+        rows = symbol_groups.get(stock.symbol)
+        if rows is None or not stock.stock_splits:
+            continue
+
+        split_timestamps = np.array([split.split_date for split in stock.stock_splits], dtype='datetime64[D]').astype('datetime64[s]')
+        split_ratios = np.array([split.ratio for split in stock.stock_splits], dtype=np.float64)
+        split_order = np.argsort(split_timestamps, kind='stable')
+        segment_ends = np.searchsorted(tradebook.timestamp[rows], split_timestamps[split_order], side='right')
+
+        position, segment_start = 0, 0
+        for split_index, segment_end in zip(split_order, segment_ends):
+            # cumsum adds in trade order, so the position matches a trade by trade running total exactly
+            position = np.cumsum(np.append(position, signed_quantity[rows[segment_start:segment_end]]))[-1]
+            segment_start = segment_end
+            if position > 0:
+                bonus_quantity = position * (split_ratios[split_index] - 1)     # Split ratio - 1
+                position += bonus_quantity
+                bonus_symbols.append(stock.symbol)
+                bonus_quantities.append(bonus_quantity)
+                bonus_timestamps.append(split_timestamps[split_index])
+
+    bonus_entries = TradeFrame(
+        symbol = bonus_symbols,
+        quantity = np.array(bonus_quantities, dtype=np.float64),
+        price = np.zeros(len(bonus_symbols)),
+        typ = np.full(len(bonus_symbols), TRADE_TYPES.index('bonus')),
+        timestamp = np.array(bonus_timestamps, dtype='datetime64[s]'),
+        remarks = np.full(len(bonus_symbols), "bonus shares", dtype=object)
+    )
+    return TradeFrame.merge([tradebook, bonus_entries.sort_by_timestamp()])
+
+def load_cached_adjusted_tradebook(cache_key: str) -> Optional[TradeFrame]:
+    """
+    The adjusted tradebook cached under a key of adjusted_tradebook_cache_key, None if it is not cached.
+    """
+    cache_path = os.path.join(ADJUSTED_TRADEBOOK_CACHE, cache_key)
+    return TradeFrame.load(cache_path) if os.path.isdir(cache_path) else None
+
+def cache_adjusted_tradebook(adjusted_tradebook: TradeFrame, cache_key: str):
+    """
+    Store an adjusted tradebook as the only cache entry, replacing the entry of earlier inputs, which
+    is never read again.
+    """
+    cache_path = os.path.join(ADJUSTED_TRADEBOOK_CACHE, cache_key)
+    if os.path.isdir(cache_path):
+        return
+    os.makedirs(ADJUSTED_TRADEBOOK_CACHE, exist_ok=True)
+    for entry in os.listdir(ADJUSTED_TRADEBOOK_CACHE):
+        shutil.rmtree(os.path.join(ADJUSTED_TRADEBOOK_CACHE, entry), ignore_errors=True)
+    adjusted_tradebook.save(cache_path)
+
+def generate_adjusted_tradebook(tradebook: TradeFrame, stock_info_store: Dict[str, StockInfo]) -> TradeFrame:
+    """
+    Generate an adjusted tradebook by accounting for stock splits and bonus shares.
+    The result is cached in metadata/adjusted_tradebook/<key>, keyed by adjusted_tradebook_cache_key,
+    and a warm start memory-maps the cached columns instead of recomputing them.
+    Args:
+        tradebook (TradeFrame): Trades sorted by execution time
+        stock_info_store (Dict[str, StockInfo]): Dictionary containing stock info for each symbol
+    Returns:
+        TradeFrame: Trades and bonus entries representing the adjusted tradebook
+    """
+    cache_key = adjusted_tradebook_cache_key(tradebook, stock_info_store)
+    cached = load_cached_adjusted_tradebook(cache_key)
+    if cached is not None:
+        return cached
+
+    adjusted_tradebook = adjust_for_splits(tradebook, stock_info_store)
+    cache_adjusted_tradebook(adjusted_tradebook, cache_key)
+    return adjusted_tradebook
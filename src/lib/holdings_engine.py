@@ -0,0 +1,129 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.lib.generate_holdings import (
+    INDEX_COLUMNS, apply_trades_to_holding, value_holding, calculate_index_revenue_for_holding, calculate_dividend_revenue_for_holding
+)
+from src.lib.trading_calendar import AsOfLookup, EPOCH_ORDINAL
+from src.models.holding import Holding
+from src.models.stock_info import StockInfo
+from src.models.trade import TradeType
+from src.models.trade_frame import TradeFrame, TRADE_TYPES
+from src.models.trend_series import TrendSeries
+
+BUY, SELL, BONUS = (TRADE_TYPES.index(typ) for typ in (TradeType.BUY, TradeType.SELL, TradeType.BONUS))
+
+
+def replay_positions(typ: np.ndarray, quantity: np.ndarray, price: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Array form of apply_trades_to_holding for the trades of one symbol.
+    The quantity after every trade is a cumulative sum of signed quantities. A trade opens or adds to
+    the position when its type matches the side held before it, long while the quantity is not negative,
+    and closes otherwise; bonus entries always take the closing path, as they do in the trade loop.
+    Investment adds trade values while opening and becomes |investment - value| when closing. Every
+    sum runs left to right like the loop, so the results are identical and not just close.
+    Args:
+        typ (np.ndarray): int8 trade type codes
+        quantity (np.ndarray): Trade quantities
+        price (np.ndarray): Trade prices
+    Returns:
+        Tuple[np.ndarray, ...]: Quantity, investment and buy average after every trade, the closing trade
+            mask and the realized profit of every closing trade
+    """
+    position = np.cumsum(np.where(typ == SELL, -quantity, quantity))
+    position_before = np.concatenate((position[:1] * 0, position[:-1]))
+    side_before = np.where(position_before >= 0, BUY, SELL)
+    side_before[0] = typ[0]     # The first trade opens the position on its own side
+    closing = typ != side_before
+
+    # |investment - value| makes investment a sequential recurrence, the one step left as a scalar loop
+    investment, current = [], 0
+    for trade_value, is_closing in zip((quantity * price).tolist(), closing.tolist()):
+        current = abs(current - trade_value) if is_closing else current + trade_value
+        investment.append(current)
+    investment = np.array(investment, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        buy_average = np.where(position != 0, np.abs(investment / position), 0.0)
+    average_before = np.concatenate(([0.0], buy_average[:-1]))
+
+    adding = typ[closing] != SELL
+    closed = np.where(adding, np.minimum(quantity[closing], -position_before[closing]), np.minimum(quantity[closing], position_before[closing]))
+    realized = closed * np.where(adding, average_before[closing] - price[closing], price[closing] - average_before[closing])
+    return position, investment, buy_average, closing, realized
+
+
+def build_holding(holding: Holding, trades: TradeFrame):
+    """
+    Fill a holding from the trades of its symbol, with the same results as apply_trades_to_holding.
+    Returns:
+        str: The position after the last trade, 'buy' for long and 'sell' for short
+    """
+    holding.trades = trades.to_trades()
+    position, investment, buy_average, closing, realized = replay_positions(trades.typ, trades.quantity, trades.price)
+
+    days = trades.dates
+    last_of_day = np.append(days[1:] != days[:-1], True)     # The trends keep the last value of every day
+    ordinals = days[last_of_day].astype(np.int64) + EPOCH_ORDINAL
+    holding.quantity_trend = TrendSeries.from_arrays(ordinals, position[last_of_day])
+    holding.investment_trend = TrendSeries.from_arrays(ordinals, investment[last_of_day])
+
+    timestamps = trades.timestamp[closing].astype(object).tolist()
+    holding.realized_profit_history = [[timestamp, profit] for timestamp, profit in zip(timestamps, realized.tolist())]
+    if len(realized):
+        holding.realized_profit = np.cumsum(realized)[-1].item()
+    holding.quantity = position[-1].item()
+    holding.investment = investment[-1].item()
+    holding.buy_average = buy_average[-1].item() if holding.quantity != 0 else 0
+    return 'buy' if holding.quantity >= 0 else 'sell'
+
+
+def needs_trade_loop(trades: TradeFrame) -> bool:
+    """
+    Trade sequences outside the closed form above: a first trade that is a bonus entry, or a short
+    position opened with zero quantity, whose side cannot be told from the quantity.
+    """
+    return trades.typ[0] == BONUS or (trades.typ[0] == SELL and trades.quantity[0] == 0)
+
+
+def build_holdings(symbols: List[str], tradebook: TradeFrame, index_lookup: AsOfLookup, stock_info: Dict[str, StockInfo]) -> List[Holding]:
+    """
+    Build the holdings of symbols from a tradebook holding at least their trades, with the benchmark
+    returns looked up in index_lookup.
+    """
+    groups = tradebook.symbol_groups()
+    holdings = []
+    for symbol in symbols:
+        holding = Holding(symbol=symbol, stock_info=stock_info.get(symbol))
+        holdings.append(holding)
+        rows = groups.get(symbol)
+        if rows is None:
+            continue
+        trades = tradebook.take(rows)
+        if needs_trade_loop(trades):
+            holding.trades = trades.to_trades()
+            current_position = apply_trades_to_holding(holding)
+        else:
+            current_position = build_holding(holding, trades)
+
+        value_holding(holding, stock_info, current_position)
+        calculate_index_revenue_for_holding(holding, index_lookup)
+        calculate_dividend_revenue_for_holding(holding)
+    return holdings
+
+
+def generate_holdings_vectorized(symbols: List[str], tradebook: TradeFrame, index_historical_data: pd.DataFrame, stock_info: Dict[str, StockInfo]) -> List[Holding]:
+    """
+    Same holdings as generate_holdings_from_tradebook, computed per symbol with array operations on
+    the columnar tradebook instead of a Python loop over every trade.
+    Args:
+        symbols (List[str]): Symbols to build holdings for
+        tradebook (TradeFrame): Split adjusted tradebook, sorted by timestamp
+        index_historical_data (pd.DataFrame): Index closes with columns date, nifty50, bsesensex, niftybank
+        stock_info (Dict[str, StockInfo]): Stock information per symbol
+    Returns:
+        List[Holding]: One holding per symbol, in the order of symbols
+    """
+    return build_holdings(symbols, tradebook, AsOfLookup.from_frame(index_historical_data, INDEX_COLUMNS), stock_info)
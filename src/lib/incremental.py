@@ -0,0 +1,143 @@
+import os
+import pickle
+import hashlib
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from src.lib.price_store import split_fingerprint
+from src.lib.valuation import ValuationMatrix
+from src.models.holding import Holding
+from src.models.stock_info import StockInfo
+from src.models.trade_frame import TradeFrame
+
+REFRESH_STATE_PATH = "metadata/refresh_state.pickle"
+# Bumped whenever the saved state changes shape, a state of another version is ignored
+REFRESH_STATE_VERSION = 2
+
+
+def row_hashes(tradebook: TradeFrame) -> np.ndarray:
+    """
+    64-bit hash of every row over all columns, computed column-wise.
+    Returns:
+        np.ndarray: uint64 array with one hash per row
+    """
+    hashes = np.zeros(len(tradebook), dtype=np.uint64)
+    for column in TradeFrame.COLUMNS:
+        values = getattr(tradebook, column)
+        if values.dtype.kind == 'M':
+            values = values.view(np.int64)
+        # Multiplying by an odd constant before mixing in the next column keeps the hash order sensitive
+        hashes = hashes * np.uint64(0x100000001B3) ^ pd.util.hash_array(values, categorize=False)
+    return hashes
+
+
+def symbol_fingerprints(tradebook: TradeFrame, stock_info_store: Dict[str, StockInfo]) -> Dict[str, str]:
+    """
+    Fingerprint of everything a symbol's holding is built from: its rows of the tradebook in order and
+    its splits and dividends. The previous close it is valued at moves every day and is left out, a
+    holding is valued again without rebuilding it.
+    Args:
+        tradebook (TradeFrame): Trades sorted by execution time
+        stock_info_store (Dict[str, StockInfo]): Stock information per symbol
+    Returns:
+        Dict[str, str]: Hex digest per symbol in the tradebook
+    """
+    hashes = row_hashes(tradebook)
+    fingerprints = {}
+    for symbol, rows in tradebook.symbol_groups().items():
+        digest = hashlib.blake2b(hashes[rows].tobytes(), digest_size=16)
+        stock = stock_info_store.get(symbol)
+        if stock is not None:
+            digest.update(repr((
+                [(split.split_date.isoformat(), float(split.ratio)) for split in stock.stock_splits],
+                [(dividend.ex_date.isoformat(), float(dividend.amount)) for dividend in stock.dividends],
+            )).encode())
+        fingerprints[symbol] = digest.hexdigest()
+    return fingerprints
+
+
+def split_fingerprints(stock_info_store: Dict[str, StockInfo]) -> Dict[str, str]:
+    """
+    Fingerprint of the splits of every symbol, the only corporate action that changes its earlier closes.
+    """
+    return {symbol: split_fingerprint(stock) for symbol, stock in stock_info_store.items()}
+
+
+def changed_symbols(previous: Dict[str, str], current: Dict[str, str]) -> Set[str]:
+    """
+    Symbols that were added, removed or whose fingerprint differs between two runs.
+    """
+    return {symbol for symbol in previous.keys() | current.keys() if previous.get(symbol) != current.get(symbol)}
+
+
+def index_fingerprint(index_data: pd.DataFrame) -> str:
+    """
+    Fingerprint of the index history, which every holding's benchmark returns depend on.
+    """
+    if index_data.empty:
+        return ""
+    return hashlib.blake2b(pd.util.hash_pandas_object(index_data, index=False).to_numpy().tobytes(), digest_size=16).hexdigest()
+
+
+def positions_fingerprint(holdings: List[Holding]) -> str:
+    """
+    Fingerprint of the symbol, quantity and investment of every holding, leaving out its price.
+    """
+    return hashlib.blake2b(repr([(holding.symbol, holding.quantity, holding.investment) for holding in holdings]).encode(), digest_size=16).hexdigest()
+
+
+def stock_info_fingerprint(stock_info_store: Dict[str, StockInfo]) -> str:
+    """
+    Fingerprint of every field of the stock information of every symbol.
+    """
+    return hashlib.blake2b(repr([list(vars(stock_info_store[symbol]).values()) for symbol in sorted(stock_info_store)]).encode(), digest_size=16).hexdigest()
+
+
+def valuation_fingerprint(valuation: ValuationMatrix, fingerprints: Dict[str, str]) -> str:
+    """
+    Fingerprint of a valuation matrix without reading all of its planes. Rows before the last close
+    change only when the trades, splits or dividends of a symbol do, which its symbol fingerprint
+    covers, so the days, the symbols with their fingerprints and the last row of values and flows
+    stand for the whole matrix.
+    Args:
+        valuation (ValuationMatrix): Daily valuation of the holdings
+        fingerprints (Dict[str, str]): Symbol fingerprints of the tradebook the valuation was synced with
+    """
+    digest = hashlib.blake2b(repr([(symbol, fingerprints.get(symbol)) for symbol in valuation.symbols]).encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(valuation.ordinals).tobytes())
+    if len(valuation.ordinals):
+        digest.update(valuation.value[-1].tobytes())
+        digest.update(valuation.flow[-1].tobytes())
+    return digest.hexdigest()
+
+
+def save_refresh_state(state: Dict[str, object], path: str = REFRESH_STATE_PATH):
+    """
+    Pickle the state the next refresh continues from to a temporary file that replaces the previous one.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(staging, "wb") as file:
+            pickle.dump((REFRESH_STATE_VERSION, state), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def load_refresh_state(path: str = REFRESH_STATE_PATH) -> Optional[Dict[str, object]]:
+    """
+    The state written by save_refresh_state, None if there is none or it cannot be used.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as file:
+            version, state = pickle.load(file)
+    except Exception as e:
+        print(f"Ignoring the saved refresh state: {e}")
+        return None
+    return state if version == REFRESH_STATE_VERSION else None
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import random
+import datetime
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.models.stock_info import StockSplit, Dividend
+
+HISTORY_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+
+def period_start(period: Optional[str], end: datetime.date) -> Optional[datetime.date]:
+    """
+    First date covered by a Yahoo Finance style period ("5d", "6mo", "5y", "max") ending at `end`.
+    """
+    if period is None or period == "max":
+        return None
+    for suffix, unit in (("mo", "months"), ("y", "years"), ("d", "days")):
+        if period.endswith(suffix):
+            return (pd.Timestamp(end) - pd.DateOffset(**{unit: int(period[:-len(suffix)])})).date()
+    raise ValueError(f"Unknown period: {period}")
+
+
+class MarketDataProvider(ABC):
+    """
+    Source of market data for tickers such as "RELIANCE.NS" or "^NSEI". Implementations do plain
+    network or disk access, rate limiting and retries are handled by the caller.
+    """
+
+    @abstractmethod
+    def get_info(self, ticker: str) -> Dict:
+        """
+        Fundamentals and quote data keyed by the Yahoo Finance field names (longName, previousClose, ...).
+        An empty dict means the ticker is unknown to the provider.
+        """
+
+    @abstractmethod
+    def get_splits(self, ticker: str) -> List[StockSplit]:
+        """All stock splits of the ticker."""
+
+    @abstractmethod
+    def get_dividends(self, ticker: str) -> List[Dividend]:
+        """All dividends of the ticker."""
+
+    @abstractmethod
+    def get_history(self, ticker: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        """
+        Daily price history between `start` and `end` (both inclusive), or over `period` when no start is given.
+        Returns:
+            pd.DataFrame: Columns date (datetime.date), open, high, low, close, volume, sorted by date
+        """
+
+    def get_info_many(self, tickers: List[str]) -> Dict[str, Dict]:
+        """
+        Info of several tickers. Providers that can fetch many tickers per request override this.
+        """
+        return {ticker: self.get_info(ticker) for ticker in tickers}
+
+    def get_history_many(self, tickers: List[str], start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Daily price history of several tickers. Providers that can fetch many tickers per request override this.
+        """
+        return {ticker: self.get_history(ticker, start, end, period) for ticker in tickers}
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Market data from Yahoo Finance through yfinance.
+    """
+    def __init__(self):
+        import yfinance as yf     # Imported here so offline providers work without yfinance installed
+        self._yf = yf
+
+    def get_info(self, ticker: str) -> Dict:
+        return self._yf.Ticker(ticker).info or {}
+
+    def get_splits(self, ticker: str) -> List[StockSplit]:
+        splits = self._yf.Ticker(ticker).get_splits()
+        return [StockSplit(split_date=timestamp.date(), ratio=float(ratio)) for timestamp, ratio in splits.items()]
+
+    def get_dividends(self, ticker: str) -> List[Dividend]:
+        dividends = self._yf.Ticker(ticker).get_dividends()
+        return [Dividend(ex_date=timestamp.date(), amount=float(amount)) for timestamp, amount in dividends.items()]
+
+    def get_history(self, ticker: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        return self.get_history_many([ticker], start, end, period)[ticker]
+
+    def get_history_many(self, tickers: List[str], start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Daily history of all tickers in a single yfinance download request. Prices are adjusted for
+        splits but not for dividends, the prices quoted on the day in shares of today.
+        """
+        if start is None and period is None:
+            period = "max"
+        history = self._yf.download(
+            tickers, start=start, end=end + datetime.timedelta(days=1) if end else None, period=None if start else period,
+            group_by='ticker', auto_adjust=False, progress=False, threads=True
+        )
+        result = {}
+        for ticker in tickers:
+            frame = history[ticker] if isinstance(history.columns, pd.MultiIndex) else history
+            frame = frame.dropna(how='all').reset_index()
+            frame.columns = [str(column).lower() for column in frame.columns]
+            frame['date'] = pd.to_datetime(frame['date']).dt.date
+            result[ticker] = frame.reindex(columns=HISTORY_COLUMNS)
+        return result
+
+
+class RecordingProvider(MarketDataProvider):
+    """
+    Wraps another provider and records every response as a fixture that ReplayProvider can serve.
+    Fixtures are stored as <directory>/<kind>/<ticker>.json, history is recorded over the full
+    requested range and merged with earlier recordings of the same ticker.
+    """
+    def __init__(self, provider: MarketDataProvider, directory: str):
+        self.provider = provider
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def get_info(self, ticker: str) -> Dict:
+        info = self.provider.get_info(ticker)
+        self._write("info", ticker, info)
+        return info
+
+    def get_splits(self, ticker: str) -> List[StockSplit]:
+        splits = self.provider.get_splits(ticker)
+        self._write("splits", ticker, [[split.split_date.isoformat(), split.ratio] for split in splits])
+        return splits
+
+    def get_dividends(self, ticker: str) -> List[Dividend]:
+        dividends = self.provider.get_dividends(ticker)
+        self._write("dividends", ticker, [[dividend.ex_date.isoformat(), dividend.amount] for dividend in dividends])
+        return dividends
+
+    def get_history(self, ticker: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        return self.get_history_many([ticker], start, end, period)[ticker]
+
+    def get_history_many(self, tickers: List[str], start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        histories = self.provider.get_history_many(tickers, start, end, period)
+        for ticker, history in histories.items():
+            recorded = ReplayProvider(self.directory).get_history(ticker) if os.path.exists(self._path("history", ticker)) else None
+            merged = pd.concat([recorded, history]).drop_duplicates('date', keep='last').sort_values('date') if recorded is not None else history
+            rows = merged[HISTORY_COLUMNS].itertuples(index=False)
+            self._write("history", ticker, [[row[0].isoformat(), *(float(value) for value in row[1:])] for row in rows])
+        return histories
+
+    def _path(self, kind: str, ticker: str) -> str:
+        return os.path.join(self.directory, kind, f"{ticker}.json")
+
+    def _write(self, kind: str, ticker: str, payload):
+        with self._lock:
+            os.makedirs(os.path.join(self.directory, kind), exist_ok=True)
+            with open(self._path(kind, ticker), "w") as file:
+                json.dump(payload, file, default=str)
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves fixtures recorded by RecordingProvider from disk, without any network access.
+    Periods are resolved against the last recorded date, so replayed runs are deterministic.
+    Tickers without a fixture are treated as unknown: empty info, no corporate actions, no history.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def get_info(self, ticker: str) -> Dict:
+        return self._read("info", ticker, {})
+
+    def get_splits(self, ticker: str) -> List[StockSplit]:
+        return [StockSplit(split_date=datetime.date.fromisoformat(date), ratio=ratio) for date, ratio in self._read("splits", ticker, [])]
+
+    def get_dividends(self, ticker: str) -> List[Dividend]:
+        return [Dividend(ex_date=datetime.date.fromisoformat(date), amount=amount) for date, amount in self._read("dividends", ticker, [])]
+
+    def get_history(self, ticker: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        history = pd.DataFrame(self._read("history", ticker, []), columns=HISTORY_COLUMNS)
+        history['date'] = [datetime.date.fromisoformat(date) for date in history['date']]
+        if history.empty:
+            return history
+        start = start or period_start(period, history['date'].iloc[-1])
+        mask = np.ones(len(history), dtype=bool)
+        if start is not None:
+            mask &= (history['date'] >= start).to_numpy()
+        if end is not None:
+            mask &= (history['date'] <= end).to_numpy()
+        return history[mask].reset_index(drop=True)
+
+    def _read(self, kind: str, ticker: str, default):
+        path = os.path.join(self.directory, kind, f"{ticker}.json")
+        if not os.path.exists(path):
+            return default
+        with open(path) as file:
+            return json.load(file)
+
+
+class FakeProvider(MarketDataProvider):
+    """
+    Offline provider returning deterministic synthetic data, with injectable latency and faults.
+    Used to exercise the fetching pipeline without network access.
+    Args:
+        latency (float): Mean seconds every request takes
+        failure_rate (float): Probability that a request raises ConnectionError
+        bse_only (Optional[List[str]]): Symbols that are only listed on BSE, their .NS info is empty
+        seed (int): Seed for latency and fault injection
+    """
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, bse_only: Optional[List[str]] = None, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.bse_only = set(bse_only or [])
+        self.calls: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def get_info(self, ticker: str) -> Dict:
+        self._request("info", ticker)
+        symbol, exchange = ticker.rsplit(".", 1)
+        if exchange == "NS" and symbol in self.bse_only:
+            return {}
+        seed = sum(map(ord, symbol))
+        return {
+            'symbol': ticker,
+            'longName': f"{symbol} Limited",
+            'sector': "Technology" if seed % 2 else "Financial Services",
+            'industry': "Software" if seed % 2 else "Banks",
+            'previousClose': float(100 + seed % 900),
+            'marketCap': 10 ** 9 * (1 + seed % 50),
+            'beta': 0.5 + (seed % 10) / 10,
+            'trailingPE': float(10 + seed % 40),
+        }
+
+    def get_splits(self, ticker: str) -> List[StockSplit]:
+        self._request("splits", ticker)
+        seed = sum(map(ord, ticker))
+        return [StockSplit(split_date=datetime.date(2018 + seed % 5, 1 + seed % 12, 1 + seed % 28), ratio=2.0)] if seed % 3 == 0 else []
+
+    def get_dividends(self, ticker: str) -> List[Dividend]:
+        self._request("dividends", ticker)
+        seed = sum(map(ord, ticker))
+        return [Dividend(ex_date=datetime.date(year, 1 + seed % 12, 1 + seed % 28), amount=float(1 + seed % 20)) for year in range(2018, 2025)]
+
+    def get_history(self, ticker: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, period: Optional[str] = None) -> pd.DataFrame:
+        """
+        Geometric random walk on weekdays, seeded by the ticker so every call returns the same prices.
+        """
+        self._request("history", ticker)
+        end = end or datetime.date.today()
+        start = start or period_start(period, end) or datetime.date(2010, 1, 1)
+        days = np.arange(np.datetime64("2010-01-01"), np.datetime64(end, "D") + np.timedelta64(1, "D"), dtype='datetime64[D]')
+        days = days[np.is_busday(days)]
+        seed = sum(map(ord, ticker))
+        close = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0.0003, 0.015, size=len(days))))
+        volume = np.random.default_rng([seed, 1]).integers(10 ** 4, 10 ** 6, size=len(days))     # Own stream, so both stay the same whatever the end date
+        history = pd.DataFrame({
+            'date': days.astype(object), 'open': close * 0.998, 'high': close * 1.01, 'low': close * 0.99,
+            'close': close, 'volume': volume
+        })
+        return history[history['date'] >= start].reset_index(drop=True)
+
+    def _request(self, kind: str, ticker: str):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            delay = self._random.uniform(0.5, 1.5) * self.latency
+            failed = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if failed:
+            raise ConnectionError(f"Injected fault for {kind} of {ticker}")
+
+
+def create_provider(config: Optional[Dict] = None) -> MarketDataProvider:
+    """
+    Create the market data provider selected in the user configuration, the "market_data" entry of
+    user_data.json. Without configuration Yahoo Finance is used.
+    Example:
+        {"provider": "replay", "fixtures": "metadata/fixtures"}
+    Args:
+        config (Optional[Dict]): provider is one of "yfinance", "record", "replay" or "fake".
+            record and replay read the fixture directory from fixtures, fake accepts latency and failure_rate.
+    Returns:
+        MarketDataProvider: The configured provider
+    """
+    config = config or {}
+    name = config.get("provider", "yfinance")
+    fixtures = config.get("fixtures", "metadata/fixtures")
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "record":
+        return RecordingProvider(YFinanceProvider(), fixtures)
+    if name == "replay":
+        return ReplayProvider(fixtures)
+    if name == "fake":
+        return FakeProvider(latency=config.get("latency", 0.0), failure_rate=config.get("failure_rate", 0.0))
+    raise ValueError(f"Unknown market data provider: {name}")
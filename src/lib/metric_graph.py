@@ -0,0 +1,129 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+# Version of an input set without one, which always counts as changed
+UNVERSIONED = object()
+
+
+@dataclass
+class NodeTiming:
+    computations: int = 0
+    total_seconds: float = 0
+    last_seconds: float = 0
+
+
+class MetricGraph:
+    """
+    Lazily computed, memoized values with declared dependencies.
+    Inputs are set from outside, nodes are functions of inputs and other nodes. A node is computed when
+    it is first read and kept until one of the inputs it depends on, directly or through other nodes,
+    changes. Setting an input invalidates only the nodes downstream of it.
+    Every computation is timed: timings holds the totals per node, recomputed the nodes computed since
+    the last reset_log call in order, with their seconds.
+    """
+
+    def __init__(self):
+        self._inputs: Dict[str, Any] = {}
+        self._versions: Dict[str, Any] = {}
+        self._nodes: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
+        self._values: Dict[str, Any] = {}
+        self._dependents: Dict[str, Set[str]] = defaultdict(set)
+        self.timings: Dict[str, NodeTiming] = defaultdict(NodeTiming)
+        self.recomputed: List[Tuple[str, float]] = []
+
+    def add_input(self, name: str, value: Any = None):
+        self._inputs[name] = value
+
+    def add_node(self, name: str, function: Callable, dependencies: Iterable[str]):
+        """
+        Add a node computed as function(*values of dependencies). Dependencies must be added before
+        the node, which keeps the graph acyclic.
+        """
+        dependencies = tuple(dependencies)
+        unknown = [dependency for dependency in dependencies if dependency not in self]
+        if unknown:
+            raise ValueError(f"Node {name} depends on unknown nodes: {unknown}")
+        if name in self:
+            raise ValueError(f"Node {name} already exists")
+        self._nodes[name] = (function, dependencies)
+        for dependency in dependencies:
+            self._dependents[dependency].add(name)
+
+    def node(self, name: str, *dependencies: str) -> Callable:
+        """
+        Decorator form of add_node.
+        """
+        def register(function):
+            self.add_node(name, function, dependencies)
+            return function
+        return register
+
+    def set_input(self, name: str, value: Any, version: Any = UNVERSIONED) -> Set[str]:
+        """
+        Set an input and invalidate the nodes that depend on it. With a version equal to the version of
+        the current value nothing is invalidated, the new value is taken without recomputing anything.
+        Returns:
+            Set[str]: Nodes whose memoized values were dropped
+        """
+        if name not in self._inputs:
+            raise KeyError(f"Unknown input: {name}")
+        unchanged = version is not UNVERSIONED and self._versions.get(name, UNVERSIONED) == version
+        self._inputs[name] = value
+        self._versions[name] = version
+        return set() if unchanged else self.invalidate(name)
+
+    def invalidate(self, name: str) -> Set[str]:
+        """
+        Drop the memoized values of everything downstream of a node or input.
+        """
+        dropped, pending = set(), [name]
+        while pending:
+            for dependent in self._dependents.get(pending.pop(), ()):
+                if dependent not in dropped:
+                    dropped.add(dependent)
+                    pending.append(dependent)
+        invalidated = {node for node in dropped if node in self._values}
+        for node in invalidated:
+            del self._values[node]
+        return invalidated
+
+    def get(self, name: str) -> Any:
+        if name in self._inputs:
+            return self._inputs[name]
+        if name in self._values:
+            return self._values[name]
+        function, dependencies = self._nodes[name]
+        arguments = [self.get(dependency) for dependency in dependencies]
+        start = time.perf_counter()
+        value = function(*arguments)
+        seconds = time.perf_counter() - start
+        self._values[name] = value
+
+        timing = self.timings[name]
+        timing.computations += 1
+        timing.total_seconds += seconds
+        timing.last_seconds = seconds
+        self.recomputed.append((name, seconds))
+        return value
+
+    def is_computed(self, name: str) -> bool:
+        return name in self._values
+
+    def reset_log(self):
+        self.recomputed = []
+
+    def report(self) -> str:
+        """
+        The nodes computed since the last reset_log, slowest first, with their seconds.
+        """
+        lines = [f"{name:40s} {seconds * 1000:9.3f} ms" for name, seconds in sorted(self.recomputed, key=lambda entry: -entry[1])]
+        total = sum(seconds for _, seconds in self.recomputed)
+        return "\n".join(lines + [f"{len(self.recomputed)} nodes computed in {total * 1000:.3f} ms"])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._inputs or name in self._nodes
+
+    def __repr__(self) -> str:
+        return f"MetricGraph({len(self._inputs)} inputs, {len(self._nodes)} nodes, {len(self._values)} computed)"
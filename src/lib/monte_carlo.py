@@ -0,0 +1,206 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.lib.risk import RISK_WINDOW, window_returns
+from src.lib.valuation import ValuationMatrix
+
+CHOLESKY = 'cholesky'       # Correlated normal daily log returns from a Cholesky factor of the covariance
+BOOTSTRAP = 'bootstrap'     # Whole days of log returns drawn from the history, keeping their correlation
+SIMULATION_METHODS = (CHOLESKY, BOOTSTRAP)
+HORIZONS = (1, 10)          # Trading days
+VAR_CONFIDENCE = 0.99
+DEFAULT_PATHS = 100000
+DEFAULT_SEED = 0
+# Returns are simulated in single precision, far finer than the sampling error of any percentile
+SIMULATION_DTYPE = np.float32
+# Simulated returns per chunk, which bounds every array of a chunk to about 16 MB
+CHUNK_ELEMENTS = 2_000_000
+# Below this many paths starting the worker processes costs more than simulating them
+PARALLEL_MIN_PATHS = 200000
+TERMINAL_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+_model: Optional["ReturnModel"] = None
+
+
+class ReturnModel:
+    """
+    Distribution of the daily log returns of a universe of symbols.
+    Args:
+        method (str): CHOLESKY or BOOTSTRAP
+        factor (Optional[np.ndarray]): Lower triangular factor of the daily covariance, for CHOLESKY
+        history (Optional[np.ndarray]): Daily log returns of shape (days, symbols), for BOOTSTRAP
+    Both are stored in SIMULATION_DTYPE.
+    """
+    __slots__ = ('method', 'factor', 'history')
+
+    def __init__(self, method: str, factor: Optional[np.ndarray] = None, history: Optional[np.ndarray] = None):
+        if method not in SIMULATION_METHODS:
+            raise ValueError(f"Unknown simulation method: {method}, expected one of {SIMULATION_METHODS}")
+        self.method = method
+        self.factor = factor.astype(SIMULATION_DTYPE) if factor is not None else None
+        self.history = history.astype(SIMULATION_DTYPE) if history is not None else None
+
+    @classmethod
+    def from_covariance(cls, covariance: np.ndarray) -> "ReturnModel":
+        """
+        Normal daily log returns with zero mean and the given daily covariance. A covariance that is
+        positive semi-definite only is factored through its eigenvalues instead.
+        """
+        try:
+            factor = np.linalg.cholesky(covariance)
+        except np.linalg.LinAlgError:
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+            factor = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+        return cls(CHOLESKY, factor=factor)
+
+    @classmethod
+    def from_history(cls, valuation: ValuationMatrix, universe: List[str], window: int = RISK_WINDOW) -> "ReturnModel":
+        """
+        The log returns of the universe over the last window days of the valuation, drawn a day at a time.
+        """
+        position = {symbol: column for column, symbol in enumerate(valuation.symbols)}
+        end = len(valuation.ordinals) - 1
+        returns = window_returns(valuation, np.array([position[symbol] for symbol in universe], dtype=np.int64), end - window + 1, end)
+        return cls(BOOTSTRAP, history=np.log1p(returns))
+
+    @property
+    def symbols(self) -> int:
+        return len(self.factor) if self.method == CHOLESKY else self.history.shape[1]
+
+
+def _set_model(model: ReturnModel):
+    """
+    Worker initializer: keep the model once per process instead of receiving it with every chunk.
+    """
+    global _model
+    _model = model
+
+
+def _horizon_log_returns(model: ReturnModel, rng: np.random.Generator, paths: int, horizons: Tuple[int, ...]) -> Iterable[np.ndarray]:
+    """
+    Log returns of every symbol over every horizon, one array of shape (paths, symbols) per horizon.
+    Normal log returns add up to normal ones, so a horizon of normal days is one draw scaled by the
+    square root of its length, and every draw is used twice, as is and negated (antithetic variates),
+    which halves the random numbers and the products with the factor. Bootstrapped horizons add the
+    days drawn for them, as a product of the counts of every historical day with the history.
+    """
+    if model.method == CHOLESKY:
+        daily = rng.standard_normal(((paths + 1) // 2, model.symbols), dtype=SIMULATION_DTYPE) @ model.factor.T
+        daily = np.concatenate([daily, -daily])[:paths]
+        for horizon in horizons:
+            yield daily * SIMULATION_DTYPE(np.sqrt(horizon))
+        return
+    days = len(model.history)
+    for horizon in horizons:
+        draws = rng.integers(0, days, size=(paths, horizon))
+        if horizon == 1:
+            yield model.history[draws[:, 0]]
+        else:
+            counts = np.bincount((np.arange(paths)[:, None] * days + draws).ravel(), minlength=paths * days).reshape(paths, days)
+            yield counts.astype(SIMULATION_DTYPE) @ model.history
+
+
+def _simulate_chunk(values: np.ndarray, horizons: Tuple[int, ...], paths: int, seed: np.random.SeedSequence,
+                    model: Optional[ReturnModel] = None) -> np.ndarray:
+    """
+    Profit or loss of the positions on every path of one chunk, of shape (horizons, paths).
+    """
+    model = model or _model
+    rng = np.random.Generator(np.random.PCG64(seed))
+    values = values.astype(SIMULATION_DTYPE)
+    return np.stack([np.expm1(log_returns) @ values for log_returns in _horizon_log_returns(model, rng, paths, horizons)]).astype(np.float64)
+
+
+def chunk_sizes(paths: int, elements_per_path: int) -> List[int]:
+    """
+    Paths of every chunk, each chunk holding at most CHUNK_ELEMENTS random numbers. The chunks only
+    depend on the paths and the model, not on the number of workers.
+    """
+    per_chunk = max(1, CHUNK_ELEMENTS // max(elements_per_path, 1))
+    return [min(per_chunk, paths - start) for start in range(0, paths, per_chunk)]
+
+
+class MonteCarloResult:
+    """
+    Simulated profit or loss of a portfolio over every horizon.
+    Args:
+        value (float): Market value of the simulated positions today
+        horizons (Tuple[int, ...]): Horizons in trading days
+        pnl (np.ndarray): Profit or loss of shape (horizons, paths)
+    """
+    __slots__ = ('value', 'horizons', 'pnl')
+
+    def __init__(self, value: float, horizons: Tuple[int, ...], pnl: np.ndarray):
+        self.value = value
+        self.horizons = tuple(horizons)
+        self.pnl = pnl
+
+    def _paths(self, horizon: int) -> np.ndarray:
+        return self.pnl[self.horizons.index(horizon)]
+
+    def value_at_risk(self, horizon: int, confidence: float = VAR_CONFIDENCE) -> float:
+        """
+        The loss that the given share of the paths stays within, positive for a loss.
+        """
+        paths = self._paths(horizon)
+        return float(-np.quantile(paths, 1 - confidence)) if len(paths) else 0.0
+
+    def conditional_value_at_risk(self, horizon: int, confidence: float = VAR_CONFIDENCE) -> float:
+        """
+        The average loss of the paths beyond the value at risk, the expected shortfall.
+        """
+        paths = self._paths(horizon)
+        if not len(paths):
+            return 0.0
+        tail = paths[paths <= np.quantile(paths, 1 - confidence)]
+        return float(-tail.mean())
+
+    def terminal_values(self, horizon: int) -> np.ndarray:
+        return self.value + self._paths(horizon)
+
+    def percentiles(self, horizon: int, percentiles: Iterable[float] = TERMINAL_PERCENTILES) -> Dict[float, float]:
+        """
+        Percentiles of the terminal value of the portfolio after the horizon.
+        """
+        percentiles = list(percentiles)
+        if not len(self._paths(horizon)):
+            return {percentile: self.value for percentile in percentiles}
+        return dict(zip(percentiles, np.percentile(self.terminal_values(horizon), percentiles).tolist()))
+
+
+def simulate_portfolio(values: np.ndarray, model: ReturnModel, paths: int = DEFAULT_PATHS, horizons: Tuple[int, ...] = HORIZONS,
+                       seed: int = DEFAULT_SEED, max_workers: Optional[int] = None) -> MonteCarloResult:
+    """
+    Monte Carlo profit or loss of positions over every horizon, revaluing every position on every path.
+    The paths are simulated in chunks of bounded memory, each with its own random stream spawned from
+    the seed, so the result depends on the seed alone and not on how the chunks are spread over the
+    worker processes.
+    Args:
+        values (np.ndarray): Market value of the position in every symbol of the model, negative when short
+        model (ReturnModel): Distribution of the daily log returns
+        paths (int): Number of paths
+        horizons (Tuple[int, ...]): Horizons in trading days
+        seed (int): Seed of the random streams
+        max_workers (Optional[int]): Number of worker processes, defaults to the CPU count. One worker, or
+            fewer than PARALLEL_MIN_PATHS paths, simulates in this process.
+    Returns:
+        MonteCarloResult: The simulated profit or loss
+    """
+    values = np.asarray(values, dtype=np.float64)
+    horizons = tuple(horizons)
+    if not len(values):
+        return MonteCarloResult(0.0, horizons, np.zeros((len(horizons), paths)))
+    elements = model.symbols if model.method == CHOLESKY else max(model.symbols, len(model.history))
+    sizes = chunk_sizes(paths, elements)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = min(max_workers or os.cpu_count() or 1, len(sizes))
+
+    if workers <= 1 or paths < PARALLEL_MIN_PATHS:
+        chunks = [_simulate_chunk(values, horizons, size, chunk_seed, model) for size, chunk_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_model, initargs=(model,)) as executor:
+            chunks = list(executor.map(_simulate_chunk, [values] * len(sizes), [horizons] * len(sizes), sizes, seeds))
+    return MonteCarloResult(float(values.sum()), horizons, np.concatenate(chunks, axis=1))
@@ -0,0 +1,126 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.lib.generate_holdings import INDEX_COLUMNS
+from src.lib.holdings_engine import build_holdings
+from src.lib.trading_calendar import AsOfLookup
+from src.models.holding import Holding
+from src.models.stock_info import StockInfo
+from src.models.trade_frame import TradeFrame
+
+# Below this many trades starting the worker processes costs more than building the holdings
+PARALLEL_MIN_TRADES = 20000
+# Shards per worker, more shards even out symbols with very different trade counts
+SHARDS_PER_WORKER = 4
+
+_index_lookup: Optional[AsOfLookup] = None
+_attached: List[shared_memory.SharedMemory] = []
+
+
+class SharedIndexLookup:
+    """
+    An AsOfLookup whose arrays live in shared memory, so worker processes map the index history
+    instead of receiving a pickled copy with every shard. Created by the parent, which owns and
+    unlinks the blocks when closed.
+    """
+    def __init__(self, lookup: AsOfLookup):
+        self.columns = lookup.columns
+        self.blocks = []
+        self.specs = []
+        for array in (lookup.ordinals, lookup.values):
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.specs.append((block.name, array.shape, array.dtype.str))
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+    def __enter__(self) -> "SharedIndexLookup":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach_index_lookup(specs: List[Tuple[str, tuple, str]], columns: List[str]):
+    """
+    Worker initializer: map the shared index arrays once per process.
+    """
+    global _index_lookup
+    arrays = []
+    for name, shape, dtype in specs:
+        block = shared_memory.SharedMemory(name=name)
+        _attached.append(block)     # The arrays are views into the block, which must stay open
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    _index_lookup = AsOfLookup(arrays[0], arrays[1], columns)
+
+
+def _build_shard(symbols: List[str], trades: TradeFrame, stock_info: Dict[str, StockInfo]) -> List[Holding]:
+    return build_holdings(symbols, trades, _index_lookup, stock_info)
+
+
+def shard_symbols(symbols: List[str], groups: Dict[str, np.ndarray], shards: int) -> List[List[str]]:
+    """
+    Split symbols into shards of similar trade counts: symbols are taken from the most traded down and
+    each goes to the shard with the fewest trades so far, ties going to the lower shard. The result
+    only depends on the symbols and their trade counts.
+    """
+    counts = [len(groups[symbol]) if symbol in groups else 0 for symbol in symbols]
+    order = sorted(range(len(symbols)), key=lambda position: (-counts[position], position))
+    assigned = [[] for _ in range(shards)]
+    loads = [0] * shards
+    for position in order:
+        shard = loads.index(min(loads))
+        assigned[shard].append(symbols[position])
+        loads[shard] += counts[position] + 1
+    return [shard for shard in assigned if shard]
+
+
+def generate_holdings_parallel(symbols: List[str], tradebook: TradeFrame, index_historical_data: pd.DataFrame, stock_info: Dict[str, StockInfo],
+                               max_workers: Optional[int] = None) -> List[Holding]:
+    """
+    Same holdings as generate_holdings_vectorized, with the symbols sharded across a process pool.
+    Every shard ships only the trades and stock information of its symbols, the index history is shared
+    through shared memory. The holdings are returned in the order of symbols whatever the scheduling.
+    Args:
+        symbols (List[str]): Symbols to build holdings for
+        tradebook (TradeFrame): Split adjusted tradebook, sorted by timestamp
+        index_historical_data (pd.DataFrame): Index closes with columns date, nifty50, bsesensex, niftybank
+        stock_info (Dict[str, StockInfo]): Stock information per symbol
+        max_workers (Optional[int]): Number of worker processes, defaults to the CPU count. One worker, or
+            fewer than PARALLEL_MIN_TRADES trades, builds the holdings in this process.
+    Returns:
+        List[Holding]: One holding per symbol, in the order of symbols
+    """
+    symbols = list(symbols)
+    index_lookup = AsOfLookup.from_frame(index_historical_data, INDEX_COLUMNS)
+    workers = min(max_workers or os.cpu_count() or 1, len(symbols))
+    if workers <= 1 or len(tradebook) < PARALLEL_MIN_TRADES:
+        return build_holdings(symbols, tradebook, index_lookup, stock_info)
+
+    groups = tradebook.symbol_groups()
+    shards = shard_symbols(symbols, groups, workers * SHARDS_PER_WORKER)
+    jobs = []
+    for shard in shards:
+        rows = [groups[symbol] for symbol in shard if symbol in groups]
+        trades = tradebook.take(np.sort(np.concatenate(rows))) if rows else TradeFrame.empty()
+        jobs.append((shard, trades, {symbol: stock_info[symbol] for symbol in shard if symbol in stock_info}))
+
+    with SharedIndexLookup(index_lookup) as shared, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_attach_index_lookup, initargs=(shared.specs, shared.columns)) as executor:
+        results = list(executor.map(_build_shard, *zip(*jobs)))
+
+    by_symbol = {}
+    for holdings in results:
+        for holding in holdings:
+            holding.stock_info = stock_info.get(holding.symbol)     # The parent's objects, not unpickled copies
+            by_symbol[holding.symbol] = holding
+    return [by_symbol[symbol] for symbol in symbols]
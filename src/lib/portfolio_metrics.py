@@ -0,0 +1,375 @@
+from dataclasses import fields
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from src.lib.generate_holdings import RISK_FREE_RATE
+from src.lib.incremental import index_fingerprint, positions_fingerprint, stock_info_fingerprint, valuation_fingerprint
+from src.lib.metric_graph import MetricGraph, UNVERSIONED
+from src.lib.monte_carlo import DEFAULT_PATHS, HORIZONS, ReturnModel, simulate_portfolio
+from src.lib.risk import CovarianceCache, covered_columns, risk_contributions
+from src.lib.trading_calendar import AsOfLookup
+from src.lib.valuation import ValuationMatrix, TRADING_DAYS_PER_YEAR
+from src.models.holding import Holding
+from src.models.portfolio import Portfolio
+from src.models.stock_info import StockInfo
+
+# Columns of the fundamentals matrix: StockInfo fields, and growth rates derived from the EPS fields
+FUNDAMENTAL_COLUMNS = (
+    'dividend_yield', 'five_year_average_dividend_yield', 'earnings_yield', 'forward_earnings_yield', 'price_to_book',
+    'price_to_sales_trailing_12_months', 'enterprise_to_revenue', 'enterprise_to_ebitda', 'target_mean_price', 'beta',
+    'market_cap', 'ebitda_margins', 'operating_margins', 'gross_margins', 'revenue_growth', 'eps_growth',
+    'earnings_growth', 'debt_to_equity',
+)
+# Fields Yahoo Finance leaves out for some stocks, which are then stored as 0 and left out of the averages
+MISSING_WHEN_ZERO = {
+    'earnings_yield', 'forward_earnings_yield', 'price_to_book', 'price_to_sales_trailing_12_months', 'enterprise_to_revenue',
+    'enterprise_to_ebitda', 'target_mean_price', 'beta', 'market_cap', 'debt_to_equity',
+}
+# Portfolio fields that are the value weighted average of a fundamentals column
+WEIGHTED_FIELDS = {
+    'dividend_yield': 'dividend_yield',
+    'average_dividend_yield': 'five_year_average_dividend_yield',
+    'weighted_average_dividend_yield': 'dividend_yield',
+    'weighted_average_price_to_book': 'price_to_book',
+    'weighted_average_price_to_sales': 'price_to_sales_trailing_12_months',
+    'weighted_average_enterprise_to_revenue': 'enterprise_to_revenue',
+    'weighted_average_enterprise_to_ebitda': 'enterprise_to_ebitda',
+    'weighted_average_target_price': 'target_mean_price',
+    'weighted_average_beta': 'beta',
+    'weighted_average_market_cap': 'market_cap',
+    'weighted_average_ebitda_margin': 'ebitda_margins',
+    'weighted_average_operating_margin': 'operating_margins',
+    'weighted_average_gross_margin': 'gross_margins',
+    'weighted_average_revenue_growth': 'revenue_growth',
+    'weighted_average_eps_growth': 'eps_growth',
+    'weighted_average_earnings_growth': 'earnings_growth',
+    'weighted_average_debt_to_equity': 'debt_to_equity',
+}
+BENCHMARK_INDEX = 'nifty50'
+CONCENTRATION_HOLDINGS = 5     # The concentration ratio is the weight of the largest five holdings
+# Portfolio fields read from the Monte Carlo simulation, computed only when a lazy portfolio reads them
+SIMULATED_FIELDS = tuple(f'{kind}_{horizon}d' for horizon in HORIZONS for kind in ('value_at_risk', 'conditional_value_at_risk')) + ('terminal_value_percentiles',)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+def fundamentals_matrix(stock_infos: List[Optional[StockInfo]]) -> np.ndarray:
+    """
+    Fundamentals of every holding as a float64 matrix of shape (holdings, FUNDAMENTAL_COLUMNS), NaN where
+    the stock information or the field is missing. The price to earnings ratios are stored as earnings
+    yields, so their weighted average is the earnings of the portfolio over its value.
+    """
+    fields = {
+        name: np.array([getattr(stock, name, None) if stock is not None else None for stock in stock_infos], dtype=np.float64)
+        for name in ('dividend_yield', 'five_year_average_dividend_yield', 'trailing_pe', 'forward_pe', 'price_to_book',
+                     'price_to_sales_trailing_12_months', 'enterprise_to_revenue', 'enterprise_to_ebitda', 'target_mean_price',
+                     'beta', 'market_cap', 'ebitda_margins', 'operating_margins', 'gross_margins', 'revenue_growth',
+                     'forward_eps', 'trailing_eps', 'eps_current_year', 'eps_trailing_12months', 'debt_to_equity')
+    }
+    fields['earnings_yield'] = _ratio(np.ones(len(stock_infos)), fields['trailing_pe'])
+    fields['forward_earnings_yield'] = _ratio(np.ones(len(stock_infos)), fields['forward_pe'])
+    fields['eps_growth'] = _ratio(fields['forward_eps'] - fields['trailing_eps'], np.abs(fields['trailing_eps']))
+    fields['earnings_growth'] = _ratio(fields['eps_current_year'] - fields['eps_trailing_12months'], np.abs(fields['eps_trailing_12months']))
+
+    matrix = np.column_stack([fields[column] for column in FUNDAMENTAL_COLUMNS]) if stock_infos else np.empty((0, len(FUNDAMENTAL_COLUMNS)))
+    zero_missing = np.array([column in MISSING_WHEN_ZERO for column in FUNDAMENTAL_COLUMNS])
+    matrix[:, zero_missing] = np.where(matrix[:, zero_missing] == 0, np.nan, matrix[:, zero_missing])
+    return matrix
+
+
+def weighted_averages(weights: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Weighted average of every column, with the weights renormalized over the holdings that have a value.
+    Columns without any value average to 0.
+    """
+    present = ~np.isnan(matrix)
+    covered = np.abs(weights) @ present
+    return np.where(covered > 0, weights @ np.where(present, matrix, 0.0) / np.where(covered > 0, covered, 1.0), 0.0)
+
+
+def allocation(labels: List[str], weights: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """
+    Number of holdings and total weight per label, such as the sector of every holding.
+    """
+    codes, names = pd.factorize(pd.Series(labels, dtype=object).fillna('Unknown'))
+    counts = np.bincount(codes, minlength=len(names))
+    totals = np.bincount(codes, weights=weights, minlength=len(names))
+    return {name: {"count": int(count), "weight": float(total)} for name, count, total in zip(names.tolist(), counts.tolist(), totals.tolist())}
+
+
+def _risk_free_excess(returns: np.ndarray) -> np.ndarray:
+    return returns - RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
+
+
+def _annualized_return(returns: np.ndarray) -> float:
+    growth = np.prod(1 + returns)
+    return float(growth ** (TRADING_DAYS_PER_YEAR / len(returns)) - 1) if growth > 0 else -1.0
+
+
+def _max_drawdown(returns: np.ndarray) -> float:
+    growth = np.cumprod(1 + returns)
+    return float(np.max(1 - growth / np.maximum.accumulate(growth), initial=0))
+
+
+def _sharpe_ratio(returns: np.ndarray, standard_deviation: float) -> float:
+    if standard_deviation <= 0:
+        return 0
+    return float(_risk_free_excess(returns).mean() / standard_deviation * np.sqrt(TRADING_DAYS_PER_YEAR))
+
+
+def _sortino_ratio(returns: np.ndarray) -> float:
+    excess = _risk_free_excess(returns)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2))
+    return float(excess.mean() / downside * np.sqrt(TRADING_DAYS_PER_YEAR)) if downside > 0 else 0
+
+
+def turnover_ratio(valuation: ValuationMatrix) -> float:
+    """
+    The smaller of the purchases and the sales over the last year, over the average value.
+    """
+    flow, value = valuation.portfolio_flow()[-TRADING_DAYS_PER_YEAR:], valuation.portfolio_value()[-TRADING_DAYS_PER_YEAR:]
+    traded = min(flow[flow > 0].sum(), -flow[flow < 0].sum())
+    return float(traded / value.mean()) if value.mean() > 0 else 0
+
+
+def benchmark_returns(valuation: ValuationMatrix, index_data: pd.DataFrame) -> Optional[np.ndarray]:
+    """
+    Daily returns of the benchmark index on the days of the valuation, None without its history.
+    """
+    if index_data.empty or BENCHMARK_INDEX not in index_data:
+        return None
+    closes = AsOfLookup.from_frame(index_data, [BENCHMARK_INDEX]).asof(valuation.ordinals, BENCHMARK_INDEX)
+    return closes[1:] / closes[:-1] - 1
+
+
+def _beta(returns: np.ndarray, benchmark: np.ndarray) -> float:
+    benchmark_variance = benchmark.var(ddof=1)
+    return float(np.cov(returns, benchmark)[0, 1] / benchmark_variance) if benchmark_variance > 0 else 0
+
+
+def _alpha(returns: np.ndarray, benchmark: np.ndarray, beta: float) -> float:
+    daily_risk_free = RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
+    return float((returns.mean() - daily_risk_free - beta * (benchmark.mean() - daily_risk_free)) * TRADING_DAYS_PER_YEAR)
+
+
+def _tracking_error(returns: np.ndarray, benchmark: np.ndarray) -> float:
+    return float((returns - benchmark).std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR))
+
+
+def _information_ratio(returns: np.ndarray, benchmark: np.ndarray, tracking_error: float) -> float:
+    return float((returns - benchmark).mean() * TRADING_DAYS_PER_YEAR / tracking_error) if tracking_error > 0 else 0
+
+
+def _with_returns(function, default=0):
+    """
+    Wrap a return metric to be its default with fewer than two daily returns, or without benchmark
+    returns where it takes them. Days before the benchmark history, whose benchmark returns are NaN,
+    are left out.
+    """
+    def metric(returns, *arguments):
+        if any(argument is None for argument in arguments):
+            return default
+        covered = np.ones(len(returns), dtype=bool)
+        for argument in arguments:
+            if isinstance(argument, np.ndarray):
+                covered &= ~np.isnan(argument)
+        if not covered.all():
+            returns = returns[covered]
+            arguments = [argument[covered] if isinstance(argument, np.ndarray) else argument for argument in arguments]
+        if len(returns) < 2:
+            return default
+        return function(returns, *arguments)
+    return metric
+
+
+def _holding_risk(covariance, universe: List[str], holdings: List[Holding], weights: np.ndarray) -> Dict[str, object]:
+    """
+    Risk contributions of the holdings with a covariance, their weights renormalized among themselves.
+    """
+    position = {holding.symbol: row for row, holding in enumerate(holdings)}
+    universe_weights = weights[[position[symbol] for symbol in universe]] if universe else np.zeros(0)
+    gross = np.abs(universe_weights).sum()
+    risk = risk_contributions(covariance[0] * TRADING_DAYS_PER_YEAR, universe_weights / gross if gross > 0 else universe_weights)
+    risk['shrinkage'] = covariance[1]
+    return risk
+
+
+def _simulation(covariance, universe: List[str], holdings: List[Holding], market_values: np.ndarray, workers: Optional[int]):
+    """
+    Monte Carlo profit or loss of the holdings with a covariance, from correlated normal log returns.
+    """
+    position = {holding.symbol: row for row, holding in enumerate(holdings)}
+    values = market_values[[position[symbol] for symbol in universe]] if universe else np.zeros(0)
+    return simulate_portfolio(values, ReturnModel.from_covariance(covariance[0]), DEFAULT_PATHS, max_workers=workers)
+
+
+def portfolio_graph(covariance_cache: Optional[CovarianceCache] = None, workers: Optional[int] = None) -> MetricGraph:
+    """
+    Metric graph of every parameter of the portfolio of the current holdings.
+    Inputs:
+        holdings: Current holdings, whose quantities, investments and symbols the graph reads
+        prices: Current price of every holding, in the order of the holdings
+        fundamentals: Stock information per symbol
+        valuation: Daily valuation of the holdings
+        index_history: Index history
+    Every Portfolio field except xirr is a node of the same name. The fundamentals of the holdings are
+    gathered into one matrix node, and every weighted field is a product of the market value weights
+    with that matrix, so a price tick recomputes the weights and the averages but not the matrix.
+    Risk and return parameters depend only on the valuation and the index history. The covariance of
+    the holdings comes from the covariance cache, which rolls it forward by the days added to the valuation.
+    The value at risk simulates the paths of the holdings with the same covariance, only when read.
+    Args:
+        covariance_cache (CovarianceCache): Cache kept between refreshes, a new one by default
+        workers (Optional[int]): Processes of the Monte Carlo simulation, the CPU count by default
+    Returns:
+        MetricGraph: The graph, with empty inputs
+    """
+    graph = MetricGraph()
+    for name in ('holdings', 'prices', 'fundamentals', 'valuation', 'index_history'):
+        graph.add_input(name)
+
+    # Positions and weights
+    graph.add_node('stocks', lambda store: list(store.values()), ['fundamentals'])
+    graph.add_node('holding_stocks', lambda holdings, store: [store.get(holding.symbol) for holding in holdings], ['holdings', 'fundamentals'])
+    graph.add_node('quantities', lambda holdings: np.array([holding.quantity for holding in holdings], dtype=np.float64), ['holdings'])
+    graph.add_node('investments', lambda holdings: np.array([holding.investment for holding in holdings], dtype=np.float64), ['holdings'])
+    graph.add_node('market_values', lambda quantities, prices: quantities * np.asarray(prices, dtype=np.float64), ['quantities', 'prices'])
+    graph.add_node('weights', lambda value: value / np.abs(value).sum() if np.abs(value).sum() > 0 else np.zeros(len(value)), ['market_values'])
+
+    # Weighted fundamentals
+    graph.add_node('fundamentals_matrix', fundamentals_matrix, ['holding_stocks'])
+    graph.add_node('weighted_averages', lambda weights, matrix: dict(zip(FUNDAMENTAL_COLUMNS, weighted_averages(weights, matrix).tolist())),
+                   ['weights', 'fundamentals_matrix'])
+    for name, column in WEIGHTED_FIELDS.items():
+        graph.add_node(name, lambda averages, column=column: averages[column], ['weighted_averages'])
+    graph.add_node('trailing_pe', lambda averages: 1 / averages['earnings_yield'] if averages['earnings_yield'] else 0, ['weighted_averages'])
+    graph.add_node('forward_pe', lambda averages: 1 / averages['forward_earnings_yield'] if averages['forward_earnings_yield'] else 0, ['weighted_averages'])
+
+    # Investment and allocation
+    graph.add_node('total_investment', lambda investments: float(investments.sum()), ['investments'])
+    graph.add_node('current_value', lambda value: float(value.sum()), ['market_values'])
+    graph.add_node('profit_loss', lambda current_value, total_investment: current_value - total_investment, ['current_value', 'total_investment'])
+    graph.add_node('yield_on_cost', lambda value, matrix, investment: float(
+        (np.nan_to_num(matrix[:, FUNDAMENTAL_COLUMNS.index('dividend_yield')]) * value).sum() / investment) if investment else 0,
+        ['market_values', 'fundamentals_matrix', 'total_investment'])
+    graph.add_node('sector_weights', lambda stocks, weights: allocation([stock.sector if stock else None for stock in stocks], weights),
+                   ['holding_stocks', 'weights'])
+    graph.add_node('industry_weights', lambda stocks, weights: allocation([stock.industry if stock else None for stock in stocks], weights),
+                   ['holding_stocks', 'weights'])
+    graph.add_node('concentration_ratio', lambda weights: float(np.sort(np.abs(weights))[::-1][:CONCENTRATION_HOLDINGS].sum()), ['weights'])
+
+    # Risk and return, from the time-weighted daily returns of the market value, so deposits and
+    # withdrawals do not show up as gains or drawdowns
+    graph.add_node('portfolio_returns', lambda valuation: valuation.daily_returns()[1:], ['valuation'])
+    graph.add_node('benchmark_returns', benchmark_returns, ['valuation', 'index_history'])
+    graph.add_node('standard_deviation', _with_returns(lambda returns: float(returns.std(ddof=1))), ['portfolio_returns'])
+    graph.add_node('annualized_volatility', lambda deviation: deviation * np.sqrt(TRADING_DAYS_PER_YEAR), ['standard_deviation'])
+    graph.add_node('max_drawdown', _with_returns(_max_drawdown), ['portfolio_returns'])
+    graph.add_node('annualized_return', _with_returns(_annualized_return), ['portfolio_returns'])
+    graph.add_node('sharpe_ratio', _with_returns(_sharpe_ratio), ['portfolio_returns', 'standard_deviation'])
+    graph.add_node('sortino_ratio', _with_returns(_sortino_ratio), ['portfolio_returns'])
+    graph.add_node('turnover_ratio', lambda valuation, returns: turnover_ratio(valuation) if len(returns) >= 2 else 0, ['valuation', 'portfolio_returns'])
+    graph.add_node('beta', _with_returns(_beta), ['portfolio_returns', 'benchmark_returns'])
+    graph.add_node('alpha', _with_returns(_alpha), ['portfolio_returns', 'benchmark_returns', 'beta'])
+    graph.add_node('tracking_error', _with_returns(_tracking_error), ['portfolio_returns', 'benchmark_returns'])
+    graph.add_node('information_ratio', _with_returns(_information_ratio), ['portfolio_returns', 'benchmark_returns', 'tracking_error'])
+
+    # Covariance risk of the holdings with a full window of returns
+    covariance_cache = covariance_cache if covariance_cache is not None else CovarianceCache()
+    graph.add_node('risk_universe', lambda holdings, valuation: covered_columns(valuation, [holding.symbol for holding in holdings]),
+                   ['holdings', 'valuation'])
+    graph.add_node('covariance', covariance_cache.covariance, ['valuation', 'risk_universe'])
+    graph.add_node('holding_risk', _holding_risk, ['covariance', 'risk_universe', 'holdings', 'weights'])
+    graph.add_node('ex_ante_volatility', lambda risk: risk['volatility'], ['holding_risk'])
+    graph.add_node('diversification_ratio', lambda risk: risk['diversification_ratio'], ['holding_risk'])
+    graph.add_node('risk_contributions', lambda risk, universe: {
+        symbol: {"marginal": float(marginal), "component": float(component), "share": float(component / risk['volatility']) if risk['volatility'] else 0.0}
+        for symbol, marginal, component in zip(universe, risk['marginal'], risk['component'])
+    }, ['holding_risk', 'risk_universe'])
+
+    # Simulated value at risk of the same holdings
+    graph.add_node('simulation', lambda covariance, universe, holdings, market_values: _simulation(covariance, universe, holdings, market_values, workers),
+                   ['covariance', 'risk_universe', 'holdings', 'market_values'])
+    for horizon in HORIZONS:
+        graph.add_node(f'value_at_risk_{horizon}d', lambda simulation, horizon=horizon: simulation.value_at_risk(horizon), ['simulation'])
+        graph.add_node(f'conditional_value_at_risk_{horizon}d', lambda simulation, horizon=horizon: simulation.conditional_value_at_risk(horizon),
+                       ['simulation'])
+    graph.add_node('terminal_value_percentiles', lambda simulation: {horizon: simulation.percentiles(horizon) for horizon in simulation.horizons},
+                   ['simulation'])
+    return graph
+
+
+def set_portfolio_inputs(graph: MetricGraph, holdings: List[Holding], stock_info_store: Dict[str, StockInfo], valuation: ValuationMatrix,
+                         index_data: pd.DataFrame, versions: Optional[Dict[str, object]] = None) -> Set[str]:
+    """
+    Set every input of a portfolio graph, invalidating only the nodes downstream of the inputs whose
+    version changed. Inputs without a version in versions always count as changed.
+    Returns:
+        Set[str]: Nodes whose memoized values were dropped
+    """
+    versions = versions or {}
+    values = {
+        'holdings': list(holdings),
+        'prices': np.array([holding.current_price for holding in holdings], dtype=np.float64),
+        'fundamentals': stock_info_store,
+        'valuation': valuation,
+        'index_history': index_data,
+    }
+    invalidated = set()
+    for name, value in values.items():
+        invalidated |= graph.set_input(name, value, versions.get(name, UNVERSIONED))
+    return invalidated
+
+
+def portfolio_input_versions(holdings: List[Holding], stock_info_store: Dict[str, StockInfo], valuation: ValuationMatrix,
+                             index_data: pd.DataFrame, fingerprints: Dict[str, str]) -> Dict[str, object]:
+    """
+    Versions of the inputs of a portfolio graph, equal between refreshes exactly when the input is.
+    Args:
+        fingerprints (Dict[str, str]): Symbol fingerprints of the tradebook the holdings were built from
+    """
+    return {
+        'holdings': positions_fingerprint(holdings),
+        'prices': tuple(holding.current_price for holding in holdings),
+        'fundamentals': stock_info_fingerprint(stock_info_store),
+        'valuation': valuation_fingerprint(valuation, fingerprints),
+        'index_history': index_fingerprint(index_data),
+    }
+
+
+class LazyPortfolio(Portfolio):
+    """
+    Portfolio whose fields are nodes of a metric graph, computed on first access and memoized by the
+    graph until its inputs change. A field assigned directly, such as xirr, keeps the assigned value.
+    """
+
+    def __init__(self, graph: MetricGraph):
+        object.__setattr__(self, '_graph', graph)
+
+    def __getattribute__(self, name: str):
+        graph = object.__getattribute__(self, '_graph')
+        if name in graph and name not in object.__getattribute__(self, '__dict__'):
+            return graph.get(name)
+        return object.__getattribute__(self, name)
+
+
+def portfolio_metrics(holdings: List[Holding], stock_info_store: Dict[str, StockInfo], valuation: ValuationMatrix, index_data: pd.DataFrame) -> Portfolio:
+    """
+    Every parameter of the portfolio of the current holdings, computed at once through a new portfolio graph.
+    The simulated value at risk fields keep their defaults, a LazyPortfolio computes them when read.
+    Args:
+        holdings (List[Holding]): Current holdings
+        stock_info_store (Dict[str, StockInfo]): Stock information per symbol
+        valuation (ValuationMatrix): Daily valuation of the holdings
+        index_data (pd.DataFrame): Index history
+    Returns:
+        Portfolio: The portfolio
+    """
+    graph = portfolio_graph()
+    set_portfolio_inputs(graph, holdings, stock_info_store, valuation, index_data)
+    return Portfolio(**{field.name: graph.get(field.name) for field in fields(Portfolio) if field.name in graph and field.name not in SIMULATED_FIELDS})
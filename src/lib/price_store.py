@@ -0,0 +1,231 @@
+import os
+import shutil
+import hashlib
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.lib.trading_calendar import EPOCH_ORDINAL, to_ordinals, from_ordinal
+from src.models.stock_info import StockInfo
+
+PRICE_HISTORY_DIRECTORY = "metadata/price_history"
+# Prices are stored as float32, which keeps seven significant digits, and volumes as int64
+COLUMN_DTYPES = {'open': np.float32, 'high': np.float32, 'low': np.float32, 'close': np.float32, 'volume': np.int64}
+
+
+def split_fingerprint(stock_info: Optional[StockInfo]) -> str:
+    """
+    Fingerprint of the splits of a stock, the share basis its split adjusted prices are quoted in.
+    """
+    splits = [(split.split_date.isoformat(), float(split.ratio)) for split in stock_info.stock_splits] if stock_info else []
+    return hashlib.blake2b(repr(splits).encode(), digest_size=16).hexdigest()
+
+
+def splits_after(stock_info: Optional[StockInfo], days: np.ndarray) -> np.ndarray:
+    """
+    Product of the ratios of the splits after every day, which turns shares held that day into shares of today.
+    """
+    factors = np.ones(len(days))
+    if stock_info is None or not stock_info.stock_splits:
+        return factors
+    splits = sorted(stock_info.stock_splits, key=lambda split: split.split_date)
+    split_days = np.array([split.split_date for split in splits], dtype='datetime64[D]')
+    remaining = np.append(np.cumprod([split.ratio for split in splits][::-1])[::-1], 1.0)
+    return factors * remaining[np.searchsorted(split_days, days, side='right')]
+
+
+class PriceStore:
+    """
+    Daily OHLCV history of many symbols in a compressed sparse row layout: the rows of all symbols are
+    concatenated, sorted by (symbol, date), and symbol i owns rows offsets[i] to offsets[i + 1]. Every
+    column is one fixed width file, read back memory-mapped, so reading a symbol touches only its rows.
+    Next to the rows the store records the date range every symbol was synced over, so dates without a
+    session, such as before a listing, are not requested again.
+    Prices are adjusted for splits only, dividends leave them as quoted. The store records the split
+    fingerprint every symbol was synced with, a new split changes the prices of all earlier rows.
+    Args:
+        symbols (List[str]): Sorted symbols
+        offsets (np.ndarray): int64 row offsets, one more than there are symbols
+        ordinal (np.ndarray): int32 day ordinal of every row
+        columns (Dict[str, np.ndarray]): open, high, low, close and volume of every row
+        synced (np.ndarray): int32 array of shape (symbols, 2), first and last synced day ordinal
+        splits (Optional[np.ndarray]): Split fingerprint every symbol was synced with, empty when unknown
+    """
+    __slots__ = ('symbols', 'offsets', 'ordinal', 'columns', 'synced', 'splits', '_positions')
+
+    def __init__(self, symbols: List[str], offsets: np.ndarray, ordinal: np.ndarray, columns: Dict[str, np.ndarray], synced: np.ndarray,
+                 splits: Optional[np.ndarray] = None):
+        self.symbols = list(symbols)
+        self.offsets = offsets
+        self.ordinal = ordinal
+        self.columns = columns
+        self.synced = synced
+        self.splits = np.asarray(splits, dtype=str) if splits is not None else np.full(len(self.symbols), "")
+        self._positions = {symbol: position for position, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def empty(cls) -> "PriceStore":
+        return cls([], np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32),
+                   {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}, np.empty((0, 2), dtype=np.int32))
+
+    @classmethod
+    def load(cls, directory: str = PRICE_HISTORY_DIRECTORY, mmap: bool = True) -> "PriceStore":
+        """
+        Load the store written by save, an empty store if there is none.
+        Args:
+            directory (str): Directory the store was saved to
+            mmap (bool): Memory-map the row columns instead of reading them into memory
+        """
+        if not os.path.isdir(directory):
+            return cls.empty()
+
+        def read(name, mmap_mode=None):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+
+        offsets = read('offsets')
+        row_mode = 'r' if mmap and offsets[-1] > 0 else None
+        # Stores written before the split fingerprints were recorded count as synced with unknown splits
+        splits = read('splits') if os.path.exists(os.path.join(directory, "splits.npy")) else None
+        return cls(
+            read('symbols').tolist(), offsets, read('ordinal', row_mode),
+            {name: read(name, row_mode) for name in COLUMN_DTYPES}, read('synced'), splits
+        )
+
+    def save(self, directory: str = PRICE_HISTORY_DIRECTORY):
+        """
+        Write one .npy file per column to a temporary directory that replaces the previous store, readers
+        never see a partially written store. The previous store is renamed aside before the new one is
+        renamed into place and removed only after, so a failed save leaves it where it was.
+        """
+        staging = f"{directory}.tmp-{os.getpid()}"
+        previous = f"{directory}.old-{os.getpid()}"
+        os.makedirs(staging, exist_ok=True)
+        try:
+            arrays = {
+                'symbols': np.array(self.symbols, dtype=str),
+                'offsets': self.offsets,
+                'ordinal': self.ordinal,
+                'synced': self.synced,
+                'splits': np.asarray(self.splits, dtype=str),
+                **self.columns,
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+            if os.path.exists(directory):
+                os.replace(directory, previous)
+            try:
+                os.replace(staging, directory)
+            except OSError:
+                if os.path.exists(previous):
+                    os.replace(previous, directory)
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def rows(self, symbol: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> slice:
+        """
+        Rows of a symbol between start and end, both inclusive, found by binary search within its rows.
+        """
+        position = self._positions.get(symbol)
+        if position is None:
+            return slice(0, 0)
+        first, last = int(self.offsets[position]), int(self.offsets[position + 1])
+        ordinals = self.ordinal[first:last]
+        if start is not None:
+            first += int(np.searchsorted(ordinals, start.toordinal(), side='left'))
+        if end is not None:
+            last = int(self.offsets[position]) + int(np.searchsorted(ordinals, end.toordinal(), side='right'))
+        return slice(first, max(first, last))
+
+    def synced_range(self, symbol: str) -> Optional[Tuple[datetime.date, datetime.date]]:
+        position = self._positions.get(symbol)
+        if position is None or self.synced[position, 0] > self.synced[position, 1]:     # Only today's rows were fetched
+            return None
+        return from_ordinal(self.synced[position, 0]), from_ordinal(self.synced[position, 1])
+
+    def split_fingerprint(self, symbol: str) -> str:
+        """
+        Split fingerprint the symbol was synced with, empty when it was never synced or is unknown.
+        """
+        position = self._positions.get(symbol)
+        return str(self.splits[position]) if position is not None else ""
+
+    def history(self, symbol: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> pd.DataFrame:
+        """
+        Daily history of a symbol between start and end, both inclusive.
+        Returns:
+            pd.DataFrame: Columns date (datetime64), open, high, low, close, volume, sorted by date
+        """
+        rows = self.rows(symbol, start, end)
+        dates = (self.ordinal[rows].astype(np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+        return pd.DataFrame({'date': dates, **{name: np.asarray(column[rows]) for name, column in self.columns.items()}})
+
+    def histories(self, symbols: Iterable[str], start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Daily history of several symbols, symbols without stored rows in the range are left out.
+        """
+        histories = {}
+        for symbol in symbols:
+            rows = self.rows(symbol, start, end)
+            if rows.stop > rows.start:
+                histories[symbol] = self.history(symbol, start, end)
+        return histories
+
+    def merge(self, histories: Dict[str, pd.DataFrame], synced: Dict[str, Tuple[datetime.date, datetime.date]],
+              splits: Optional[Dict[str, str]] = None, replaced: Iterable[str] = ()) -> "PriceStore":
+        """
+        New store with the fetched histories added. Fetched rows replace stored rows of the same symbol
+        and date, and the synced ranges are widened to cover the fetched ranges. The stored rows and
+        synced range of a replaced symbol are dropped first, its history was fetched again in full.
+        Args:
+            histories (Dict[str, pd.DataFrame]): Fetched history per symbol, with columns date and OHLCV
+            synced (Dict[str, Tuple[datetime.date, datetime.date]]): Date range every symbol was fetched over
+            splits (Optional[Dict[str, str]]): Split fingerprint the symbols were fetched with
+            replaced (Iterable[str]): Symbols whose stored history is replaced by the fetched one
+        """
+        splits, replaced = splits or {}, set(replaced)
+        symbols = sorted(set(self.symbols) | set(synced) | set(histories))
+        codes = {symbol: code for code, symbol in enumerate(symbols)}
+
+        # Stored rows first and fetched rows after, so the fetched ones win the deduplication below
+        stored_code = np.repeat(np.array([codes[symbol] for symbol in self.symbols], dtype=np.int64), np.diff(self.offsets))
+        kept = ~np.isin(stored_code, [codes[symbol] for symbol in replaced if symbol in codes])
+        parts_code = [stored_code[kept]]
+        parts_ordinal = [np.asarray(self.ordinal)[kept]]
+        parts_columns = {name: [np.asarray(column)[kept]] for name, column in self.columns.items()}
+        fetched = [(codes[symbol], history) for symbol, history in histories.items() if len(history)]
+        if fetched:
+            closes = np.concatenate([history['close'].to_numpy(dtype=np.float64, na_value=np.nan) for _, history in fetched])
+            valid = ~np.isnan(closes)     # Days the provider returned without a close
+            parts_code.append(np.repeat([code for code, _ in fetched], [len(history) for _, history in fetched])[valid])
+            parts_ordinal.append(to_ordinals(np.concatenate([history['date'].to_numpy() for _, history in fetched]))[valid])
+            for name, dtype in COLUMN_DTYPES.items():
+                values = np.concatenate([history[name].to_numpy(dtype=np.float64, na_value=np.nan) for _, history in fetched])
+                parts_columns[name].append(np.nan_to_num(values[valid]).astype(dtype))
+
+        code = np.concatenate(parts_code)
+        ordinal = np.concatenate(parts_ordinal).astype(np.int32)
+        order = np.lexsort((np.arange(len(code)), ordinal, code))
+        code, ordinal = code[order], ordinal[order]
+        keep = np.append((code[1:] != code[:-1]) | (ordinal[1:] != ordinal[:-1]), True)     # Last row of every (symbol, date)
+        columns = {name: np.concatenate(parts)[order][keep] for name, parts in parts_columns.items()}
+        code, ordinal = code[keep], ordinal[keep]
+        offsets = np.searchsorted(code, np.arange(len(symbols) + 1), side='left').astype(np.int64)
+
+        ranges = np.empty((len(symbols), 2), dtype=np.int32)
+        ranges[:] = (np.iinfo(np.int32).max, np.iinfo(np.int32).min)
+        ranges[[codes[symbol] for symbol in self.symbols]] = self.synced
+        ranges[[codes[symbol] for symbol in replaced if symbol in codes]] = (np.iinfo(np.int32).max, np.iinfo(np.int32).min)
+        for symbol, (first, last) in synced.items():
+            ranges[codes[symbol]] = (min(ranges[codes[symbol], 0], first.toordinal()), max(ranges[codes[symbol], 1], last.toordinal()))
+        fingerprints = {**dict(zip(self.symbols, self.splits.tolist())), **splits}
+        return PriceStore(symbols, offsets, ordinal, columns, ranges, np.array([fingerprints.get(symbol, "") for symbol in symbols], dtype=str))
+
+    def __len__(self) -> int:
+        return len(self.ordinal)
+
+    def __repr__(self) -> str:
+        return f"PriceStore({len(self.symbols)} symbols, {len(self.ordinal)} rows)"
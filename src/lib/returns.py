@@ -0,0 +1,256 @@
+import hashlib
+import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.lib.trading_calendar import EPOCH_ORDINAL
+from src.lib.valuation import ValuationMatrix, TRADING_DAYS_PER_YEAR
+from src.models.holding import Holding
+from src.models.portfolio import Portfolio
+from src.models.trade_frame import TradeFrame, TRADE_TYPES
+
+DAYS_PER_YEAR = 365.0     # XIRR discounts by calendar days, like the spreadsheet function
+PORTFOLIO_KEY = ""
+NEWTON_GUESS = 0.1
+NEWTON_ITERATIONS = 50
+XIRR_TOLERANCE = 1e-10
+# Rates the bracketing fallback searches between, from a total loss to a millionfold gain per year
+BRACKET = (-0.999999, 1e6)
+BISECTION_ITERATIONS = 100
+SELL, BONUS = TRADE_TYPES.index('sell'), TRADE_TYPES.index('bonus')
+
+
+class CashFlows:
+    """
+    Dated cash flows of many holdings in a compressed sparse row layout: the flows of key i are rows
+    offsets[i] to offsets[i + 1], sorted by day, with at most one flow per day. Money paid in is negative
+    and money taken out, or still invested at the end, positive.
+    Args:
+        keys (List[str]): Symbol of every holding
+        offsets (np.ndarray): int64 row offsets, one more than there are keys
+        ordinals (np.ndarray): int32 day ordinal of every flow
+        amounts (np.ndarray): float64 amount of every flow
+    """
+    __slots__ = ('keys', 'offsets', 'ordinals', 'amounts')
+
+    def __init__(self, keys: List[str], offsets: np.ndarray, ordinals: np.ndarray, amounts: np.ndarray):
+        self.keys = list(keys)
+        self.offsets = offsets
+        self.ordinals = ordinals
+        self.amounts = amounts
+
+    @classmethod
+    def from_rows(cls, keys: List[str], codes: np.ndarray, ordinals: np.ndarray, amounts: np.ndarray) -> "CashFlows":
+        """
+        Sort flows given in any order by key and day, and add up the flows of a key on the same day.
+        """
+        order = np.lexsort((ordinals, codes))
+        codes, ordinals, amounts = codes[order], ordinals[order], amounts[order]
+        starts = np.flatnonzero(np.append(True, (codes[1:] != codes[:-1]) | (ordinals[1:] != ordinals[:-1]))) if len(codes) else np.empty(0, dtype=np.int64)
+        amounts = np.add.reduceat(amounts, starts) if len(starts) else amounts
+        codes, ordinals = codes[starts], ordinals[starts]
+        offsets = np.searchsorted(codes, np.arange(len(keys) + 1), side='left').astype(np.int64)
+        return cls(keys, offsets, ordinals.astype(np.int32), amounts.astype(np.float64))
+
+    def combined(self, key: str = PORTFOLIO_KEY) -> "CashFlows":
+        """
+        The flows of all keys as the flows of a single key.
+        """
+        return CashFlows.from_rows([key], np.zeros(len(self.amounts), dtype=np.int64), self.ordinals, self.amounts)
+
+    def hashes(self) -> List[bytes]:
+        """
+        Digest of the days and amounts of every key, the key of its cached XIRR.
+        """
+        return [
+            hashlib.blake2b(self.ordinals[first:last].tobytes() + self.amounts[first:last].tobytes(), digest_size=16).digest()
+            for first, last in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())
+        ]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self) -> str:
+        return f"CashFlows({len(self.keys)} keys, {len(self.amounts)} flows)"
+
+
+def holding_cash_flows(holdings: List[Holding], tradebook: TradeFrame, today: Optional[datetime.date] = None) -> CashFlows:
+    """
+    Cash flows of every holding: its trades at their trade prices, its dividends, and the market value of
+    the position today as if it were closed at the current price.
+    Args:
+        holdings (List[Holding]): Holdings to get the flows of
+        tradebook (TradeFrame): Split adjusted tradebook the holdings were built from
+        today (Optional[datetime.date]): Day of the final market value, today by default
+    """
+    today = today or datetime.date.today()
+    keys = [holding.symbol for holding in holdings]
+    positions = {symbol: position for position, symbol in enumerate(keys)}
+
+    codes = pd.Index(keys).get_indexer(tradebook.symbol)     # -1 for trades of other symbols
+    rows = np.flatnonzero((codes >= 0) & (tradebook.typ != BONUS))
+    trade_codes = codes[rows].astype(np.int64)
+    trade_ordinals = tradebook.timestamp[rows].astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+    trade_amounts = np.where(tradebook.typ[rows] == SELL, 1.0, -1.0) * tradebook.quantity[rows] * tradebook.price[rows]
+
+    other = [(positions[holding.symbol], ex_date.toordinal(), amount) for holding in holdings for ex_date, amount in holding.dividend_history]
+    other += [(positions[holding.symbol], today.toordinal(), holding.quantity * holding.current_price) for holding in holdings if holding.quantity != 0]
+    other = np.array(other, dtype=np.float64).reshape(-1, 3)
+    return CashFlows.from_rows(
+        keys,
+        np.concatenate([trade_codes, other[:, 0].astype(np.int64)]),
+        np.concatenate([trade_ordinals, other[:, 1].astype(np.int64)]),
+        np.concatenate([trade_amounts.astype(np.float64), other[:, 2]]),
+    )
+
+
+def _scaled_npv(rates: np.ndarray, segment: np.ndarray, years: np.ndarray, amounts: np.ndarray, span: np.ndarray, count: int):
+    """
+    Net present value and its derivative of every segment at its rate, both divided by the same positive
+    factor per segment so the discount factors of long horizons and rates near -100% cannot overflow.
+    Neither the sign of the value nor the Newton step value / derivative depends on that factor.
+    """
+    log_growth = np.log1p(rates)
+    shift = np.maximum(0.0, -span * log_growth)     # Largest exponent of the segment, at year 0 or at its last flow
+    discount = np.exp(-years * log_growth[segment] - shift[segment])
+    npv = np.bincount(segment, weights=amounts * discount, minlength=count)
+    slope = np.bincount(segment, weights=-years * amounts * discount, minlength=count) / (1 + rates)
+    return npv, slope
+
+
+def solve_xirr(flows: CashFlows, guesses: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Annualized internal rate of return of every key, solved for all keys at once.
+    Newton steps run on all unconverged keys together. Keys where Newton leaves the valid range or does
+    not converge are solved by bisection between BRACKET, again for all of them together.
+    Args:
+        flows (CashFlows): The cash flows
+        guesses (Optional[np.ndarray]): Starting rate per key
+    Returns:
+        np.ndarray: Rate per key, NaN for keys without both a positive and a negative flow, or without a
+            rate within BRACKET
+    """
+    count = len(flows)
+    sizes = np.diff(flows.offsets)
+    segment = np.repeat(np.arange(count), sizes)
+    first = np.repeat(flows.ordinals[flows.offsets[:-1][sizes > 0]], sizes[sizes > 0])
+    years = (flows.ordinals - first) / DAYS_PER_YEAR
+    span = np.zeros(count)
+    span[sizes > 0] = years[flows.offsets[1:][sizes > 0] - 1]
+    # Flows of every key relative to its largest one, so the tolerance is the same for large and small holdings
+    scale = np.zeros(count)
+    np.maximum.at(scale, segment, np.abs(flows.amounts))
+    amounts = flows.amounts / np.where(scale > 0, scale, 1.0)[segment]
+
+    has_sign_change = (np.bincount(segment, weights=amounts > 0, minlength=count) > 0) & (np.bincount(segment, weights=amounts < 0, minlength=count) > 0)
+    rates = np.full(count, NEWTON_GUESS) if guesses is None else np.where(np.isfinite(guesses), guesses, NEWTON_GUESS).astype(np.float64)
+    active = has_sign_change.copy()
+    converged = np.zeros(count, dtype=bool)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for _ in range(NEWTON_ITERATIONS):
+            if not active.any():
+                break
+            keys = np.flatnonzero(active)
+            rows = active[segment]
+            local = np.full(count, -1)
+            local[keys] = np.arange(len(keys))
+            npv, slope = _scaled_npv(rates[keys], local[segment[rows]], years[rows], amounts[rows], span[keys], len(keys))
+            step = npv / slope
+            updated = rates[keys] - step
+            valid = np.isfinite(updated) & (updated > BRACKET[0]) & (updated < BRACKET[1])
+            rates[keys] = np.where(valid, updated, rates[keys])
+            done = valid & (np.abs(step) <= XIRR_TOLERANCE * np.maximum(1.0, np.abs(updated)))
+            converged[keys[done]] = True
+            active[keys[~valid | done]] = False
+
+        fallback = np.flatnonzero(has_sign_change & ~converged)
+        if len(fallback):
+            rates[fallback] = _bisect(fallback, segment, years, amounts, span, count)
+    rates[~has_sign_change] = np.nan
+    return rates
+
+
+def _bisect(keys: np.ndarray, segment: np.ndarray, years: np.ndarray, amounts: np.ndarray, span: np.ndarray, count: int) -> np.ndarray:
+    rows = np.isin(segment, keys)
+    local = np.full(count, -1)
+    local[keys] = np.arange(len(keys))
+    segment, years, amounts, span = local[segment[rows]], years[rows], amounts[rows], span[keys]
+
+    low, high = np.full(len(keys), BRACKET[0]), np.full(len(keys), BRACKET[1])
+    low_sign = np.sign(_scaled_npv(low, segment, years, amounts, span, len(keys))[0])
+    bracketed = low_sign != np.sign(_scaled_npv(high, segment, years, amounts, span, len(keys))[0])
+    for _ in range(BISECTION_ITERATIONS):
+        # Bisect the growth factor 1 + rate geometrically, the bracket spans many orders of magnitude
+        middle = np.sqrt((1 + low) * (1 + high)) - 1
+        same = np.sign(_scaled_npv(middle, segment, years, amounts, span, len(keys))[0]) == low_sign
+        low, high = np.where(same, middle, low), np.where(same, high, middle)
+    return np.where(bracketed, (low + high) / 2, np.nan)
+
+
+def xirr_many(flows: CashFlows, cache: Optional[Dict[bytes, float]] = None) -> np.ndarray:
+    """
+    XIRR of every key, solving only the keys whose cash flows are not in the cache.
+    Args:
+        flows (CashFlows): The cash flows
+        cache (Optional[Dict[bytes, float]]): Rates by the hash of their cash flows, updated in place
+    Returns:
+        np.ndarray: Rate per key
+    """
+    if cache is None:
+        return solve_xirr(flows)
+    hashes = flows.hashes()
+    rates = np.array([cache.get(digest, np.nan) for digest in hashes])
+    missing = np.array([digest not in cache for digest in hashes], dtype=bool)
+    if missing.any():
+        keys = np.flatnonzero(missing)
+        offsets = flows.offsets
+        rows = np.concatenate([np.arange(offsets[key], offsets[key + 1]) for key in keys])
+        subset = CashFlows([flows.keys[key] for key in keys], np.append(0, np.cumsum(np.diff(offsets)[keys])), flows.ordinals[rows], flows.amounts[rows])
+        rates[keys] = solve_xirr(subset)
+        cache.update((hashes[key], float(rate)) for key, rate in zip(keys.tolist(), rates[keys].tolist()))
+    return rates
+
+
+def time_weighted_returns(valuation: ValuationMatrix) -> np.ndarray:
+    """
+    Annualized time-weighted return of every symbol of the valuation matrix. The return of a day is the
+    change in market value less the cash put in, over the absolute market value at the previous close,
+    so short positions gain when the price falls. Days after a close with nothing held are skipped.
+    Returns:
+        np.ndarray: Rate per symbol, NaN for symbols never held over a close
+    """
+    value = np.nan_to_num(np.asarray(valuation.value))
+    flow = np.asarray(valuation.flow)
+    held = value[:-1] != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = np.where(held, (value[1:] - flow[1:] - value[:-1]) / np.abs(value[:-1]), 0.0)
+        log_growth = np.log(np.maximum(1 + daily, 0)).sum(axis=0)
+        periods = held.sum(axis=0)
+        return np.where(periods > 0, np.expm1(log_growth * TRADING_DAYS_PER_YEAR / np.maximum(periods, 1)), np.nan)
+
+
+def update_returns(holdings: List[Holding], portfolio: Portfolio, tradebook: TradeFrame, valuation: ValuationMatrix,
+                   cache: Optional[Dict[bytes, float]] = None, today: Optional[datetime.date] = None):
+    """
+    Set the XIRR and time-weighted return of every holding and the XIRR of the portfolio.
+    Args:
+        holdings (List[Holding]): Current and past holdings
+        portfolio (Portfolio): The portfolio of the current holdings
+        tradebook (TradeFrame): Split adjusted tradebook the holdings were built from
+        valuation (ValuationMatrix): Daily valuation of the holdings
+        cache (Optional[Dict[bytes, float]]): XIRR by cash flow hash, kept between refreshes
+        today (Optional[datetime.date]): Day of the final market value, today by default
+    """
+    flows = holding_cash_flows(holdings, tradebook, today)
+    rates = xirr_many(flows, cache)
+    for holding, rate in zip(holdings, rates.tolist()):
+        holding.xirr = rate
+    portfolio.xirr = float(xirr_many(flows.combined(), cache)[0])
+
+    positions = {symbol: position for position, symbol in enumerate(valuation.symbols)}
+    time_weighted = time_weighted_returns(valuation) if len(valuation.ordinals) > 1 else np.full(len(positions), np.nan)
+    for holding in holdings:
+        position = positions.get(holding.symbol)
+        holding.time_weighted_return = float(time_weighted[position]) if position is not None else np.nan
@@ -0,0 +1,212 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.lib.valuation import ValuationMatrix, TRADING_DAYS_PER_YEAR
+
+RISK_WINDOW = TRADING_DAYS_PER_YEAR     # Days of returns the covariance is estimated from
+# Rank-one updates accumulate rounding, so a state is rebuilt from the returns after this many
+REBUILD_AFTER_UPDATES = TRADING_DAYS_PER_YEAR
+
+
+def window_returns(valuation: ValuationMatrix, columns: np.ndarray, first: int, last: int) -> np.ndarray:
+    """
+    Close to close returns of some columns of the valuation on the rows first to last, both included.
+    The return of a row is from the close of the row before it.
+    """
+    price = valuation.price[first - 1:last + 1, columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return price[1:] / price[:-1] - 1
+
+
+def covered_columns(valuation: ValuationMatrix, symbols: Iterable[str], window: int = RISK_WINDOW) -> List[str]:
+    """
+    The symbols with a return on each of the last window days of the valuation, in the order given.
+    """
+    position = {symbol: column for column, symbol in enumerate(valuation.symbols)}
+    symbols = [symbol for symbol in symbols if symbol in position]
+    if len(valuation.ordinals) <= window or not symbols:
+        return []
+    price = valuation.price[-window - 1:, [position[symbol] for symbol in symbols]]
+    return [symbol for symbol, complete in zip(symbols, ~np.isnan(price).any(axis=0)) if complete]
+
+
+class CovarianceState:
+    """
+    Sufficient statistics of the daily returns of a universe of symbols over a window of days, from
+    which the sample covariance and its Ledoit-Wolf shrinkage follow exactly. Adding or removing a day
+    is a rank-one update of the cross products, O(symbols²) instead of O(days * symbols²).
+    Args:
+        count (int): Days in the window
+        total (np.ndarray): Sum of the return vectors
+        cross (np.ndarray): Sum of their outer products
+        weighted (np.ndarray): Sum of the return vectors times their squared norms
+        fourth (float): Sum of their squared norms squared
+        end (int): Row of the valuation of the last day
+        last_returns (np.ndarray): Returns of the last day, to detect a live close replaced by the real one
+        updates (int): Rank-one updates since the statistics were summed from the returns
+    """
+    __slots__ = ('count', 'total', 'cross', 'weighted', 'fourth', 'end', 'last_returns', 'updates')
+
+    def __init__(self, count: int, total: np.ndarray, cross: np.ndarray, weighted: np.ndarray, fourth: float,
+                 end: int, last_returns: np.ndarray, updates: int = 0):
+        self.count = count
+        self.total = total
+        self.cross = cross
+        self.weighted = weighted
+        self.fourth = fourth
+        self.end = end
+        self.last_returns = last_returns
+        self.updates = updates
+
+    @classmethod
+    def from_returns(cls, returns: np.ndarray, end: int) -> "CovarianceState":
+        norms = np.einsum('ij,ij->i', returns, returns)
+        return cls(len(returns), returns.sum(axis=0), returns.T @ returns, norms @ returns, float(norms @ norms), end, returns[-1].copy())
+
+    def add(self, returns: np.ndarray, sign: float = 1.0):
+        """
+        Add the returns of one day to the window, or remove them with a sign of -1.
+        """
+        norm = float(returns @ returns)
+        self.count += int(sign)
+        self.total += sign * returns
+        self.cross += sign * np.outer(returns, returns)
+        self.weighted += sign * norm * returns
+        self.fourth += sign * norm * norm
+        self.updates += 1
+
+    def covariance(self) -> Tuple[np.ndarray, float]:
+        """
+        Ledoit-Wolf estimate of the daily covariance: the sample covariance shrunk towards a multiple of the
+        identity, by the shrinkage that minimizes the expected squared error (Ledoit & Wolf, 2004).
+        Returns:
+            Tuple[np.ndarray, float]: The shrunk covariance and the shrinkage
+        """
+        count, symbols = self.count, len(self.total)
+        mean = self.total / count
+        sample = self.cross / count - np.outer(mean, mean)
+        target = np.trace(sample) / symbols
+        sample_norm = float(np.sum(sample ** 2))
+        dispersion = (sample_norm - symbols * target ** 2) / symbols
+        # Sum of the fourth powers of the norms of the centered returns, expanded around the raw sums
+        mean_norm = float(mean @ mean)
+        centered_fourth = (self.fourth - 4 * float(self.weighted @ mean) + 2 * mean_norm * np.trace(self.cross)
+                           + 4 * float(mean @ self.cross @ mean) - 3 * count * mean_norm ** 2)
+        noise = min(max((centered_fourth / count - sample_norm) / (count * symbols), 0.0), dispersion)
+        shrinkage = noise / dispersion if dispersion > 0 else 0.0
+        covariance = (1 - shrinkage) * sample
+        covariance[np.diag_indices(symbols)] += shrinkage * target
+        return covariance, shrinkage
+
+
+class CovarianceCache:
+    """
+    Covariance states keyed on (universe, window, end date). A request for a later end date of the same
+    universe and window rolls the latest state forward one day at a time, removing the oldest day and
+    adding the newest, instead of summing the whole window again. Only the latest state of every
+    universe and window is kept. Every covariance records in sources whether its state was cached,
+    rolled forward or summed from the returns.
+    """
+
+    def __init__(self):
+        self.states: Dict[Tuple[Tuple[str, ...], int, int], CovarianceState] = {}
+        self.sources: List[str] = []
+
+    def reset_log(self):
+        self.sources = []
+
+    def invalidate(self, symbols: Iterable[str]):
+        """
+        Drop the states of every universe with one of the symbols, whose earlier closes change with a
+        split. New trades and dividends leave the closes as they are.
+        """
+        symbols = set(symbols)
+        for key in [key for key in self.states if symbols & set(key[0])]:
+            del self.states[key]
+
+    def covariance(self, valuation: ValuationMatrix, universe: List[str], window: int = RISK_WINDOW) -> Tuple[np.ndarray, float]:
+        """
+        Ledoit-Wolf covariance of the daily returns of the universe over the last window days of the
+        valuation. Every symbol of the universe needs a return on each of those days.
+        Returns:
+            Tuple[np.ndarray, float]: The shrunk covariance and the shrinkage
+        """
+        universe = tuple(universe)
+        end = len(valuation.ordinals) - 1
+        if not universe:
+            return np.empty((0, 0)), 0.0
+        if end < window:
+            raise ValueError(f"A covariance over {window} days needs {window + 1} closes, the valuation has {end + 1}")
+        position = {symbol: column for column, symbol in enumerate(valuation.symbols)}
+        columns = np.array([position[symbol] for symbol in universe])
+        key = (universe, window, int(valuation.ordinals[end]))
+
+        state, source = self.states.get(key), 'cached'
+        if state is None:
+            state, source = self._roll_forward(valuation, universe, window, columns, end), 'rolled'
+        if state is None:
+            state, source = CovarianceState.from_returns(window_returns(valuation, columns, end - window + 1, end), end), 'summed'
+        self.sources.append(source)
+        # The last close may have been a live price that the day's close has since replaced
+        last_returns = window_returns(valuation, columns, end, end)[0]
+        if not np.array_equal(last_returns, state.last_returns):
+            state.add(state.last_returns, -1.0)
+            state.add(last_returns)
+            state.last_returns = last_returns
+        for old in [old for old in self.states if old[:2] == key[:2] and old != key]:
+            del self.states[old]
+        self.states[key] = state
+        return state.covariance()
+
+    def _roll_forward(self, valuation: ValuationMatrix, universe: Tuple[str, ...], window: int, columns: np.ndarray,
+                      end: int) -> Optional[CovarianceState]:
+        """
+        The latest state of the universe and window moved to the end row, None without one that is
+        cheaper to move than to sum again.
+        """
+        previous = [key for key in self.states if key[:2] == (universe, window)]
+        if not previous:
+            return None
+        key = max(previous, key=lambda key: key[2])
+        state = self.states[key]
+        start = int(np.searchsorted(valuation.ordinals, key[2]))
+        if start >= len(valuation.ordinals) or valuation.ordinals[start] != key[2] or start >= end or end - start >= window:
+            return None
+        if state.updates + 2 * (end - start) > REBUILD_AFTER_UPDATES:
+            return None
+        # The end row of the state may have been a live close, compare it with the stored returns
+        current = window_returns(valuation, columns, start, start)[0]
+        if not np.array_equal(current, state.last_returns):
+            state.add(state.last_returns, -1.0)
+            state.add(current)
+        removed = window_returns(valuation, columns, start - window + 1, end - window)
+        added = window_returns(valuation, columns, start + 1, end)
+        for old_returns, new_returns in zip(removed, added):
+            state.add(old_returns, -1.0)
+            state.add(new_returns)
+        state.end, state.last_returns = end, added[-1].copy()
+        return state
+
+
+def risk_contributions(covariance: np.ndarray, weights: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Volatility of a portfolio and how much each holding adds to it.
+    Args:
+        covariance (np.ndarray): Annualized covariance of the holdings
+        weights (np.ndarray): Weight of every holding
+    Returns:
+        Dict[str, np.ndarray]: volatility, the marginal contribution of every holding (the change of the
+        volatility per unit of its weight), its component contribution (weight times marginal, summing
+        to the volatility), and the diversification ratio (the weighted volatilities of the holdings
+        over the volatility of the portfolio, 1 without any diversification)
+    """
+    volatility = float(np.sqrt(max(weights @ covariance @ weights, 0.0)))
+    marginal = covariance @ weights / volatility if volatility > 0 else np.zeros(len(weights))
+    standalone = np.abs(weights) @ np.sqrt(np.diag(covariance))
+    return {
+        'volatility': volatility,
+        'marginal': marginal,
+        'component': weights * marginal,
+        'diversification_ratio': float(standalone / volatility) if volatility > 0 else 0.0,
+    }
@@ -0,0 +1,227 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.lib.generate_holdings import INDEX_COLUMNS, RISK_FREE_RATE
+from src.lib.trading_calendar import AsOfLookup
+from src.lib.valuation import ValuationMatrix, TRADING_DAYS_PER_YEAR
+
+ROLLING_WINDOWS = (21, 63, 252)     # A month, a quarter and a year of trading days
+PORTFOLIO_COLUMN = 'portfolio'
+RETURN_METRICS = ('volatility', 'sharpe_ratio', 'sortino_ratio', 'drawdown')
+BENCHMARK_METRICS = ('beta', 'tracking_error')
+# Returns are clipped just above a total loss so the log growth stays finite
+MINIMUM_RETURN = -1 + 1e-12
+
+
+def sliding_max(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Maximum of every row and the window - 1 rows before it, along the first axis. The rows are cut into
+    blocks of the window length and the running maximum of every block is taken forwards and backwards,
+    so every window is the larger of one backward and one forward value, the van Herk / Gil-Werman
+    method: O(1) per row like a monotonic deque, but vectorized over the columns. Rows before a full
+    window get the maximum of the rows so far.
+    """
+    rows = len(values)
+    result = np.empty_like(values)
+    if rows == 0:
+        return result
+    window = min(window, rows)
+    padded = np.concatenate([values, np.full(((-rows) % window,) + values.shape[1:], -np.inf)])
+    blocks = padded.reshape((-1, window) + values.shape[1:])
+    forward = np.maximum.accumulate(blocks, axis=1).reshape(padded.shape)
+    backward = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+    result[window - 1:] = np.maximum(backward[:rows - window + 1], forward[window - 1:rows])
+    result[:window - 1] = np.maximum.accumulate(values[:window - 1], axis=0)
+    return result
+
+
+def _prefix(increments: np.ndarray, previous: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Running sums of the increments, continuing from the last row of previous or with a row of zeros before them.
+    """
+    start = previous[-1:] if previous is not None else np.zeros((1,) + increments.shape[1:])
+    return np.concatenate([start, start + np.cumsum(increments, axis=0)])
+
+
+def _increments(valuation: ValuationMatrix, index_data: pd.DataFrame, first: int) -> Dict[str, np.ndarray]:
+    """
+    Per-row terms of every running sum for the rows of the valuation from first on: the count of
+    returns, the returns, their squares, the squared shortfalls below the risk-free rate, the log growth,
+    and for every index its returns, their squares and their products with the returns of every column.
+    Returns missing before the first close count as 0 and are left out of the count.
+    """
+    start = max(first - 1, 0)
+    window = ValuationMatrix(valuation.symbols, valuation.ordinals[start:], *(getattr(valuation, plane)[start:]
+                                                                              for plane in ('quantity', 'price', 'value', 'flow')))
+    returns = np.column_stack([window.symbol_returns(), window.daily_returns()[1:]])
+    if first == 0 and len(window.ordinals):
+        returns = np.concatenate([np.full((1, returns.shape[1]), np.nan), returns])
+    valid = ~np.isnan(returns)
+    returns = np.where(valid, returns, 0.0)
+
+    terms = {
+        'count': valid.astype(np.float64),
+        'return': returns,
+        'square': returns ** 2,
+        'downside': np.minimum(returns - RISK_FREE_RATE / TRADING_DAYS_PER_YEAR, 0) ** 2 * valid,
+        'log_growth': np.log1p(np.maximum(returns, MINIMUM_RETURN)),
+    }
+    indexes = [index for index in INDEX_COLUMNS if index in index_data] if not index_data.empty else []
+    lookup = AsOfLookup.from_frame(index_data, indexes) if indexes else None
+    for index in indexes:
+        closes = lookup.asof(window.ordinals, index)
+        benchmark = closes[1:] / closes[:-1] - 1
+        if first == 0 and len(window.ordinals):
+            benchmark = np.append(np.nan, benchmark)
+        benchmark_valid = ~np.isnan(benchmark)
+        benchmark = np.where(benchmark_valid, benchmark, 0.0)[:, None]
+        terms[f'{index}:count'] = benchmark_valid[:, None].astype(np.float64)
+        terms[f'{index}:return'] = benchmark
+        terms[f'{index}:square'] = benchmark ** 2
+        terms[f'{index}:cross'] = returns * benchmark
+    return terms
+
+
+class RollingAnalytics:
+    """
+    Rolling risk metrics of every holding and of the whole portfolio, over any window of trading days.
+    Every input of the metrics is kept as a running sum over the rows of the valuation, computed in
+    one pass, so the sum over any window is the difference of two rows: every window length costs O(1)
+    per day and column, and new days only append rows to the sums. Holdings use the returns of their
+    closes, the portfolio its time-weighted daily returns.
+    Args:
+        columns (List[str]): Symbols of the valuation followed by PORTFOLIO_COLUMN
+        ordinals (np.ndarray): Day ordinals of the rows of the valuation
+        indexes (List[str]): Benchmark indexes with sums
+        sums (Dict[str, np.ndarray]): Running sums of shape (days + 1, columns), the first row zeros
+    """
+    __slots__ = ('columns', 'ordinals', 'indexes', 'sums')
+
+    def __init__(self, columns: List[str], ordinals: np.ndarray, indexes: List[str], sums: Dict[str, np.ndarray]):
+        self.columns = list(columns)
+        self.ordinals = ordinals
+        self.indexes = list(indexes)
+        self.sums = sums
+
+    @classmethod
+    def from_valuation(cls, valuation: ValuationMatrix, index_data: pd.DataFrame) -> "RollingAnalytics":
+        increments = _increments(valuation, index_data, 0)
+        indexes = [name.split(':')[0] for name in increments if name.endswith(':count')]
+        return cls(valuation.symbols + [PORTFOLIO_COLUMN], np.array(valuation.ordinals), indexes,
+                   {name: _prefix(terms) for name, terms in increments.items()})
+
+    def extend(self, valuation: ValuationMatrix, index_data: pd.DataFrame, changed: Iterable[str] = ()) -> "RollingAnalytics":
+        """
+        Analytics of a valuation that has the days of this one and possibly more. The last known day is
+        computed again, as its close may have been a live price, and the days after it appended. A
+        valuation with other symbols or days, or whose changed symbols rewrote earlier rows, is computed
+        again from scratch.
+        Args:
+            valuation (ValuationMatrix): The valuation, synced since this one
+            index_data (pd.DataFrame): Index history
+            changed (Iterable[str]): Symbols whose trades, splits or dividends changed since this one
+        """
+        first = len(self.ordinals) - 1
+        appendable = (
+            first > 0 and valuation.symbols + [PORTFOLIO_COLUMN] == self.columns and len(valuation.ordinals) > first
+            and np.array_equal(valuation.ordinals[:first + 1], self.ordinals) and not set(changed) & set(self.columns)
+        )
+        if not appendable:
+            return RollingAnalytics.from_valuation(valuation, index_data)
+        increments = _increments(valuation, index_data, first)
+        if sorted(increments) != sorted(self.sums):
+            return RollingAnalytics.from_valuation(valuation, index_data)
+        sums = {name: np.concatenate([self.sums[name][:first], _prefix(terms, self.sums[name][:first + 1])]) for name, terms in increments.items()}
+        return RollingAnalytics(self.columns, np.array(valuation.ordinals), self.indexes, sums)
+
+    def _window_sum(self, name: str, window: int, days: int, cache: Optional[dict]) -> np.ndarray:
+        """
+        Sums over the window ending on each of the last days rows, NaN before a full window.
+        """
+        if cache is not None and (name, window, days) in cache:
+            return cache[name, window, days]
+        prefix = self.sums[name]
+        sums = np.full((days,) + prefix.shape[1:], np.nan)
+        rows = len(prefix) - 1
+        covered = min(days, rows - window + 1)     # Days among the last with a full window
+        if covered > 0:
+            sums[days - covered:] = prefix[rows + 1 - covered:] - prefix[rows + 1 - covered - window:rows + 1 - window]
+        if cache is not None:
+            cache[name, window, days] = sums
+        return sums
+
+    def metric(self, name: str, window: int, index: Optional[str] = None, days: Optional[int] = None, cache: Optional[dict] = None) -> np.ndarray:
+        """
+        A rolling metric of every column on every day, over the window of returns ending that day.
+        Days without a full window of returns, of the column and of the index for benchmark metrics, are NaN.
+        Args:
+            name (str): One of RETURN_METRICS or BENCHMARK_METRICS
+            window (int): Window length in trading days
+            index (str): Benchmark index of BENCHMARK_METRICS
+            days (int): Only the last days, all of them by default
+            cache (dict): Window sums shared between calls on the same window
+        Returns:
+            np.ndarray: float64 array of shape (days, columns)
+        """
+        if window < 2:
+            raise ValueError(f"Rolling windows need at least two returns, got {window}")
+        days = len(self.ordinals) if days is None else min(days, len(self.ordinals))
+        window_sum = lambda sum_name: self._window_sum(sum_name, window, days, cache)
+        full = window_sum('count') == window
+        total, squares = window_sum('return'), window_sum('square')
+        annualizer = np.sqrt(TRADING_DAYS_PER_YEAR)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.maximum((squares - total ** 2 / window) / (window - 1), 0)
+            if name == 'volatility':
+                values = np.sqrt(variance) * annualizer
+            elif name == 'sharpe_ratio':
+                excess = total / window - RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
+                values = np.where(variance > 0, excess / np.sqrt(variance) * annualizer, 0.0)
+            elif name == 'sortino_ratio':
+                excess = total / window - RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
+                downside = np.sqrt(window_sum('downside') / window)
+                values = np.where(downside > 0, excess / downside * annualizer, 0.0)
+            elif name == 'drawdown':
+                growth = self.sums['log_growth'][-(days + window):]
+                values = np.expm1(growth[-days:] - sliding_max(growth, window + 1)[-days:]) if days else growth[:0]
+            elif name in BENCHMARK_METRICS:
+                if index not in self.indexes:
+                    raise KeyError(f"No benchmark sums for index: {index}")
+                full &= window_sum(f'{index}:count') == window
+                benchmark, benchmark_squares, cross = window_sum(f'{index}:return'), window_sum(f'{index}:square'), window_sum(f'{index}:cross')
+                if name == 'beta':
+                    benchmark_variance = benchmark_squares - benchmark ** 2 / window
+                    values = np.where(benchmark_variance > 0, (cross - total * benchmark / window) / benchmark_variance, 0.0)
+                else:
+                    active, active_squares = total - benchmark, squares - 2 * cross + benchmark_squares
+                    values = np.sqrt(np.maximum((active_squares - active ** 2 / window) / (window - 1), 0)) * annualizer
+            else:
+                raise KeyError(f"Unknown rolling metric: {name}")
+        return np.where(full, values, np.nan)
+
+    def latest(self, name: str, window: int, index: Optional[str] = None) -> pd.Series:
+        """
+        A rolling metric of every column on the last day, from the window sums of that day alone.
+        """
+        values = self.metric(name, window, index, days=1)
+        return pd.Series(values[-1] if len(values) else np.nan, index=self.columns, name=f"{name}_{window}")
+
+    def all_metrics(self, windows: Iterable[int] = ROLLING_WINDOWS, days: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Every metric over every window, keyed like volatility_21 and beta_nifty50_252. The window sums
+        are computed once per window and shared between its metrics.
+        """
+        metrics = {}
+        for window in windows:
+            cache = {}
+            for name in RETURN_METRICS:
+                metrics[f"{name}_{window}"] = self.metric(name, window, days=days, cache=cache)
+            for index in self.indexes:
+                for name in BENCHMARK_METRICS:
+                    metrics[f"{name}_{index}_{window}"] = self.metric(name, window, index, days=days, cache=cache)
+        return metrics
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
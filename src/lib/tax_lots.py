@@ -0,0 +1,156 @@
+from collections import deque
+from typing import List, Tuple
+
+import numpy as np
+
+from src.models.lot_frame import LotFrame
+from src.models.trade import TradeType
+from src.models.trade_frame import TradeFrame, TRADE_TYPES
+
+FIFO = 'fifo'
+AVERAGE_COST = 'average'
+COST_METHODS = (FIFO, AVERAGE_COST)
+
+BUY, SELL, BONUS = (TRADE_TYPES.index(typ) for typ in (TradeType.BUY, TradeType.SELL, TradeType.BONUS))
+# Quantities within this fraction of a lot close it completely, so float noise from split ratios leaves no dust lots
+QUANTITY_TOLERANCE = 1e-9
+
+
+class _LotColumns:
+    """
+    Python lists the matching loop appends lots to, turned into a LotFrame once at the end.
+    """
+    __slots__ = LotFrame.COLUMNS
+
+    def __init__(self):
+        for column in LotFrame.COLUMNS:
+            setattr(self, column, [])
+
+    def append(self, symbol, quantity, cost_basis, proceeds, opened, closed, short):
+        self.symbol.append(symbol)
+        self.quantity.append(quantity)
+        self.cost_basis.append(cost_basis)
+        self.proceeds.append(proceeds)
+        self.gain.append(proceeds - cost_basis if closed is not None else 0.0)
+        self.opened.append(opened)
+        self.closed.append(closed if closed is not None else np.iinfo(np.int64).min)     # The int64 value of NaT
+        self.short.append(short)
+
+    def to_frame(self) -> LotFrame:
+        return LotFrame(
+            self.symbol, self.quantity, self.cost_basis, self.proceeds, self.gain,
+            np.array(self.opened, dtype=np.int64).view('datetime64[s]'), np.array(self.closed, dtype=np.int64).view('datetime64[s]'), self.short
+        )
+
+
+def match_symbol_lots(symbol: str, typ: List[int], quantity: List[float], price: List[float], timestamp: List[int],
+                      average_cost: bool, realized: _LotColumns, open_lots: _LotColumns):
+    """
+    Match the trades of one symbol against its open lots.
+    Open lots wait in a deque in the order they were opened, and a closing trade consumes them from the
+    left, so every lot is appended and removed once and a fill costs amortized O(1). Lots store their size
+    in units of the shares held before any split, and a split only multiplies the shares per unit, which
+    carries every split through to the open lots in O(1) while keeping their opening date and cost.
+    With average cost the realized cost basis is the average cost of the whole position, the lots are
+    still consumed first in first out for their holding periods.
+    Args:
+        symbol (str): The symbol
+        typ (List[int]): Trade type codes, split entries are bonus rows as added by adjust_for_splits
+        quantity (List[float]): Traded quantities
+        price (List[float]): Trade prices
+        timestamp (List[int]): Execution times in seconds since the epoch
+        average_cost (bool): Realize the average cost instead of the cost of the matched lots
+        realized (_LotColumns): Closed lot pieces are appended here
+        open_lots (_LotColumns): Lots still open after the last trade are appended here
+    """
+    lots = deque()      # [opened, units, amount], amount is the cost of long lots and the sale proceeds of short lots
+    short = False
+    shares_per_unit = 1.0
+    units_held, amount_held = 0.0, 0.0
+
+    for trade_typ, trade_quantity, trade_price, trade_time in zip(typ, quantity, price, timestamp):
+        if trade_typ == BONUS:
+            shares_held = units_held * shares_per_unit
+            if lots and not short and shares_held > 0:
+                shares_per_unit *= (shares_held + trade_quantity) / shares_held
+            continue
+
+        if not lots or short == (trade_typ == SELL):
+            if not lots:
+                short = trade_typ == SELL
+            lots.append([trade_time, trade_quantity / shares_per_unit, trade_quantity * trade_price])
+            units_held += trade_quantity / shares_per_unit
+            amount_held += trade_quantity * trade_price
+            continue
+
+        remaining = trade_quantity
+        while lots and remaining > QUANTITY_TOLERANCE * trade_quantity:
+            lot = lots[0]
+            lot_shares = lot[1] * shares_per_unit
+            closed_shares = min(remaining, lot_shares)
+            if average_cost:
+                amount = amount_held * closed_shares / (units_held * shares_per_unit)
+            else:
+                amount = lot[2] if closed_shares >= lot_shares * (1 - QUANTITY_TOLERANCE) else lot[2] * closed_shares / lot_shares
+            if closed_shares >= lot_shares * (1 - QUANTITY_TOLERANCE):
+                lots.popleft()
+                units_held -= lot[1]
+            else:
+                lot[1] -= closed_shares / shares_per_unit
+                lot[2] -= amount
+                units_held -= closed_shares / shares_per_unit
+            amount_held -= amount
+            remaining -= closed_shares
+
+            value = closed_shares * trade_price
+            if short:
+                realized.append(symbol, closed_shares, value, amount, lot[0], trade_time, True)
+            else:
+                realized.append(symbol, closed_shares, amount, value, lot[0], trade_time, False)
+
+        if not lots:
+            units_held, amount_held = 0.0, 0.0
+            if remaining > QUANTITY_TOLERANCE * trade_quantity:
+                # The trade closed the whole position and opens one on the other side with the rest
+                short = trade_typ == SELL
+                lots.append([trade_time, remaining / shares_per_unit, remaining * trade_price])
+                units_held, amount_held = remaining / shares_per_unit, remaining * trade_price
+
+    for opened, units, amount in lots:
+        shares = units * shares_per_unit
+        if average_cost:
+            amount = amount_held * units / units_held
+        if short:
+            open_lots.append(symbol, shares, 0.0, amount, opened, None, True)
+        else:
+            open_lots.append(symbol, shares, amount, 0.0, opened, None, False)
+
+
+def match_lots(tradebook: TradeFrame, method: str = FIFO) -> Tuple[LotFrame, LotFrame]:
+    """
+    Tax lots of every symbol in a split adjusted tradebook.
+    Args:
+        tradebook (TradeFrame): Split adjusted tradebook, sorted by timestamp
+        method (str): FIFO realizes the cost of the oldest lots, AVERAGE_COST the average cost of the position
+    Returns:
+        Tuple[LotFrame, LotFrame]: Realized lot pieces and the lots still open, grouped by symbol
+    """
+    if method not in COST_METHODS:
+        raise ValueError(f"Unknown cost method: {method}")
+    realized, open_lots = _LotColumns(), _LotColumns()
+    timestamp = tradebook.timestamp.view(np.int64)
+    quantity = tradebook.quantity.astype(np.float64)
+    for symbol, rows in tradebook.symbol_groups().items():
+        match_symbol_lots(
+            symbol, tradebook.typ[rows].tolist(), quantity[rows].tolist(), tradebook.price[rows].tolist(), timestamp[rows].tolist(),
+            method == AVERAGE_COST, realized, open_lots
+        )
+    return realized.to_frame(), open_lots.to_frame()
+
+
+def replace_symbol_lots(lots: LotFrame, symbols: List[str], replacement: LotFrame) -> LotFrame:
+    """
+    Lots with the rows of some symbols replaced, for rebuilding only the symbols whose trades changed.
+    """
+    return LotFrame.concat([lots.take(~np.isin(lots.symbol, list(symbols))), replacement])
+
@@ -0,0 +1,143 @@
+import datetime
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Dates are handled as int32 day ordinals (datetime.date.toordinal), the encoding TrendSeries stores
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# NSE holidays that fall on the same date every year: Republic Day, Maharashtra Day, Independence Day,
+# Gandhi Jayanti and Christmas. Festival holidays move every year and are taken from the index history.
+FIXED_HOLIDAYS = ((1, 26), (5, 1), (8, 15), (10, 2), (12, 25))
+
+
+def to_ordinals(dates) -> np.ndarray:
+    """
+    Day ordinals of dates given as datetime.date objects, a date Series or a datetime64 array.
+    """
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.integer):
+        return dates.astype(np.int32)
+    days = np.asarray(pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]'))
+    return (days.astype(np.int64) + EPOCH_ORDINAL).astype(np.int32)
+
+
+def from_ordinal(ordinal: int) -> datetime.date:
+    return datetime.date.fromordinal(int(ordinal))
+
+
+def fixed_holidays(first_year: int, last_year: int) -> np.ndarray:
+    """
+    Ordinals of the fixed date NSE holidays from first_year to last_year, sorted.
+    """
+    return np.array(sorted(
+        datetime.date(year, month, day).toordinal()
+        for year in range(first_year, last_year + 1) for month, day in FIXED_HOLIDAYS
+    ), dtype=np.int32)
+
+
+class TradingCalendar:
+    """
+    NSE trading days as a sorted array of int32 day ordinals.
+    Within the range covered by the recorded sessions, usually the index history, a day is a trading
+    day exactly when a session was recorded, so festival holidays and weekend special sessions are
+    known. Outside that range weekdays are trading days unless they are fixed date holidays.
+    Args:
+        sessions (Sequence): Dates with a recorded trading session, in any order
+    """
+    __slots__ = ('sessions',)
+
+    def __init__(self, sessions: Sequence = ()):
+        self.sessions = np.unique(to_ordinals(sessions)) if len(sessions) else np.empty(0, dtype=np.int32)
+
+    @classmethod
+    def from_index_data(cls, index_data: pd.DataFrame) -> "TradingCalendar":
+        return cls(index_data['date']) if not index_data.empty else cls()
+
+    def is_trading_day(self, ordinals: np.ndarray) -> np.ndarray:
+        ordinals = np.atleast_1d(to_ordinals(ordinals))
+        result = self._is_weekday_session(ordinals)
+        if len(self.sessions):
+            recorded = (ordinals >= self.sessions[0]) & (ordinals <= self.sessions[-1])
+            positions = np.searchsorted(self.sessions, ordinals[recorded])
+            result[recorded] = self.sessions[np.minimum(positions, len(self.sessions) - 1)] == ordinals[recorded]
+        return result
+
+    def trading_days_between(self, start: datetime.date, end: datetime.date) -> int:
+        """
+        Number of trading days between start and end, both inclusive.
+        """
+        if end < start:
+            return 0
+        return int(self.is_trading_day(np.arange(start.toordinal(), end.toordinal() + 1, dtype=np.int32)).sum())
+
+    def previous_trading_day(self, date: datetime.date) -> datetime.date:
+        """
+        The latest trading day on or before date, a searchsorted over the sessions when they cover the
+        date. Outside of them at most a weekend and a fixed date holiday lie between two trading days,
+        so the trading day is among the seven days up to the date.
+        """
+        ordinal = date.toordinal()
+        if len(self.sessions) and self.sessions[0] <= ordinal <= self.sessions[-1]:
+            return from_ordinal(self.sessions[np.searchsorted(self.sessions, ordinal, side='right') - 1])
+        week = np.arange(ordinal - 6, ordinal + 1, dtype=np.int32)
+        return from_ordinal(week[self.is_trading_day(week)][-1])
+
+    def _is_weekday_session(self, ordinals: np.ndarray) -> np.ndarray:
+        if not len(ordinals):
+            return np.zeros(0, dtype=bool)
+        first_year, last_year = from_ordinal(ordinals.min()).year, from_ordinal(ordinals.max()).year
+        return ((ordinals + 6) % 7 < 5) & ~np.isin(ordinals, fixed_holidays(first_year, last_year))
+
+
+class AsOfLookup:
+    """
+    Columns of values keyed by trading day, e.g. the index closes, looked up as of any date: the value
+    of the latest row on or before the date. Built once and shared, every lookup is a searchsorted over
+    the sorted int32 day ordinals, so looking up m dates costs O(m log n).
+    Gaps in a column, such as an index that was synced fewer days than the others, are carried
+    forward from the previous row. Dates before the first row have no value and look up as NaN.
+    Args:
+        ordinals (np.ndarray): Sorted, unique int32 day ordinals of the rows
+        values (np.ndarray): float64 array of shape (rows, columns)
+        columns (Iterable[str]): Column names
+    """
+    __slots__ = ('ordinals', 'values', 'columns')
+
+    def __init__(self, ordinals: np.ndarray, values: np.ndarray, columns: Iterable[str]):
+        self.ordinals = ordinals
+        self.values = values
+        self.columns = list(columns)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, columns: Iterable[str], date_column: str = 'date') -> "AsOfLookup":
+        columns = list(columns)
+        if frame.empty:
+            return cls(np.empty(0, dtype=np.int32), np.empty((0, len(columns))), columns)
+        frame = frame.dropna(subset=columns, how='all').drop_duplicates(subset=[date_column], keep='last')
+        ordinals = to_ordinals(frame[date_column])
+        order = np.argsort(ordinals, kind='stable')
+        values = frame[columns].to_numpy(dtype=np.float64)[order]
+        return cls(ordinals[order], pd.DataFrame(values).ffill().to_numpy(), columns)
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    @property
+    def last_ordinal(self) -> Optional[int]:
+        return int(self.ordinals[-1]) if len(self.ordinals) else None
+
+    def positions(self, ordinals: np.ndarray) -> np.ndarray:
+        """
+        Row of the latest date on or before every ordinal, -1 for dates before the first row.
+        """
+        return np.searchsorted(self.ordinals, ordinals, side='right') - 1
+
+    def asof(self, ordinals: np.ndarray, column: Optional[str] = None) -> np.ndarray:
+        """
+        Values as of every ordinal, of shape (len(ordinals), columns), or (len(ordinals),) for a single column.
+        Dates before the first row are NaN.
+        """
+        positions = self.positions(ordinals)
+        rows = np.where((positions >= 0)[:, None], self.values[np.maximum(positions, 0)], np.nan)
+        return rows if column is None else rows[:, self.columns.index(column)]
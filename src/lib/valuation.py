@@ -0,0 +1,336 @@
+import os
+import json
+import shutil
+import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.lib.get_stock_info import get_price_histories
+from src.lib.market_data import MarketDataProvider
+from src.lib.price_store import split_fingerprint, splits_after
+from src.lib.trading_calendar import TradingCalendar, EPOCH_ORDINAL, to_ordinals, from_ordinal
+from src.models.holding import Holding
+from src.models.stock_info import StockInfo
+from src.models.trade_frame import TradeFrame, TRADE_TYPES
+
+VALUATION_DIRECTORY = "metadata/valuation"
+PLANES = ('quantity', 'price', 'value', 'flow')
+TRADING_DAYS_PER_YEAR = 252
+# Closes are fetched from a week before the first day, so a first day without a session still has a price
+PRICE_LOOKBACK = datetime.timedelta(days=7)
+SELL = TRADE_TYPES.index('sell')
+
+
+class ValuationMatrix:
+    """
+    Daily mark-to-market state of all holdings as dense float64 planes of shape (trading days, symbols):
+        quantity: Shares held at the close, in shares of today like the split adjusted closes
+        price: Closing price, carried forward over days without a close and NaN before the first one
+        value: Market value, quantity * price and 0 on days nothing is held
+        flow: Cash put into the symbol that day, buys minus sells at their trade prices
+    The planes are day-major, so every new day appends one row to each plane file on disk.
+    Args:
+        symbols (List[str]): Symbol of every column, sorted
+        ordinals (np.ndarray): Sorted int32 day ordinals of the rows
+        quantity, price, value, flow (np.ndarray): The planes, in memory or memory-mapped
+        splits (Optional[Dict[str, str]]): Split fingerprint of every symbol, the share basis of its quantities and prices
+    """
+    __slots__ = ('symbols', 'ordinals') + PLANES + ('splits',)
+
+    def __init__(self, symbols: List[str], ordinals: np.ndarray, quantity: np.ndarray, price: np.ndarray, value: np.ndarray, flow: np.ndarray,
+                 splits: Optional[Dict[str, str]] = None):
+        self.symbols = list(symbols)
+        self.ordinals = ordinals
+        self.quantity = quantity
+        self.price = price
+        self.value = value
+        self.flow = flow
+        self.splits = splits or {}
+
+    @classmethod
+    def empty(cls) -> "ValuationMatrix":
+        return cls([], np.empty(0, dtype=np.int32), *(np.empty((0, 0)) for _ in PLANES))
+
+    @classmethod
+    def load(cls, directory: str = VALUATION_DIRECTORY) -> Optional["ValuationMatrix"]:
+        """
+        Memory-map a matrix written by save and write_rows, None if there is none.
+        """
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as file:
+            meta = json.load(file)
+        days, symbols = meta["days"], meta["symbols"]
+
+        def read(name, dtype, shape):
+            if not days or not symbols:
+                return np.zeros(shape, dtype=dtype)
+            return np.memmap(os.path.join(directory, name), dtype=dtype, mode='r', shape=shape)
+
+        return cls(
+            symbols, read("ordinals.i32", np.int32, (days,)),
+            *(read(f"{plane}.f64", np.float64, (days, len(symbols))) for plane in PLANES),
+            meta.get("splits")
+        )
+
+    def save(self, directory: str = VALUATION_DIRECTORY):
+        """
+        Write the matrix as one raw file per plane and a meta.json with the shape. The files are written
+        to a temporary directory that replaces the previous matrix, readers never see a partial matrix.
+        The previous matrix is renamed aside before the new one is renamed into place and removed only
+        after, so a failed save leaves it where it was.
+        """
+        staging = f"{directory}.tmp-{os.getpid()}"
+        previous = f"{directory}.old-{os.getpid()}"
+        os.makedirs(staging, exist_ok=True)
+        try:
+            np.ascontiguousarray(self.ordinals, dtype=np.int32).tofile(os.path.join(staging, "ordinals.i32"))
+            for plane in PLANES:
+                np.ascontiguousarray(getattr(self, plane), dtype=np.float64).tofile(os.path.join(staging, f"{plane}.f64"))
+            _write_meta(staging, self.symbols, len(self.ordinals), self.splits)
+            if os.path.exists(directory):
+                os.replace(directory, previous)
+            try:
+                os.replace(staging, directory)
+            except OSError:
+                if os.path.exists(previous):
+                    os.replace(previous, directory)
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def write_rows(self, start: int, rows: "ValuationMatrix", directory: str = VALUATION_DIRECTORY):
+        """
+        Overwrite the stored rows from start on with rows, appending the rows past the current end.
+        The shape in meta.json is updated last, so readers only see the new days once they are complete.
+        """
+        days = len(self.ordinals)
+        overlap = min(days - start, len(rows.ordinals))
+        files = [("ordinals.i32", np.int32, rows.ordinals)] + [(f"{plane}.f64", np.float64, getattr(rows, plane)) for plane in PLANES]
+        for name, dtype, values in files:
+            path = os.path.join(directory, name)
+            values = np.ascontiguousarray(values, dtype=dtype)
+            if overlap:
+                stored = np.memmap(path, dtype=dtype, mode='r+', shape=(days,) + values.shape[1:])
+                stored[start:start + overlap] = values[:overlap]
+                stored.flush()
+                del stored
+            with open(path, "ab") as file:
+                file.write(values[overlap:].tobytes())
+        _write_meta(directory, self.symbols, start + len(rows.ordinals), self.splits)
+
+    def write_columns(self, columns: List[int], quantity: np.ndarray, value: np.ndarray, flow: np.ndarray, directory: str = VALUATION_DIRECTORY,
+                      price: Optional[np.ndarray] = None):
+        """
+        Overwrite the quantity, value and flow of some symbols on every stored day, in place, and their
+        price when given.
+        """
+        planes = (('quantity', quantity), ('value', value), ('flow', flow)) + ((('price', price),) if price is not None else ())
+        for plane, values in planes:
+            stored = np.memmap(os.path.join(directory, f"{plane}.f64"), dtype=np.float64, mode='r+', shape=(len(self.ordinals), len(self.symbols)))
+            stored[:, columns] = values
+            stored.flush()
+            del stored
+
+    @property
+    def dates(self) -> List[datetime.date]:
+        return [from_ordinal(ordinal) for ordinal in self.ordinals.tolist()]
+
+    def portfolio_value(self) -> np.ndarray:
+        """
+        Market value of the whole portfolio at every close. Holdings without any close yet count as 0.
+        """
+        return np.nansum(self.value, axis=1)
+
+    def portfolio_flow(self) -> np.ndarray:
+        return self.flow.sum(axis=1)
+
+    def daily_returns(self) -> np.ndarray:
+        """
+        Time-weighted daily returns of the portfolio: the change in market value less the cash put in
+        that day, over the market value of the previous close. The first day, and days after a close
+        with nothing held, return 0.
+        """
+        value = self.portfolio_value()
+        flow = self.portfolio_flow()
+        returns = np.zeros(len(value))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[1:] = np.where(value[:-1] > 0, (value[1:] - flow[1:]) / value[:-1] - 1, 0.0)
+        return returns
+
+    def symbol_returns(self) -> np.ndarray:
+        """
+        Close to close returns of every symbol, of shape (trading days - 1, symbols), NaN before the first close.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.price[1:] / self.price[:-1] - 1
+
+    def value_curve(self) -> pd.DataFrame:
+        """
+        Portfolio value, cash flow and cumulative time-weighted return per trading day.
+        """
+        return pd.DataFrame({
+            'date': self.dates,
+            'value': self.portfolio_value(),
+            'flow': self.portfolio_flow(),
+            'growth': np.cumprod(1 + self.daily_returns()),
+        })
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __repr__(self) -> str:
+        return f"ValuationMatrix({len(self.ordinals)} days x {len(self.symbols)} symbols)"
+
+
+def _write_meta(directory: str, symbols: List[str], days: int, splits: Dict[str, str]):
+    path = os.path.join(directory, "meta.json")
+    with open(f"{path}.tmp", "w") as file:
+        json.dump({"symbols": list(symbols), "days": days, "splits": splits}, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def trading_days(calendar: TradingCalendar, start: datetime.date, end: datetime.date) -> np.ndarray:
+    """
+    int32 ordinals of the trading days from start to end, both inclusive.
+    """
+    ordinals = np.arange(start.toordinal(), end.toordinal() + 1, dtype=np.int32)
+    return ordinals[calendar.is_trading_day(ordinals)] if len(ordinals) else ordinals
+
+
+def quantity_columns(holdings: Dict[str, Holding], symbols: Iterable[str], ordinals: np.ndarray,
+                     stock_info_store: Optional[Dict[str, StockInfo]] = None) -> np.ndarray:
+    """
+    Quantity held at every close, as of the last trade day on or before it, in shares of today. The
+    quantity trend counts the shares as traded until the bonus shares of a split are added on its
+    date, while the closes are split adjusted, so the shares held before a split are multiplied by
+    the ratios of the splits after the day.
+    """
+    symbols = list(symbols)
+    stock_info_store = stock_info_store or {}
+    days = (ordinals.astype(np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+    quantity = np.zeros((len(ordinals), len(symbols)))
+    for column, symbol in enumerate(symbols):
+        trend = holdings[symbol].quantity_trend
+        positions = np.searchsorted(trend.ordinals, ordinals, side='right') - 1
+        quantity[:, column] = np.where(positions >= 0, trend.values[np.maximum(positions, 0)], 0.0) * splits_after(stock_info_store.get(symbol), days)
+    return quantity
+
+
+def flow_columns(tradebook: TradeFrame, symbols: Iterable[str], ordinals: np.ndarray, after: Optional[int] = None) -> np.ndarray:
+    """
+    Cash put into every symbol per trading day. Trades on days without a session count on the next one.
+    When the days continue stored ones, after is the last stored day and only later trades are counted.
+    """
+    columns = {symbol: column for column, symbol in enumerate(symbols)}
+    flow = np.zeros((len(ordinals), len(columns)))
+    if not len(tradebook) or not len(ordinals):
+        return flow
+    symbol_columns = np.array([columns.get(symbol, -1) for symbol in tradebook.symbol.tolist()], dtype=np.int64)
+    trade_ordinals = tradebook.dates.astype(np.int64) + EPOCH_ORDINAL
+    rows = np.searchsorted(ordinals, trade_ordinals, side='left')
+    amount = np.where(tradebook.typ == SELL, -1.0, 1.0) * tradebook.quantity * tradebook.price
+    keep = (symbol_columns >= 0) & (rows < len(ordinals))
+    if after is not None:
+        keep &= trade_ordinals > after
+    np.add.at(flow, (rows[keep], symbol_columns[keep]), amount[keep])
+    return flow
+
+
+def price_columns(histories: Dict[str, pd.DataFrame], symbols: Iterable[str], ordinals: np.ndarray, previous_close: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Close of every symbol as of every day. Days before the first fetched close take previous_close,
+    the last stored price row, when given.
+    """
+    symbols = list(symbols)
+    price = np.full((len(ordinals), len(symbols)), np.nan)
+    for column, symbol in enumerate(symbols):
+        history = histories.get(symbol)
+        if history is None or history.empty:
+            continue
+        positions = np.searchsorted(to_ordinals(history['date']), ordinals, side='right') - 1
+        price[:, column] = np.where(positions >= 0, history['close'].to_numpy(dtype=np.float64)[np.maximum(positions, 0)], np.nan)
+    if previous_close is not None and len(price):
+        price = pd.DataFrame(np.vstack((previous_close, price))).ffill().to_numpy()[1:]
+    return price
+
+
+def market_value(quantity: np.ndarray, price: np.ndarray) -> np.ndarray:
+    return np.where(quantity != 0, quantity * price, 0.0)
+
+
+def sync_valuation_matrix(holdings: List[Holding], tradebook: TradeFrame, index_data: pd.DataFrame, stock_info_store: Dict[str, StockInfo],
+                          provider: Optional[MarketDataProvider] = None, changed_symbols: Optional[Iterable[str]] = None,
+                          today: Optional[datetime.date] = None, directory: str = VALUATION_DIRECTORY) -> ValuationMatrix:
+    """
+    Bring the stored valuation matrix up to date and return it memory-mapped.
+    The matrix is built from scratch when there is none yet, or when the set of symbols or the first
+    trade day changed. Otherwise the quantity and cash flow columns of changed_symbols are rewritten, and
+    only the days since the last stored one are priced and appended. The last stored day is priced again,
+    its close may have been fetched before the market closed. A symbol whose splits changed since the
+    matrix was written moves to a new share basis, all of its columns are rewritten with its closes
+    fetched again.
+    Args:
+        holdings (List[Holding]): Current and past holdings
+        tradebook (TradeFrame): Split adjusted tradebook the holdings were built from
+        index_data (pd.DataFrame): Index history, its dates are the trading days
+        stock_info_store (Dict[str, StockInfo]): Stock information per symbol, for the Yahoo Finance tickers
+        provider (Optional[MarketDataProvider]): Source of the closing prices
+        changed_symbols (Optional[Iterable[str]]): Symbols whose trades changed since the last sync
+        today (Optional[datetime.date]): Last day to value, today by default
+        directory (str): Directory the matrix is stored in
+    Returns:
+        ValuationMatrix: The matrix, memory-mapped from directory
+    """
+    today = today or datetime.date.today()
+    holdings = {holding.symbol: holding for holding in holdings if len(holding.quantity_trend)}
+    if not holdings:
+        return ValuationMatrix.empty()
+    symbols = sorted(holdings)
+    splits = {symbol: split_fingerprint(stock_info_store.get(symbol)) for symbol in symbols}
+    calendar = TradingCalendar.from_index_data(index_data)
+    first_day = from_ordinal(min(int(holding.quantity_trend.ordinals[0]) for holding in holdings.values()))
+    ordinals = trading_days(calendar, first_day, today)
+
+    matrix = ValuationMatrix.load(directory)
+    if matrix is None or matrix.symbols != symbols or not len(matrix.ordinals) or not len(ordinals) or matrix.ordinals[0] != ordinals[0]:
+        histories = get_price_histories(symbols, stock_info_store, first_day - PRICE_LOOKBACK, today, provider)
+        quantity = quantity_columns(holdings, symbols, ordinals, stock_info_store)
+        price = price_columns(histories, symbols, ordinals)
+        ValuationMatrix(symbols, ordinals, quantity, price, market_value(quantity, price), flow_columns(tradebook, symbols, ordinals), splits).save(directory)
+        print(f"Built valuation matrix of {len(ordinals)} days x {len(symbols)} symbols")
+        return ValuationMatrix.load(directory)
+
+    changed_symbols = set(changed_symbols or ())
+    resplit = [symbol for symbol in symbols if matrix.splits.get(symbol) != splits[symbol]]
+    changed = [symbol for symbol in symbols if symbol in changed_symbols or symbol in resplit]
+    if changed:
+        columns = [symbols.index(symbol) for symbol in changed]
+        quantity = quantity_columns(holdings, changed, matrix.ordinals, stock_info_store)
+        price = np.array(matrix.price[:, columns])
+        if resplit:
+            histories = get_price_histories(resplit, stock_info_store, first_day - PRICE_LOOKBACK, today, provider)
+            price[:, [changed.index(symbol) for symbol in resplit]] = price_columns(histories, resplit, matrix.ordinals)
+            print(f"Repriced {len(resplit)} symbols with new splits")
+        matrix.write_columns(columns, quantity, market_value(quantity, price), flow_columns(tradebook, changed, matrix.ordinals), directory,
+                             price if resplit else None)
+        if resplit:
+            _write_meta(directory, symbols, len(matrix.ordinals), splits)
+        matrix = ValuationMatrix.load(directory)
+
+    start = len(matrix.ordinals) - 1
+    new_ordinals = ordinals[ordinals >= matrix.ordinals[-1]]
+    if not len(new_ordinals):
+        return ValuationMatrix.load(directory)
+    histories = get_price_histories(symbols, stock_info_store, from_ordinal(new_ordinals[0]) - PRICE_LOOKBACK, today, provider)
+    quantity = quantity_columns(holdings, symbols, new_ordinals, stock_info_store)
+    price = price_columns(histories, symbols, new_ordinals, previous_close=matrix.price[start - 1] if start else None)
+    rows = ValuationMatrix(symbols, new_ordinals, quantity, price, market_value(quantity, price),
+                            flow_columns(tradebook, symbols, new_ordinals, after=int(matrix.ordinals[start - 1]) if start else None))
+    matrix.write_rows(start, rows, directory)
+    print(f"Valued {len(new_ordinals)} days of {len(symbols)} symbols")
+    return ValuationMatrix.load(directory)
@@ -1,12 +1,13 @@
+import sys
 from typing import List
-import datetime
 from dataclasses import dataclass, field
 
 from src.models.trade import Trade
 from src.models.stock_info import StockInfo
+from src.models.trend_series import TrendSeries
 
 
-@dataclass
+@dataclass(slots=True)
 class Holding:
     # Current status
     symbol: str = ""
@@ -18,8 +19,8 @@ class Holding:
 
     # Trade history
     trades: List[Trade] = field(default_factory=list)
-    investment_trend: list = field(default_factory=list)
-    quantity_trend: list = field(default_factory=list)
+    investment_trend: TrendSeries = field(default_factory=TrendSeries)
+    quantity_trend: TrendSeries = field(default_factory=TrendSeries)
     realized_profit_history: list = field(default_factory=list)
     dividend_history: list = field(default_factory=list)
 
@@ -28,10 +29,15 @@ class Holding:
     dividend_income: float = 0
 
     # Performance metrics
-    risk_free_return_trend: list = field(default_factory=list)
-    nifty50_return_trend: list = field(default_factory=list)
-    bsesensex_return_trend: list = field(default_factory=list)
-    niftybank_return_trend: list = field(default_factory=list)
+    risk_free_return_trend: TrendSeries = field(default_factory=TrendSeries)
+    nifty50_return_trend: TrendSeries = field(default_factory=TrendSeries)
+    bsesensex_return_trend: TrendSeries = field(default_factory=TrendSeries)
+    niftybank_return_trend: TrendSeries = field(default_factory=TrendSeries)
+    xirr: float = 0                     # Money-weighted annualized return of the cash flows
+    time_weighted_return: float = 0     # Annualized return of the market value, cash flows excluded
     
     # Stock information
-    stock_info: StockInfo = None
\ No newline at end of file
+    stock_info: StockInfo = None
+
+    def __post_init__(self):
+        self.symbol = sys.intern(self.symbol)
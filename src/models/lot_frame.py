@@ -0,0 +1,76 @@
+import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class LotFrame:
+    """
+    Column oriented store of tax lots, either closed pieces of lots with their realized gain or the
+    lots still open. Every column is a NumPy array of the same length.
+    Columns:
+        symbol (object): NSE symbol
+        quantity (float64): Shares in the lot, split adjusted
+        cost_basis (float64): Total cost of the shares, for short lots the cost of buying them back, 0 for open short lots
+        proceeds (float64): Total proceeds of selling the shares, for short lots of the opening sale, 0 for open long lots
+        gain (float64): Realized gain, proceeds less cost basis, 0 for open lots
+        opened (datetime64[s]): Execution time of the trade that opened the lot
+        closed (datetime64[s]): Execution time of the trade that closed the shares, NaT for open lots
+        short (bool): Whether the lot was opened by a sale
+    """
+    COLUMNS = ('symbol', 'quantity', 'cost_basis', 'proceeds', 'gain', 'opened', 'closed', 'short')
+
+    def __init__(self, symbol, quantity, cost_basis, proceeds, gain, opened, closed, short):
+        self.symbol = np.asarray(symbol, dtype=object)
+        self.quantity = np.asarray(quantity, dtype=np.float64)
+        self.cost_basis = np.asarray(cost_basis, dtype=np.float64)
+        self.proceeds = np.asarray(proceeds, dtype=np.float64)
+        self.gain = np.asarray(gain, dtype=np.float64)
+        self.opened = np.asarray(opened, dtype='datetime64[s]')
+        self.closed = np.asarray(closed, dtype='datetime64[s]')
+        self.short = np.asarray(short, dtype=bool)
+
+        lengths = {len(getattr(self, column)) for column in self.COLUMNS}
+        if len(lengths) > 1:
+            raise ValueError(f"LotFrame columns have different lengths: {lengths}")
+
+    @classmethod
+    def empty(cls) -> "LotFrame":
+        return cls(*([] for _ in cls.COLUMNS))
+
+    @classmethod
+    def concat(cls, frames: List["LotFrame"]) -> "LotFrame":
+        frames = [frame for frame in frames if len(frame) > 0]
+        if not frames:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(frame, column) for frame in frames]) for column in cls.COLUMNS))
+
+    def take(self, indices) -> "LotFrame":
+        """
+        Select rows by integer indices, slice or boolean mask.
+        """
+        return LotFrame(*(getattr(self, column)[indices] for column in self.COLUMNS))
+
+    @property
+    def cost_price(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.quantity != 0, self.cost_basis / self.quantity, 0.0)
+
+    def holding_days(self, as_of: Optional[datetime.date] = None) -> np.ndarray:
+        """
+        Calendar days from the day a lot was opened to the day it was closed, or to as_of (today by
+        default) for open lots.
+        """
+        as_of = np.datetime64(as_of or datetime.date.today(), 'D')
+        closed = np.where(np.isnat(self.closed), as_of, self.closed.astype('datetime64[D]'))
+        return (closed - self.opened.astype('datetime64[D]')).astype(np.int64)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame({column: getattr(self, column) for column in self.COLUMNS})
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def __repr__(self) -> str:
+        return f"LotFrame({len(self)} lots, {len(set(self.symbol.tolist()))} symbols)"
@@ -39,9 +39,18 @@ class Portfolio:
     max_drawdown: float = 0 # Maximum drawdown
     annualized_volatility: float = 0 # Annualized volatility of the portfolio
     tracking_error: float = 0 # Tracking error against a benchmark
+    ex_ante_volatility: float = 0 # Annualized volatility from the shrunk covariance of the holdings
+    diversification_ratio: float = 0 # Weighted volatility of the holdings over the volatility of the portfolio
+    risk_contributions: dict[str, dict[str, float]] = field(default_factory=dict) # Marginal and component risk per symbol
+    value_at_risk_1d: float = 0 # Simulated one-day loss not exceeded on 99% of the paths
+    conditional_value_at_risk_1d: float = 0 # Average one-day loss beyond the value at risk
+    value_at_risk_10d: float = 0 # Simulated ten-day loss not exceeded on 99% of the paths
+    conditional_value_at_risk_10d: float = 0 # Average ten-day loss beyond the value at risk
+    terminal_value_percentiles: dict[int, dict[float, float]] = field(default_factory=dict) # Percentiles of the simulated value per horizon
 
     # Performance Metrics ========================================================
     annualized_return: float = 0 # Annualized return of the portfolio
+    xirr: float = 0 # Money-weighted annualized return of all cash flows
     information_ratio: float = 0 # Information ratio against a benchmark
     turnover_ratio: float = 0 # Portfolio turnover ratio
 
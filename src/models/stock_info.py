@@ -1,6 +1,6 @@
 import datetime
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Optional
 
 @dataclass
 class StockSplit:
@@ -78,3 +78,6 @@ class StockInfo:
     # Corporate Actions ==========================================================
     stock_splits: List[StockSplit] = field(default_factory=list)
     dividends: List[Dividend] = field(default_factory=list)
+
+    # Bookkeeping ================================================================
+    updated_at: Optional[datetime.datetime] = None     # When the data was fetched, set by the database
@@ -1,11 +1,22 @@
+import sys
 import datetime
+from enum import StrEnum
 from dataclasses import dataclass
 
-@dataclass
+class TradeType(StrEnum):
+    BUY = 'buy'
+    SELL = 'sell'
+    BONUS = 'bonus'
+
+@dataclass(slots=True)
 class Trade:
     symbol: str
     quantity: int
     price: float
-    typ: str
+    typ: TradeType      # Compares equal to the plain strings 'buy', 'sell' and 'bonus'
     timestamp: datetime.datetime
-    remarks: str = ""
\ No newline at end of file
+    remarks: str = ""
+
+    def __post_init__(self):
+        self.symbol = sys.intern(self.symbol)
+        self.typ = TradeType(self.typ)
@@ -0,0 +1,260 @@
+import datetime
+import hashlib
+import sys
+import os
+import shutil
+from typing import Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+from src.models.trade import Trade, TradeType
+
+TRADE_TYPES = tuple(TradeType)     # Position in the tuple is the code stored in TradeFrame.typ
+
+
+def intern_symbols(symbols) -> np.ndarray:
+    """
+    Object array of symbols where every occurrence of a symbol refers to one interned string.
+    """
+    codes, uniques = pd.factorize(np.asarray(symbols, dtype=object))
+    # A trailing empty string catches the -1 code pandas gives to missing symbols
+    return np.array([sys.intern(str(symbol)) for symbol in uniques] + [""], dtype=object)[codes]
+
+def encode_trade_types(types: Iterable[str]) -> np.ndarray:
+    """
+    Encode trade type strings into the int8 codes used by TradeFrame.
+    Args:
+        types (Iterable[str]): Trade types, each one of TRADE_TYPES
+    Returns:
+        np.ndarray: int8 array of trade type codes
+    """
+    types = np.asarray(types, dtype=object)
+    codes = np.full(len(types), -1, dtype=np.int8)
+    for code, name in enumerate(TRADE_TYPES):
+        codes[types == name] = code
+    if (codes < 0).any():
+        unknown = sorted(set(types[codes < 0].tolist()))
+        raise ValueError(f"Unknown trade types: {unknown}")
+    return codes
+
+
+class TradeFrame:
+    """
+    Array-backed, column oriented store of trades. Every column is a NumPy array of the same length,
+    and Trade objects are only built when a consumer indexes or iterates the frame.
+    Columns:
+        symbol (object): NSE symbol
+        quantity (int64/float64): Traded quantity, always positive
+        price (float64): Trade price
+        typ (int8): Index into TRADE_TYPES
+        timestamp (datetime64[s]): Execution time
+        remarks (object): Free text remarks
+    """
+    COLUMNS = ('symbol', 'quantity', 'price', 'typ', 'timestamp', 'remarks')
+
+    def __init__(self, symbol, quantity, price, typ, timestamp, remarks=None):
+        self.symbol = np.asarray(symbol, dtype=object)
+        self.quantity = np.asarray(quantity)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.typ = np.asarray(typ, dtype=np.int8)
+        self.timestamp = np.asarray(timestamp, dtype='datetime64[s]')
+        self.remarks = np.full(len(self.symbol), "", dtype=object) if remarks is None else np.asarray(remarks, dtype=object)
+
+        lengths = {len(getattr(self, column)) for column in self.COLUMNS}
+        if len(lengths) > 1:
+            raise ValueError(f"TradeFrame columns have different lengths: {lengths}")
+
+    @classmethod
+    def empty(cls) -> "TradeFrame":
+        return cls([], np.array([], dtype=np.int64), [], [], [])
+
+    @classmethod
+    def from_trades(cls, trades: Iterable[Trade]) -> "TradeFrame":
+        """
+        Build a TradeFrame from Trade objects.
+        Args:
+            trades (Iterable[Trade]): Trades to store
+        Returns:
+            TradeFrame: Frame holding the same trades in the same order
+        """
+        trades = list(trades)
+        if not trades:
+            return cls.empty()
+        return cls(
+            symbol = [trade.symbol for trade in trades],
+            quantity = [trade.quantity for trade in trades],
+            price = [trade.price for trade in trades],
+            typ = encode_trade_types([trade.typ for trade in trades]),
+            timestamp = [trade.timestamp for trade in trades],
+            remarks = [trade.remarks for trade in trades]
+        )
+
+    @classmethod
+    def concat(cls, frames: List["TradeFrame"]) -> "TradeFrame":
+        """
+        Concatenate several frames, keeping their order.
+        """
+        frames = [frame for frame in frames if len(frame) > 0]
+        if not frames:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(frame, column) for frame in frames]) for column in cls.COLUMNS))
+
+    @classmethod
+    def merge(cls, frames: List["TradeFrame"]) -> "TradeFrame":
+        """
+        K-way merge of frames that are each sorted by timestamp. Frames are merged pairwise in a
+        balanced tree, every pairwise merge places rows with searchsorted instead of re-sorting, so the
+        merge costs O(n log k). On equal timestamps rows of earlier frames come first, which matches a
+        stable sort of the concatenated frames.
+        Args:
+            frames (List[TradeFrame]): Frames sorted by timestamp
+        Returns:
+            TradeFrame: All rows sorted by timestamp
+        """
+        frames = [frame for frame in frames if len(frame) > 0]
+        if not frames:
+            return cls.empty()
+        while len(frames) > 1:
+            frames = [cls._merge_two(*frames[i:i + 2]) if i + 1 < len(frames) else frames[i] for i in range(0, len(frames), 2)]
+        return frames[0]
+
+    @classmethod
+    def _merge_two(cls, left: "TradeFrame", right: "TradeFrame") -> "TradeFrame":
+        left_positions = np.searchsorted(right.timestamp, left.timestamp, side='left') + np.arange(len(left))
+        right_positions = np.searchsorted(left.timestamp, right.timestamp, side='right') + np.arange(len(right))
+        order = np.empty(len(left) + len(right), dtype=np.int64)
+        order[left_positions] = np.arange(len(left))
+        order[right_positions] = np.arange(len(left), len(left) + len(right))
+        return cls.concat([left, right]).take(order)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "TradeFrame":
+        """
+        Load a frame written by TradeFrame.save. Numeric columns are memory-mapped, so loading only
+        touches the pages that are actually read.
+        Args:
+            directory (str): Directory the frame was saved to
+            mmap (bool): Memory-map the numeric columns instead of reading them into memory
+        Returns:
+            TradeFrame: The stored frame
+        """
+        def read(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None, allow_pickle=False)
+
+        return cls(
+            symbol = intern_symbols(read('symbol_values'))[read('symbol_codes')],
+            quantity = read('quantity'),
+            price = read('price'),
+            typ = read('typ'),
+            timestamp = read('timestamp'),
+            remarks = read('remarks_values').astype(object)[read('remarks_codes')]
+        )
+
+    def save(self, directory: str):
+        """
+        Write the frame as one .npy file per column. String columns are dictionary encoded into integer
+        codes plus a fixed width unicode table so no column needs pickling. The files are written to a
+        temporary directory that is renamed into place, readers never see a partially written frame.
+        Args:
+            directory (str): Directory to write the frame to, must not exist yet
+        """
+        staging = f"{directory}.tmp-{os.getpid()}"
+        os.makedirs(staging, exist_ok=True)
+        try:
+            columns = {
+                'quantity': self.quantity,
+                'price': self.price,
+                'typ': self.typ,
+                'timestamp': self.timestamp,
+            }
+            for name in ('symbol', 'remarks'):
+                values, codes = np.unique(getattr(self, name).astype(str), return_inverse=True)
+                columns[f"{name}_values"] = values
+                columns[f"{name}_codes"] = codes.astype(np.int32)
+            for name, column in columns.items():
+                np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(column), allow_pickle=False)
+            os.replace(staging, directory)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def content_hash(self) -> str:
+        """
+        SHA-256 over the contents of every column, independent of how the frame was built.
+        """
+        digest = hashlib.sha256()
+        for column in self.COLUMNS:
+            values = getattr(self, column)
+            if values.dtype == object:
+                digest.update("\x1f".join(map(str, values.tolist())).encode())
+            else:
+                digest.update(str(values.dtype).encode())
+                digest.update(np.ascontiguousarray(values).tobytes())
+            digest.update(b"\x1e")
+        return digest.hexdigest()
+
+    def take(self, indices) -> "TradeFrame":
+        """
+        Select rows by integer indices, slice or boolean mask.
+        """
+        return TradeFrame(*(getattr(self, column)[indices] for column in self.COLUMNS))
+
+    def sort_by_timestamp(self) -> "TradeFrame":
+        """
+        Stable sort on the execution time, trades with equal timestamps keep their relative order.
+        """
+        return self.take(np.argsort(self.timestamp, kind='stable'))
+
+    def unique_symbols(self) -> List[str]:
+        return sorted(set(self.symbol.tolist()))
+
+    def symbol_groups(self) -> Dict[str, np.ndarray]:
+        """
+        Row indices of every symbol, in the order the rows appear in the frame.
+        Returns:
+            Dict[str, np.ndarray]: Mapping of symbol to an int64 array of row indices
+        """
+        if len(self) == 0:
+            return {}
+        codes, symbols = pd.factorize(self.symbol, sort=True)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(symbols) + 1))
+        return {symbol: order[bounds[i]:bounds[i + 1]] for i, symbol in enumerate(symbols.tolist())}
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.timestamp.astype('datetime64[D]')
+
+    def trade(self, index: int) -> Trade:
+        """
+        Materialize a single row as a Trade object.
+        """
+        return Trade(
+            symbol = self.symbol[index],
+            quantity = self.quantity[index].item(),
+            price = self.price[index].item(),
+            typ = TRADE_TYPES[self.typ[index]],
+            timestamp = self.timestamp[index].astype(datetime.datetime),
+            remarks = self.remarks[index]
+        )
+
+    def to_trades(self) -> List[Trade]:
+        return list(self)
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def __iter__(self) -> Iterator[Trade]:
+        # Convert whole columns to Python objects once instead of boxing one NumPy scalar at a time
+        columns = zip(self.symbol.tolist(), self.quantity.tolist(), self.price.tolist(), self.typ.tolist(),
+                      self.timestamp.astype(object).tolist(), self.remarks.tolist())
+        for symbol, quantity, price, typ, timestamp, remarks in columns:
+            yield Trade(symbol = symbol, quantity = quantity, price = price, typ = TRADE_TYPES[typ], timestamp = timestamp, remarks = remarks)
+
+    def __getitem__(self, key) -> Union[Trade, "TradeFrame"]:
+        if isinstance(key, (int, np.integer)):
+            return self.trade(range(len(self))[key])
+        return self.take(key)
+
+    def __repr__(self) -> str:
+        return f"TradeFrame({len(self)} trades, {len(set(self.symbol.tolist()))} symbols)"
@@ -0,0 +1,78 @@
+import datetime
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+
+class TrendSeries(Sequence):
+    """
+    Compact (date, value) series backed by two typed arrays: int32 date ordinals and float64 values.
+    Appending is amortized O(1) and a point costs 12 bytes instead of a two-element list holding a
+    date and a float object.
+    It behaves like the list of [date, value] pairs it replaces: indexing returns a (date, value)
+    tuple, iteration yields (date, value) tuples, and points are replaced with series[i] = (date, value).
+    """
+    __slots__ = ('_ordinals', '_values')
+
+    def __init__(self, points: Iterable[Tuple[datetime.date, float]] = ()):
+        self._ordinals = array('i')
+        self._values = array('d')
+        for point in points:
+            self.append(point)
+
+    @classmethod
+    def from_arrays(cls, ordinals: np.ndarray, values: np.ndarray) -> "TrendSeries":
+        series = cls()
+        series._ordinals.frombytes(np.ascontiguousarray(ordinals, dtype=np.int32).tobytes())
+        series._values.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        return series
+
+    @property
+    def ordinals(self) -> np.ndarray:
+        """Copy of the date ordinals (datetime.date.toordinal) as an int32 array."""
+        return np.frombuffer(self._ordinals, dtype=np.int32).copy()
+
+    @property
+    def values(self) -> np.ndarray:
+        """Copy of the values as a float64 array."""
+        return np.frombuffer(self._values, dtype=np.float64).copy()
+
+    def append(self, point: Tuple[datetime.date, float]):
+        date, value = point
+        self._ordinals.append(date.toordinal())
+        self._values.append(value)
+
+    def extend(self, points: Iterable[Tuple[datetime.date, float]]):
+        for point in points:
+            self.append(point)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            series = TrendSeries()
+            series._ordinals = self._ordinals[index]
+            series._values = self._values[index]
+            return series
+        return datetime.date.fromordinal(self._ordinals[index]), self._values[index]
+
+    def __setitem__(self, index: int, point: Tuple[datetime.date, float]):
+        date, value = point
+        self._ordinals[index] = date.toordinal()
+        self._values[index] = value
+
+    def __iter__(self) -> Iterator[Tuple[datetime.date, float]]:
+        fromordinal = datetime.date.fromordinal
+        for ordinal, value in zip(self._ordinals, self._values):
+            yield fromordinal(ordinal), value
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TrendSeries):
+            return self._ordinals == other._ordinals and self._values == other._values
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TrendSeries({[(date.isoformat(), value) for date, value in self]})"
@@ -1,3 +1,4 @@
+import math
 from typing import List
 from PyQt5.QtWidgets import QWidget, QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QLabel, QSplitter, QFormLayout, QTextEdit, QFrame, QGroupBox, QGridLayout, QHeaderView, QStyledItemDelegate, QTabWidget, QScrollArea
 from PyQt5.QtCore import Qt
@@ -55,9 +56,9 @@ class HoldingsWidget(QWidget):
 
         # Current Holdings Table
         self.current_holdings_table = QTableWidget()
-        self.current_holdings_table.setColumnCount(5)  # Updated to 5 columns
+        self.current_holdings_table.setColumnCount(6)
         self.current_holdings_table.setHorizontalHeaderLabels([
-            "Symbol", "Quantity", "Price Average", "Invested Value", "Unrealized Profit"
+            "Symbol", "Quantity", "Price Average", "Invested Value", "Unrealized Profit", "XIRR %"
         ])
         self.current_holdings_table.cellClicked.connect(lambda row, col: self.display_details(row, col, "current"))
         self.current_holdings_table.setSortingEnabled(True)
@@ -415,6 +416,12 @@ class HoldingsWidget(QWidget):
                 unrealized_profit_item.setForeground(QBrush(color))
                 table.setItem(row, 4, unrealized_profit_item)
 
+                # XIRR in percent, left empty when the cash flows have no rate
+                xirr_item = QTableWidgetItem()
+                if not math.isnan(holding.xirr):
+                    xirr_item.setData(Qt.DisplayRole, round(holding.xirr * 100, 2))
+                table.setItem(row, 5, xirr_item)
+
             elif table_type == "past":
                 # Populate Past Holdings Table
                 item = QTableWidgetItem(holding.symbol)
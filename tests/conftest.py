@@ -0,0 +1,11 @@
+"""
+The tests run in a temporary working directory: importing src.database migrates metadata/trading_agent.db
+relative to it, and the caches of the library are written under metadata/ as well.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="tests-"))
+os.makedirs("metadata")
@@ -0,0 +1,60 @@
+"""
+Cross-check of the vectorized split adjustment against the previous trade by trade walk, on random
+tradebooks with random splits, half of which fall on days with trades, and on the split date edge cases.
+"""
+import datetime
+
+import pytest
+
+from benchmarks import legacy
+from benchmarks.synthetic import random_tradebook, split_store_on_trade_days, stock_info_store
+from src.lib.get_tradebook import adjust_for_splits
+from src.models.stock_info import StockSplit
+from src.models.trade import Trade
+from src.models.trade_frame import TradeFrame
+
+SPLIT_DATE = datetime.date(2020, 6, 15)
+
+
+def as_rows(trades):
+    return [(t.symbol, t.quantity, t.price, t.typ, t.timestamp, t.remarks) for t in trades]
+
+
+def at(day: datetime.date, hour: int = 0) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time(hour))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_trade_by_trade_walk(seed):
+    tradebook = random_tradebook(2000, symbols=20, seed=seed)
+    store = split_store_on_trade_days(tradebook, seed)
+    expected = as_rows(legacy.generate_adjusted_tradebook(tradebook.to_trades(), store))
+    assert as_rows(adjust_for_splits(tradebook, store)) == expected
+
+
+def test_split_date_edge_cases():
+    day_before, day_after = SPLIT_DATE - datetime.timedelta(days=1), SPLIT_DATE + datetime.timedelta(days=1)
+    trades = [
+        # A midnight manual trade on the split date counts before the split, a fill later that day after it
+        Trade("MIDNIGHT", 10, 100.0, 'buy', at(SPLIT_DATE)),
+        Trade("MIDNIGHT", 5, 50.0, 'buy', at(SPLIT_DATE, 10)),
+        # A short position gets no bonus shares
+        Trade("SHORT", 10, 100.0, 'sell', at(day_before, 10)),
+        # A position closed before the split, then two splits on consecutive days
+        Trade("CLOSED", 10, 100.0, 'buy', at(day_before, 9)),
+        Trade("CLOSED", 10, 110.0, 'sell', at(day_before, 14)),
+        Trade("CLOSED", 4, 60.0, 'buy', at(SPLIT_DATE, 11)),
+        # Splits before the first trade leave the tradebook as it is
+        Trade("LATE", 7, 10.0, 'buy', at(day_after, 10)),
+    ]
+    trades.sort(key=lambda trade: trade.timestamp)
+    store = stock_info_store(["MIDNIGHT", "SHORT", "CLOSED", "LATE"], splits_per_symbol=0)
+    store["MIDNIGHT"].stock_splits.append(StockSplit(split_date=SPLIT_DATE, ratio=2.0))
+    store["SHORT"].stock_splits.append(StockSplit(split_date=SPLIT_DATE, ratio=2.0))
+    store["CLOSED"].stock_splits += [StockSplit(split_date=SPLIT_DATE, ratio=2.0), StockSplit(split_date=day_after, ratio=3.0)]
+    store["LATE"].stock_splits.append(StockSplit(split_date=day_before, ratio=5.0))
+
+    adjusted = adjust_for_splits(TradeFrame.from_trades(trades), store)
+    assert as_rows(adjusted.to_trades()) == as_rows(legacy.generate_adjusted_tradebook(trades, store))
+    bonuses = [(trade.symbol, trade.quantity, trade.timestamp) for trade in adjusted.to_trades() if trade.typ == 'bonus']
+    assert bonuses == [("MIDNIGHT", 10, at(SPLIT_DATE)), ("CLOSED", 8, at(day_after))]
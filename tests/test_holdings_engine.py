@@ -0,0 +1,32 @@
+"""
+Cross-check of the vectorized holdings engine against the trade by trade loop. Every seed builds a
+random split adjusted tradebook with long and short positions, and both engines must produce equal
+Holding objects, compared field by field with exact float equality.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_holdings_engine import assert_same_holdings
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.generate_holdings import generate_holdings_from_tradebook
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized
+
+
+@pytest.fixture(scope="module")
+def index_data():
+    return random_index_data(3000, np.random.default_rng(0))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_trade_by_trade_loop(seed, index_data):
+    tradebook = random_tradebook(3000, symbols=25, seed=seed)
+    symbols = list(tradebook.unique_symbols())
+    store = stock_info_store(symbols[:-3], splits_per_symbol=1.0, seed=seed)     # Some symbols without stock info
+    adjusted = adjust_for_splits(tradebook, store)
+    assert_same_holdings(
+        generate_holdings_from_tradebook(symbols, adjusted, index_data, store),
+        generate_holdings_vectorized(symbols, adjusted, index_data, store),
+        seed
+    )
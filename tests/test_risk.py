@@ -0,0 +1,80 @@
+"""
+The covariance cache across a newly found split. Until the split is recorded the stored closes drop by
+its ratio on the split date, once it is recorded the closes are fetched again split adjusted, so the
+returns of the window change and the cached covariance of every universe with the symbol must go.
+"""
+import datetime
+import os
+
+import numpy as np
+
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized
+from src.lib.incremental import changed_symbols, split_fingerprints
+from src.lib.market_data import FakeProvider
+from src.lib.risk import CovarianceCache, covered_columns
+from src.lib.valuation import sync_valuation_matrix
+from src.models.stock_info import StockSplit
+
+TODAY = datetime.date(2020, 12, 31)
+SPLIT_DATE = datetime.date(2020, 6, 15)
+RATIO = 2.0
+
+
+class SplitProvider(FakeProvider):
+    """
+    Fake provider whose symbols in splits went through a split: the price falls by the ratio on the
+    split date, and once adjusted is set the earlier closes are divided by it as well.
+    """
+    def __init__(self):
+        super().__init__()
+        self.splits = {}
+        self.adjusted = False
+
+    def get_history(self, ticker, start=None, end=None, period=None):
+        history = super().get_history(ticker, start, end, period)
+        if ticker in self.splits:
+            split_date, ratio = self.splits[ticker]
+            rows = history['date'] >= split_date if not self.adjusted else slice(None)
+            for column in ('open', 'high', 'low', 'close'):
+                history.loc[rows, column] /= ratio
+        return history
+
+
+def test_new_split_changes_covariance(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # The price history is kept under metadata/ of the working directory
+    os.makedirs("metadata")
+    index_data = random_index_data(3000, np.random.default_rng(0))
+    tradebook = random_tradebook(400, symbols=4, seed=3)
+    symbols = list(tradebook.unique_symbols())
+    store = stock_info_store(symbols, splits_per_symbol=0)
+    provider = SplitProvider()
+    provider.splits[f"{symbols[0]}.NS"] = (SPLIT_DATE, RATIO)
+
+    def sync():
+        adjusted = adjust_for_splits(tradebook, store)
+        holdings = generate_holdings_vectorized(symbols, adjusted, index_data, store)
+        return sync_valuation_matrix(holdings, adjusted, index_data, store, provider, today=TODAY, directory=str(tmp_path / "valuation"))
+
+    cache = CovarianceCache()
+    valuation = sync()
+    universe = covered_columns(valuation, symbols)
+    assert symbols[0] in universe
+    before, _ = cache.covariance(valuation, universe)
+    before = before.copy()
+    splits = split_fingerprints(store)
+
+    store[symbols[0]].stock_splits.append(StockSplit(split_date=SPLIT_DATE, ratio=RATIO))
+    provider.adjusted = True
+    valuation = sync()
+    cache.invalidate(changed_symbols(splits, split_fingerprints(store)))
+    cache.reset_log()
+    after, _ = cache.covariance(valuation, universe)
+    assert cache.sources == ['summed']
+    assert not np.allclose(after, before)
+    assert np.allclose(after, CovarianceCache().covariance(valuation, universe)[0])
+    # The split day no longer shows a loss of half the price in the variance of the symbol
+    column = universe.index(symbols[0])
+    assert after[column, column] < before[column, column]
@@ -0,0 +1,99 @@
+"""
+The valuation matrix across a stock split. Yahoo Finance quotes every close in shares of today, so up
+to the split day a split inside the window must leave the market value and the daily returns as they
+were without it, and a split found after the matrix was written must reprice the columns of its symbol.
+Trades after the split are in the new shares, worth a fraction of the old ones, so later days differ.
+"""
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_index_returns import random_index_data
+from benchmarks.bench_valuation import assert_same_matrix
+from benchmarks.synthetic import random_tradebook, stock_info_store
+from src.lib.get_tradebook import adjust_for_splits
+from src.lib.holdings_engine import generate_holdings_vectorized
+from src.lib.market_data import FakeProvider
+from src.lib.valuation import sync_valuation_matrix
+from src.models.stock_info import StockSplit
+
+TODAY = datetime.date(2020, 12, 31)
+SPLIT_DATE = datetime.date(2018, 6, 15)
+RATIO = 5.0
+
+
+class SplitProvider(FakeProvider):
+    """
+    Fake provider whose symbols in splits went through a split: the price fell by the ratio on the
+    split date, and the earlier closes are divided by it as Yahoo Finance adjusts them.
+    """
+    def __init__(self):
+        super().__init__()
+        self.splits = {}
+
+    def get_history(self, ticker, start=None, end=None, period=None):
+        history = super().get_history(ticker, start, end, period)
+        if ticker in self.splits:
+            for column in ('open', 'high', 'low', 'close'):
+                history[column] /= self.splits[ticker]
+        return history
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # The price history is kept under metadata/ of the working directory
+    os.makedirs("metadata")
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def index_data():
+    return random_index_data(3000, np.random.default_rng(0))
+
+
+def sync(tradebook, store, index_data, provider, directory):
+    symbols = list(tradebook.unique_symbols())
+    adjusted = adjust_for_splits(tradebook, store)
+    holdings = generate_holdings_vectorized(symbols, adjusted, index_data, store)
+    return sync_valuation_matrix(holdings, adjusted, index_data, store, provider, today=TODAY, directory=str(directory))
+
+
+def test_split_inside_window_does_not_move_value(workdir, index_data):
+    tradebook = random_tradebook(400, symbols=3, seed=1)
+    symbol = tradebook.unique_symbols()[0]
+    baseline = sync(tradebook, stock_info_store(tradebook.unique_symbols(), splits_per_symbol=0), index_data, FakeProvider(), workdir / "baseline")
+
+    store = stock_info_store(tradebook.unique_symbols(), splits_per_symbol=0)
+    store[symbol].stock_splits.append(StockSplit(split_date=SPLIT_DATE, ratio=RATIO))
+    provider = SplitProvider()
+    provider.splits[f"{symbol}.NS"] = RATIO
+    os.rename("metadata/price_history", "metadata/price_history.baseline")
+    split = sync(tradebook, store, index_data, provider, workdir / "split")
+
+    column = split.symbols.index(symbol)
+    day = int(np.searchsorted(split.ordinals, SPLIT_DATE.toordinal()))
+    assert split.ordinals[day] == SPLIT_DATE.toordinal()
+    assert split.quantity[day - 1, column] > 0 and split.flow[day, column] == 0
+    assert np.allclose(split.value[:day + 1], baseline.value[:day + 1])
+    assert np.allclose(split.daily_returns()[:day + 1], baseline.daily_returns()[:day + 1], atol=1e-6)     # float32 closes
+    assert np.isclose(split.value[day, column] / split.value[day - 1, column], split.price[day, column] / split.price[day - 1, column])
+
+
+def test_new_split_reprices_its_symbol(workdir, index_data):
+    tradebook = random_tradebook(400, symbols=3, seed=2)
+    symbol = tradebook.unique_symbols()[0]
+    store = stock_info_store(tradebook.unique_symbols(), splits_per_symbol=0)
+    provider = SplitProvider()
+    before = sync(tradebook, store, index_data, provider, workdir / "matrix")
+    price, value = np.array(before.price), np.array(before.value)     # The planes are mapped from the files rewritten below
+
+    store[symbol].stock_splits.append(StockSplit(split_date=SPLIT_DATE, ratio=RATIO))
+    provider.splits[f"{symbol}.NS"] = RATIO
+    after = sync(tradebook, store, index_data, provider, workdir / "matrix")
+    assert_same_matrix(sync(tradebook, store, index_data, provider, workdir / "rebuilt"), after, "repriced after a new split")
+    column = after.symbols.index(symbol)
+    assert np.allclose(after.price[:, column] * RATIO, price[:, column], equal_nan=True)
+    day = int(np.searchsorted(after.ordinals, SPLIT_DATE.toordinal()))
+    assert np.allclose(after.value[:day], value[:day])